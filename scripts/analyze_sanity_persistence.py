@@ -2,21 +2,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import argparse, json
+import argparse, json, sys
 from pathlib import Path
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
-SUPPORTED = {".csv", ".parquet"}
-
-def load_any(path: Path) -> pd.DataFrame:
-    sfx = path.suffix.lower()
-    if sfx == ".csv":
-        return pd.read_csv(path)
-    if sfx == ".parquet":
-        return pd.read_parquet(path)
-    raise ValueError(f"Unsupported file: {path}")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+from table_io import read_table  # noqa: E402
 
 def month_order_key(row):
     return int(row["year"]) * 12 + int(row["month"])
@@ -46,7 +39,7 @@ def linear_trend_slope(series: pd.Series, months_to_decade: bool = True) -> floa
 
 def per_country_stats(df: pd.DataFrame, min_len: int = 24) -> pd.DataFrame:
     out_rows = []
-    for country, g in df.groupby("country", sort=True):
+    for country, g in df.groupby("country", observed=True, sort=True):
         g = g.sort_values(["year","month"])
         s = g["anomaly_c"].astype(float)
         n = len(s)
@@ -74,7 +67,7 @@ def main():
     args = ap.parse_args()
 
     anomalies_path = Path(args.anomalies)
-    df = load_any(anomalies_path)
+    df = read_table(anomalies_path, columns=["country","year","month","anomaly_c"])
 
     # required columns
     req = {"country","year","month","anomaly_c"}
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Vendor the globe's country geometry, textures and JS libraries into src/app/static/vendor/
+so the app needs no network access (air-gapped hosts). Run once on a connected machine, or
+point the options at local copies:
+
+  python scripts/build_app_assets.py
+  python scripts/build_app_assets.py --geojson ne_110m_admin_0_countries.geojson --tex_dir three-globe/example/img
+
+Geometry is quantized to --precision decimals, points closer than --tolerance degrees to
+the previous kept point are dropped, and every feature keeps only NAME plus `row`: its
+country_id (country_ids.py), which is the row of that country in the app payload, so the
+front-end colors a polygon by direct index instead of resolving names.
+
+Writes countries.json.gz, the textures, three.js/globe.gl and manifest.json (read by app.py;
+without it the app falls back to the remote URLs). Re-run after new countries enter
+country_ids.json.
+"""
+from __future__ import annotations
+import argparse, gzip, json, sys
+from pathlib import Path
+from urllib.request import urlopen
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src" / "data" / "temperature"))
+from country_ids import ID_FILE, CountryIds  # noqa: E402
+
+OUT_DIR = ROOT / "src" / "app" / "static" / "vendor"
+GEOJSON_URL = "https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/ne_110m_admin_0_countries.geojson"
+TEX_URL = "https://unpkg.com/three-globe/example/img/"
+TEXTURES = {"day": "earth-blue-marble.jpg", "bump": "earth-topology.png", "sky": "night-sky.png"}
+LIBS = {  # same versions as the <script> fallbacks in app.py
+    "three": "https://unpkg.com/three@0.155.0/build/three.min.js",
+    "globe": "https://unpkg.com/globe.gl@2.33.1/dist/globe.gl.min.js",
+}
+
+def read_source(src: str) -> bytes:
+    if src.startswith(("http://", "https://")):
+        with urlopen(src, timeout=60) as r:
+            return r.read()
+    return Path(src).read_bytes()
+
+def simplify_ring(ring: list, precision: int, tolerance: float) -> list | None:
+    out = []
+    for x, y in ((round(p[0], precision), round(p[1], precision)) for p in ring):
+        if out and abs(x - out[-1][0]) <= tolerance and abs(y - out[-1][1]) <= tolerance:
+            continue
+        out.append([x, y])
+    if out[0] != out[-1]:
+        out.append(list(out[0]))
+    return out if len(out) >= 4 else None
+
+def simplify_geometry(geom: dict, precision: int, tolerance: float) -> dict | None:
+    polys = [geom["coordinates"]] if geom["type"] == "Polygon" else geom["coordinates"]
+    kept = []
+    for poly in polys:
+        rings = [simplify_ring(r, precision, tolerance) for r in poly]
+        if rings[0] is not None:  # outer ring survived
+            kept.append([r for r in rings if r is not None])
+    if not kept:
+        return None
+    return {"type": "Polygon", "coordinates": kept[0]} if len(kept) == 1 else {"type": "MultiPolygon", "coordinates": kept}
+
+def main():
+    ap = argparse.ArgumentParser(description="Vendor simplified geometry, textures and JS libraries for the globe app.")
+    ap.add_argument("--geojson", default=GEOJSON_URL, help="Natural Earth admin-0 countries GeoJSON (path or URL)")
+    ap.add_argument("--tex_dir", default=TEX_URL, help="Folder or base URL holding the three-globe textures")
+    ap.add_argument("--out_dir", default=str(OUT_DIR))
+    ap.add_argument("--ids", default=str(ID_FILE), help="Country ID registry (see country_ids.py)")
+    ap.add_argument("--precision", type=int, default=2, help="Coordinate decimals (2 = 0.01°)")
+    ap.add_argument("--tolerance", type=float, default=0.05, help="Drop points within this many degrees of the previous one")
+    ap.add_argument("--skip_textures", action="store_true")
+    ap.add_argument("--lib_dir", default=None, help="Folder with three.min.js and globe.gl.min.js (default: download)")
+    ap.add_argument("--skip_libs", action="store_true")
+    args = ap.parse_args()
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ids = CountryIds.load(Path(args.ids))
+
+    geo = json.loads(read_source(args.geojson))
+    features, unmatched, points = [], [], 0
+    for f in geo["features"]:
+        name = str(f["properties"].get("NAME") or "")
+        geom = simplify_geometry(f["geometry"], args.precision, args.tolerance)
+        if geom is None:
+            continue
+        row = ids.id_of(name)
+        if row is None:
+            unmatched.append(name)
+        points += sum(len(r) for poly in ([geom["coordinates"]] if geom["type"] == "Polygon" else geom["coordinates"]) for r in poly)
+        features.append({"type": "Feature", "properties": {"NAME": name, "row": row}, "geometry": geom})
+    data = json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":")).encode("utf-8")
+    (out_dir / "countries.json.gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    print(f"[OK] countries.json.gz: {len(features)} features, {points} points, {len(data)/1e3:.0f} kB raw")
+    if unmatched:
+        print(f"[INFO] no country_id (shown without data): {', '.join(sorted(unmatched))}")
+
+    manifest = {"geo": "countries.json.gz"}
+    if not args.skip_textures:
+        base = args.tex_dir if args.tex_dir.startswith(("http://", "https://")) else None
+        for key, fname in TEXTURES.items():
+            src = base + fname if base else str(Path(args.tex_dir) / fname)
+            (out_dir / fname).write_bytes(read_source(src))
+            manifest[key] = fname
+            print(f"[OK] {fname}")
+    if not args.skip_libs:
+        for key, url in LIBS.items():
+            fname = url.rsplit("/", 1)[1]
+            (out_dir / fname).write_bytes(read_source(str(Path(args.lib_dir) / fname) if args.lib_dir else url))
+            manifest[key] = fname
+            print(f"[OK] {fname}")
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    print(f"[DONE] {out_dir}")
+
+if __name__ == "__main__":
+    main()
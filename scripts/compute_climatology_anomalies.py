@@ -2,23 +2,18 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import argparse, json
+import argparse, json, sys
 from pathlib import Path
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
-SUPPORTED = {".csv", ".parquet", ".feather"}
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+import monthly_store  # noqa: E402
+from table_io import TableWriter, chunks, read_table  # noqa: E402
 
-def load_any(path: Path) -> pd.DataFrame:
-    sfx = path.suffix.lower()
-    if sfx == ".csv":
-        return pd.read_csv(path)
-    if sfx == ".parquet":
-        return pd.read_parquet(path)
-    if sfx == ".feather":
-        return pd.read_feather(path)
-    raise ValueError(f"Unsupported file: {path}")
+SUPPORTED = {".csv", ".parquet", ".feather"}
+MONTHLY_COLS = ["country","date","year","month","temp_c"]
 
 def ensure_cols(df: pd.DataFrame, src: Path) -> pd.DataFrame:
     df = df.copy()
@@ -36,13 +31,16 @@ def ensure_cols(df: pd.DataFrame, src: Path) -> pd.DataFrame:
     df["month"] = df["month"].astype(int)
     return df[["country","year","month","temp_c"]]
 
-def read_per_country(input_dir: Path) -> pd.DataFrame:
-    files = [p for p in input_dir.iterdir() if p.is_file() and p.suffix.lower() in SUPPORTED]
+def list_input_files(input_dir: Path) -> list[Path]:
+    files = sorted(p for p in input_dir.iterdir() if p.is_file() and p.suffix.lower() in SUPPORTED)
     if not files:
         raise SystemExit(f"No data files found in {input_dir}")
+    return files
+
+def read_per_country(input_dir: Path, files: list[Path] | None = None) -> pd.DataFrame:
     frames = []
-    for p in sorted(files):
-        frames.append(ensure_cols(load_any(p), p))
+    for p in (files if files is not None else list_input_files(input_dir)):
+        frames.append(ensure_cols(read_table(p, columns=MONTHLY_COLS, categorical=False), p))
     return pd.concat(frames, ignore_index=True)
 
 def read_reference(ref_csv: Path, default_start: int, default_end: int) -> pd.DataFrame:
@@ -68,7 +66,7 @@ def compute_climatology(df: pd.DataFrame, ref: pd.DataFrame|None, default_start:
     in_ref = (dfm["year"] >= dfm["ref_start"]) & (dfm["year"] <= dfm["ref_end"])
     ref_df = dfm.loc[in_ref, ["country","month","temp_c","ref_start","ref_end"]]
     clim = (ref_df
-            .groupby(["country","month","ref_start","ref_end"], as_index=False)["temp_c"]
+            .groupby(["country","month","ref_start","ref_end"], as_index=False, observed=True)["temp_c"]
             .mean()
             .rename(columns={"temp_c":"clim_temp_c"}))
     return clim
@@ -78,46 +76,63 @@ def compute_anomalies(df: pd.DataFrame, clim: pd.DataFrame) -> pd.DataFrame:
     out["anomaly_c"] = out["temp_c"] - out["clim_temp_c"]
     return out
 
+def read_store(store_dir: Path, countries: list[str] | None = None, as_of: str | None = None) -> pd.DataFrame:
+    df = monthly_store.read_monthly(store_dir, columns=["country","year","month","temp_c"],
+                                    countries=countries, as_of=as_of)
+    df["country"] = df["country"].astype(str)
+    return df
+
+def iter_partitions(args):
+    """Monthly frames of `--chunk_countries` countries each (climatology and anomalies are
+    per country, so partitions are independent). Without chunking: one frame."""
+    if args.input_store:
+        store_dir = Path(args.input_store)
+        for names in chunks(monthly_store.country_names(store_dir, args.as_of), args.chunk_countries):
+            yield read_store(store_dir, names, args.as_of)
+    else:
+        input_dir = Path(args.input_dir)
+        for files in chunks(list_input_files(input_dir), args.chunk_countries):
+            yield read_per_country(input_dir, files)
+
 def main():
     ap = argparse.ArgumentParser(description="Compute monthly climatology and anomalies (Step 6).")
-    ap.add_argument("--input_dir", required=True, help="Folder with one file per country; files must contain country/year/month/temp_c (date optional).")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--input_dir", help="Folder with one file per country; files must contain country/year/month/temp_c (date optional).")
+    src.add_argument("--input_store", help="Columnar monthly store written by temp_data.py (src/data/temperature/monthly_store).")
+    ap.add_argument("--as_of", default=None, help="Snapshot of --input_store to read (monthly_store.list_snapshots; 'latest' = newest). Default: live store.")
     ap.add_argument("--output_climatology", required=True, help="Output file (.csv or .parquet).")
     ap.add_argument("--output_anomalies", required=True, help="Output file (.csv or .parquet).")
     ap.add_argument("--ref_csv", default=None, help="CSV from Step 5 with chosen reference periods (reports/reference_periods.csv). If not provided, uses default window for all countries.")
     ap.add_argument("--default_start", type=int, default=1981, help="Default reference start year (inclusive).")
     ap.add_argument("--default_end", type=int, default=2010, help="Default reference end year (inclusive).")
+    ap.add_argument("--chunk_countries", type=int, default=0,
+                    help="Process N countries (files/store partitions) at a time and append to the outputs; "
+                         "bounded memory, same results as long as file names sort like their countries. 0 = all at once.")
     args = ap.parse_args()
 
-    input_dir = Path(args.input_dir)
-    df = read_per_country(input_dir)
-
+    input_dir = Path(args.input_store or args.input_dir)
     ref = Path(args.ref_csv) if args.ref_csv else None
     ref_df = read_reference(ref, args.default_start, args.default_end) if ref else None
 
-    clim = compute_climatology(df, ref_df, args.default_start, args.default_end)
-    # Save climatology
-    Path(args.output_climatology).parent.mkdir(parents=True, exist_ok=True)
-    if args.output_climatology.lower().endswith(".parquet"):
-        clim.to_parquet(args.output_climatology, index=False)
-    else:
-        clim.to_csv(args.output_climatology, index=False)
-
-    # Anomalies
-    anomalies = compute_anomalies(df, clim)
-    Path(args.output_anomalies).parent.mkdir(parents=True, exist_ok=True)
-    if args.output_anomalies.lower().endswith(".parquet"):
-        anomalies.to_parquet(args.output_anomalies, index=False)
-    else:
-        anomalies.to_csv(args.output_anomalies, index=False)
+    rows_in = n_countries = 0
+    with TableWriter(Path(args.output_climatology)) as clim_out, TableWriter(Path(args.output_anomalies)) as anom_out:
+        for df in iter_partitions(args):
+            clim = compute_climatology(df, ref_df, args.default_start, args.default_end)
+            clim_out.write(clim)
+            anom_out.write(compute_anomalies(df, clim))
+            rows_in += len(df)
+            n_countries += int(df["country"].nunique())
+            del df, clim
 
     meta = {
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "input_dir": str(input_dir),
+        "as_of": args.as_of,
         "ref_source": str(ref) if ref else None,
         "default_window": [args.default_start, args.default_end],
-        "rows_input": int(len(df)),
-        "rows_anomalies": int(len(anomalies)),
-        "countries": int(df["country"].nunique()),
+        "rows_input": int(rows_in),
+        "rows_anomalies": int(anom_out.rows),
+        "countries": n_countries,
     }
     print(json.dumps(meta, indent=2))
 
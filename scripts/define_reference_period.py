@@ -1,23 +1,21 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import argparse, json
+import argparse, json, sys
 from pathlib import Path
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+import monthly_store  # noqa: E402
+from table_io import read_table  # noqa: E402
+
 DEFAULT_MIN_PER_MONTH = 25
 DEFAULT_WINDOW = (1981, 2010)
 WINDOW_LEN = 30
 SUPPORTED = {".csv", ".parquet", ".feather"}
-
-def load_any(path: Path) -> pd.DataFrame:
-    sfx = path.suffix.lower()
-    if sfx == ".csv": return pd.read_csv(path)
-    if sfx == ".parquet": return pd.read_parquet(path)
-    if sfx == ".feather": return pd.read_feather(path)
-    raise ValueError(f"Unsupported file: {path}")
+MONTHLY_COLS = ["country","date","year","month","temp_c"]
 
 def ensure_cols(df: pd.DataFrame, src: Path) -> pd.DataFrame:
     df = df.copy()
@@ -70,7 +68,10 @@ def choose_window(df, default=(1981,2010), n_min=25):
 
 def main():
     ap = argparse.ArgumentParser(description="Define per-country 30y reference periods for monthly climatology.")
-    ap.add_argument("--input_dir", required=True)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--input_dir")
+    src.add_argument("--input_store", help="Columnar monthly store written by temp_data.py (instead of --input_dir).")
+    ap.add_argument("--as_of", default=None, help="Snapshot of --input_store to read (monthly_store.list_snapshots; 'latest' = newest). Default: live store.")
     ap.add_argument("--report_csv", required=True)
     ap.add_argument("--report_json", required=True)
     ap.add_argument("--min_per_month", type=int, default=DEFAULT_MIN_PER_MONTH)
@@ -78,13 +79,18 @@ def main():
     ap.add_argument("--default_end", type=int, default=DEFAULT_WINDOW[1])
     args = ap.parse_args()
 
-    input_dir = Path(args.input_dir)
-    files = [p for p in input_dir.iterdir() if p.is_file() and p.suffix.lower() in SUPPORTED]
-    if not files:
-        raise SystemExit(f"No data files found in {input_dir}")
+    if args.input_store:
+        input_dir = Path(args.input_store)
+        store = monthly_store.read_monthly(input_dir, columns=["country","year","month","temp_c"], as_of=args.as_of)
+        frames = (g for _, g in store.groupby("country", observed=True, sort=True))
+    else:
+        input_dir = Path(args.input_dir)
+        files = [p for p in input_dir.iterdir() if p.is_file() and p.suffix.lower() in SUPPORTED]
+        if not files:
+            raise SystemExit(f"No data files found in {input_dir}")
+        frames = (ensure_cols(read_table(p, columns=MONTHLY_COLS), p) for p in sorted(files))
     rows = []
-    for p in sorted(files):
-        df = ensure_cols(load_any(p), p)
+    for df in frames:
         choice = choose_window(df, default=(args.default_start, args.default_end), n_min=args.min_per_month)
         country = str(df["country"].iloc[0])
         row = {
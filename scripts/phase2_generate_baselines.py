@@ -1,83 +1,78 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import argparse, json
+import argparse, json, sys
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
-def load_df(path: Path)->pd.DataFrame:
-    if path.suffix.lower()==".csv": return pd.read_csv(path)
-    if path.suffix.lower()==".parquet": return pd.read_parquet(path)
-    raise SystemExit(f"Unsupported file extension: {path.suffix}")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+from monthly_cube import load_or_build  # noqa: E402
+from table_io import read_table  # noqa: E402
 
 def key_to_ym(k:int)->tuple[int,int]:
     return k//12, (k%12)+1
 
-def build_lookup(df: pd.DataFrame):
-    df = df.copy()
-    df["k"] = df["year"].astype(int)*12 + (df["month"].astype(int)-1)
-    return df.set_index(["country","k"]).sort_index()
-
 def main():
     ap = argparse.ArgumentParser(description="Phase 2 – Steps 3&4: Generate baseline forecasts (climatology, lag12).")
-    ap.add_argument("--anomalies", required=True)
+    ap.add_argument("--anomalies", help="monthly anomalies (csv/parquet); optional when --cube is given")
+    ap.add_argument("--cube", default=None, help="cube dir from monthly_cube.py; attached via mmap instead of parsing --anomalies")
     ap.add_argument("--cutoffs_csv", required=True)
     ap.add_argument("--setup_json", required=True)
     ap.add_argument("--out_climatology", required=True)
     ap.add_argument("--out_lag12", required=True)
     args = ap.parse_args()
+    if not args.anomalies and not args.cube:
+        raise SystemExit("Provide --anomalies or --cube")
 
-    anom = load_df(Path(args.anomalies))
+    anom = None
+    if not args.cube:
+        req = ["country","year","month","temp_c","clim_temp_c","anomaly_c"]
+        anom = read_table(Path(args.anomalies), columns=req)
+        miss = [c for c in req if c not in anom.columns]
+        if miss: raise SystemExit(f"Missing columns in anomalies: {miss}")
     cutoffs = pd.read_csv(args.cutoffs_csv)
     with open(args.setup_json, "r", encoding="utf-8") as f:
         cfg = json.load(f)
     HMAX = int(cfg["horizons_max"])
 
-    req = {"country","year","month","temp_c","clim_temp_c","anomaly_c"}
-    miss = [c for c in req if c not in anom.columns]
-    if miss: raise SystemExit(f"Missing columns in anomalies: {miss}")
-
-    L = build_lookup(anom)
-    countries = anom["country"].unique().tolist()
+    cube = load_or_build(args.cube, anom)
+    countries = np.array(cube.countries, dtype=object)
+    hs = np.arange(1, HMAX+1)
 
     rows_clim, rows_l12 = [], []
     for _, row in cutoffs.iterrows():
         k = int(row["cutoff_key"]); cutoff_ym = row["cutoff_ym"]
-        for country in countries:
-            for h in range(1, HMAX+1):
-                k_tgt = k + h
-                y_tgt, m_tgt = key_to_ym(k_tgt)
-                # need target truth & climatology
-                try:
-                    clim_temp = L.loc[(country, k_tgt), "clim_temp_c"]
-                    truth_c   = L.loc[(country, k_tgt), "temp_c"]
-                except KeyError:
-                    continue
-                # climatology baseline
-                rows_clim.append({
-                    "country": country, "year": y_tgt, "month": m_tgt,
-                    "cutoff_ym": cutoff_ym, "horizon": h,
-                    "pred_c": float(clim_temp), "truth_c": float(truth_c),
-                    "baseline": "climatology"
-                })
-                # lag12 baseline (on anomalies); requires source in history
-                k_src = k_tgt - 12
-                if k_src <= k:
-                    try:
-                        src_anom = L.loc[(country, k_src), "anomaly_c"]
-                    except KeyError:
-                        continue
-                    rows_l12.append({
-                        "country": country, "year": y_tgt, "month": m_tgt,
-                        "cutoff_ym": cutoff_ym, "horizon": h,
-                        "pred_c": float(src_anom + clim_temp), "truth_c": float(truth_c),
-                        "baseline": "lag12"
-                    })
+        k_tgt = k + hs
+        # need target truth & climatology: one [country x horizon] block per cutoff
+        ok = cube.present_block(k_tgt)
+        clim_temp = cube.block("clim_temp_c", k_tgt)
+        truth_c = cube.block("temp_c", k_tgt)
+        ci, hi = np.nonzero(ok)  # row-major: country, then horizon
+        y_tgt, m_tgt = key_to_ym(k_tgt[hi])
+        rows_clim.append(pd.DataFrame({
+            "country": countries[ci], "year": y_tgt, "month": m_tgt,
+            "cutoff_ym": cutoff_ym, "horizon": hs[hi],
+            "pred_c": clim_temp[ci, hi], "truth_c": truth_c[ci, hi],
+            "baseline": "climatology"
+        }))
+        # lag12 baseline (on anomalies); requires source in history
+        k_src = k_tgt - 12
+        ok12 = ok & (k_src <= k)[None, :] & cube.present_block(k_src)
+        src_anom = cube.block("anomaly_c", k_src)
+        ci, hi = np.nonzero(ok12)
+        y_tgt, m_tgt = key_to_ym(k_tgt[hi])
+        rows_l12.append(pd.DataFrame({
+            "country": countries[ci], "year": y_tgt, "month": m_tgt,
+            "cutoff_ym": cutoff_ym, "horizon": hs[hi],
+            "pred_c": src_anom[ci, hi] + clim_temp[ci, hi], "truth_c": truth_c[ci, hi],
+            "baseline": "lag12"
+        }))
 
     Path(args.out_climatology).parent.mkdir(parents=True, exist_ok=True)
     Path(args.out_lag12).parent.mkdir(parents=True, exist_ok=True)
-    pd.DataFrame(rows_clim).to_csv(args.out_climatology, index=False)
-    pd.DataFrame(rows_l12).to_csv(args.out_lag12, index=False)
+    pd.concat(rows_clim, ignore_index=True).to_csv(args.out_climatology, index=False)
+    pd.concat(rows_l12, ignore_index=True).to_csv(args.out_lag12, index=False)
     print("[OK] Wrote:", args.out_climatology, "and", args.out_lag12)
 
 if __name__ == "__main__":
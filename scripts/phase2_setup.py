@@ -1,17 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import argparse, json
+import argparse, json, sys
 from pathlib import Path
 import pandas as pd
 from datetime import datetime
 
-FREQS = {"yearly": 12, "quarterly": 3}
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+from table_io import read_table  # noqa: E402
 
-def load_df(path: Path)->pd.DataFrame:
-    if path.suffix.lower()==".csv": return pd.read_csv(path)
-    if path.suffix.lower()==".parquet": return pd.read_parquet(path)
-    raise SystemExit(f"Unsupported file extension: {path.suffix}")
+FREQS = {"yearly": 12, "quarterly": 3}
 
 def main():
     ap = argparse.ArgumentParser(description="Phase 2 – Step 1: Define cutoffs, horizons, buckets.")
@@ -23,8 +21,8 @@ def main():
     ap.add_argument("--output_json", required=True)
     args = ap.parse_args()
 
-    df = load_df(Path(args.anomalies))
-    req = {"country","year","month","anomaly_c","clim_temp_c","temp_c"}
+    req = ["country","year","month","anomaly_c","clim_temp_c","temp_c"]
+    df = read_table(Path(args.anomalies), columns=req)
     miss = [c for c in req if c not in df.columns]
     if miss: raise SystemExit(f"Missing columns in anomalies: {miss}")
 
@@ -36,7 +34,7 @@ def main():
     candidates = list(range(kmin + args.min_history_months, kmax - args.horizons_max + 1, step))
 
     # per-country coverage window
-    per_country = df.groupby("country")["_k"].agg(["min","max"]).rename(columns={"min":"kmin","max":"kmax"}).reset_index()
+    per_country = df.groupby("country", observed=True)["_k"].agg(["min","max"]).rename(columns={"min":"kmin","max":"kmax"}).reset_index()
 
     rows = []
     for k in candidates:
@@ -1,17 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import argparse
+import argparse, sys
 from pathlib import Path
 import pandas as pd
 import numpy as np
 
-def load_df(path: Path)->pd.DataFrame:
-    if path.suffix.lower()==".csv":
-        return pd.read_csv(path)
-    if path.suffix.lower()==".parquet":
-        return pd.read_parquet(path)
-    raise SystemExit(f"Unsupported file: {path}")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+from table_io import print_peak_rss, read_table  # noqa: E402
 
 def add_calendar(df: pd.DataFrame)->pd.DataFrame:
     d = df.copy()
@@ -30,7 +26,7 @@ def add_persistence(df: pd.DataFrame)->pd.DataFrame:
         g["roll_std_3"]  = g["anomaly_c"].shift(1).rolling(3,  min_periods=3).std(ddof=0)
         g["roll_mean_12"]= g["anomaly_c"].shift(1).rolling(12, min_periods=12).mean()
         return g
-    return df.groupby("country", group_keys=False).apply(f)
+    return df.groupby("country", observed=True, group_keys=False).apply(f)
 
 def add_trend_features(df: pd.DataFrame)->pd.DataFrame:
     """
@@ -53,7 +49,7 @@ def add_trend_features(df: pd.DataFrame)->pd.DataFrame:
         g["roll_mean_prev36"] = s.shift(36).rolling(36, min_periods=12).mean()
         g["recent_trend_36"]  = g["roll_mean_last36"] - g["roll_mean_prev36"]
         return g
-    d = d.groupby("country", group_keys=False).apply(gfun)
+    d = d.groupby("country", observed=True, group_keys=False).apply(gfun)
     return d
 
 def add_target(df: pd.DataFrame)->pd.DataFrame:
@@ -61,21 +57,11 @@ def add_target(df: pd.DataFrame)->pd.DataFrame:
         g = g.sort_values(["year","month"]).copy()
         g["target_anom_t_plus_1"] = g["anomaly_c"].shift(-1)
         return g
-    return df.groupby("country", group_keys=False).apply(f)
-
-def main():
-    ap = argparse.ArgumentParser(description="Phase 3 – Build features_v1 (leakage-free) with trend features.")
-    ap.add_argument("--anomalies", required=True)
-    ap.add_argument("--out_features", required=True)
-    ap.add_argument("--drop_optional", action="store_true")
-    args = ap.parse_args()
-
-    df = load_df(Path(args.anomalies))
-    req = {"country","year","month","temp_c","clim_temp_c","anomaly_c"}
-    miss = [c for c in req if c not in df.columns]
-    if miss:
-        raise SystemExit(f"Missing columns: {miss}")
+    return df.groupby("country", observed=True, group_keys=False).apply(f)
 
+def build_features(df: pd.DataFrame, drop_optional: bool = False) -> pd.DataFrame:
+    """features_v1 from a monthly anomalies frame (country, year, month, temp_c, clim_temp_c,
+    anomaly_c); also used by the phase 4 trainers to rebuild features of a store vintage."""
     d = add_calendar(df)
     d = add_persistence(d)
     d = add_trend_features(d)   # <- NEU: Trend-Features
@@ -99,12 +85,27 @@ def main():
     # Optionale Persistence
     opt_cols = ["anom_lag24","roll_mean_12"]
 
-    cols = base_cols if args.drop_optional else base_cols + opt_cols
+    cols = base_cols if drop_optional else base_cols + opt_cols
+    return d[cols].dropna(subset=core, how="any").copy()
+
+def main():
+    ap = argparse.ArgumentParser(description="Phase 3 – Build features_v1 (leakage-free) with trend features.")
+    ap.add_argument("--anomalies", required=True)
+    ap.add_argument("--out_features", required=True)
+    ap.add_argument("--drop_optional", action="store_true")
+    args = ap.parse_args()
+
+    req = ["country","year","month","temp_c","clim_temp_c","anomaly_c"]
+    df = read_table(Path(args.anomalies), columns=req, compact=True)
+    miss = [c for c in req if c not in df.columns]
+    if miss:
+        raise SystemExit(f"Missing columns: {miss}")
 
-    out = d[cols].dropna(subset=core, how="any").copy()
+    out = build_features(df, args.drop_optional)
     Path(args.out_features).parent.mkdir(parents=True, exist_ok=True)
     out.to_csv(args.out_features, index=False)
     print("[OK] features_v1 written:", args.out_features, "rows:", len(out))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    print_peak_rss()
\ No newline at end of file
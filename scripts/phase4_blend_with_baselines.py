@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import argparse, json
+import argparse, json, sys
 from pathlib import Path
 import numpy as np
 import pandas as pd
 
-KEYS = ["country","year","month","cutoff_ym","horizon"]
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+from country_ids import CountryIds  # noqa: E402
+
+KEYS = ["country_id","year","month","cutoff_ym","horizon"]
 
 def load_buckets(p):
     return json.load(open(p, "r", encoding="utf-8"))["buckets"]
@@ -31,9 +34,14 @@ def main():
 
     buckets = load_buckets(args.setup_json)
 
+    ids = CountryIds.load()
     m = pd.read_csv(args.model_forecasts)
-    c = pd.read_csv(args.baseline_clim)[KEYS+["pred_c"]].rename(columns={"pred_c":"pred_c_clim"})
-    l = pd.read_csv(args.baseline_lag12)[KEYS+["pred_c"]].rename(columns={"pred_c":"pred_c_lag12"})
+    c = pd.read_csv(args.baseline_clim)
+    l = pd.read_csv(args.baseline_lag12)
+    for f in (m, c, l):
+        f["country_id"] = ids.ids_for(f["country"])
+    c = c[KEYS+["pred_c"]].rename(columns={"pred_c":"pred_c_clim"})
+    l = l[KEYS+["pred_c"]].rename(columns={"pred_c":"pred_c_lag12"})
 
     # *** WICHTIG: LEFT JOIN auf das Modell, damit KEINE Modellzeilen verloren gehen ***
     df = (m
@@ -78,7 +86,7 @@ def main():
     df["pred_c"] = (1.0 - df["blend_w"]) * df["pred_c"] + df["blend_w"] * df["pred_c_base"].fillna(0.0)
 
     # In ursprünglichem Modellschema speichern
-    out_cols = list(m.columns)
+    out_cols = [col for col in m.columns if col != "country_id"]
     Path(args.out_forecasts).parent.mkdir(parents=True, exist_ok=True)
     df[out_cols].to_csv(args.out_forecasts, index=False)
     print("Optimized weights per bucket:", best_w)
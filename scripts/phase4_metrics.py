@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import argparse, json
+import argparse, json, sys
 from pathlib import Path
 import pandas as pd
 import numpy as np
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+from country_ids import CountryIds  # noqa: E402
+
 def bucket_name(h: int, buckets: list[dict])->str:
     for b in buckets:
         if b["h_start"] <= h <= b["h_end"]:
@@ -28,19 +31,25 @@ def main():
         cfg = json.load(f)
     buckets = cfg["buckets"]
 
+    ids = CountryIds.load()
     m = pd.read_csv(args.model_forecasts)
     b1 = pd.read_csv(args.baseline_clim).assign(baseline="climatology")
     b2 = pd.read_csv(args.baseline_lag12).assign(baseline="lag12")
+    m["country_id"] = ids.ids_for(m["country"])
 
     m["ae"] = (m["pred_c"] - m["truth_c"]).abs()
     m["se"] = (m["pred_c"] - m["truth_c"])**2
     m["bucket"] = m["horizon"].apply(lambda h: bucket_name(int(h), buckets))
 
-    by_country = (m.groupby(["country","bucket"])
-                    .agg(n=("ae","count"),
+    by_country = (m.groupby(["country_id","bucket"])
+                    .agg(country=("country","first"),
+                         n=("ae","count"),
                          MAE=("ae","mean"),
                          RMSE=("se", lambda s: float(np.sqrt(s.mean()))))
-                    .reset_index())
+                    .reset_index()
+                    # grouped on the ID, but rows/columns as before: country,bucket,n,MAE,RMSE,who
+                    .sort_values(["country","bucket"], ignore_index=True)
+                    [["country_id","country","bucket","n","MAE","RMSE"]])
     by_country["who"] = "model_ridge"
 
     global_m = (by_country.groupby(["who","bucket"])
@@ -50,15 +59,19 @@ def main():
                   .reset_index())
 
     b = pd.concat([b1,b2], ignore_index=True)
+    b["country_id"] = ids.ids_for(b["country"])
     b["ae"] = (b["pred_c"] - b["truth_c"]).abs()
     b["se"] = (b["pred_c"] - b["truth_c"])**2
     b["bucket"] = b["horizon"].apply(lambda h: bucket_name(int(h), buckets))
 
-    b_by_country = (b.groupby(["country","baseline","bucket"])
-                      .agg(n=("ae","count"),
+    b_by_country = (b.groupby(["country_id","baseline","bucket"])
+                      .agg(country=("country","first"),
+                           n=("ae","count"),
                            MAE=("ae","mean"),
                            RMSE=("se", lambda s: float(np.sqrt(s.mean()))))
-                      .reset_index())
+                      .reset_index()
+                      .sort_values(["country","baseline","bucket"], ignore_index=True)
+                      [["country_id","country","baseline","bucket","n","MAE","RMSE"]])
 
     b_global = (b_by_country.groupby(["baseline","bucket"])
                   .agg(countries=("country","nunique"),
@@ -67,7 +80,7 @@ def main():
                   .reset_index())
 
     Path(args.out_by_country).parent.mkdir(parents=True, exist_ok=True)
-    by_country.to_csv(args.out_by_country, index=False)
+    by_country.drop(columns="country_id").to_csv(args.out_by_country, index=False)
     global_m.to_csv(args.out_global, index=False)
 
     # Summary MD
@@ -83,12 +96,12 @@ def main():
     Path(args.out_summary_md).write_text("\n".join(lines), encoding="utf-8")
 
     # Decision MD (wins vs. best baseline)
-    model_c = by_country.rename(columns={"MAE":"MAE_model","RMSE":"RMSE_model"})[["country","bucket","MAE_model","RMSE_model"]]
-    best_b = (b_by_country.sort_values(["country","bucket","RMSE"])
-                .groupby(["country","bucket"]).head(1)
+    model_c = by_country.rename(columns={"MAE":"MAE_model","RMSE":"RMSE_model"})[["country_id","bucket","MAE_model","RMSE_model"]]
+    best_b = (b_by_country.sort_values(["country_id","bucket","RMSE"])
+                .groupby(["country_id","bucket"]).head(1)
                 .rename(columns={"baseline":"best_baseline","RMSE":"RMSE_best","MAE":"MAE_best"})
-                [["country","bucket","best_baseline","RMSE_best","MAE_best"]])
-    cmp = model_c.merge(best_b, on=["country","bucket"], how="inner")
+                [["country_id","bucket","best_baseline","RMSE_best","MAE_best"]])
+    cmp = model_c.merge(best_b, on=["country_id","bucket"], how="inner")
     cmp["improvement_pct"] = (cmp["RMSE_best"] - cmp["RMSE_model"]) / cmp["RMSE_best"]
     wins = (cmp.groupby("bucket")["improvement_pct"].apply(lambda s: float((s>0).mean()))).reset_index()
 
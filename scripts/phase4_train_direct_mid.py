@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import argparse, json, math
+import argparse, json, math, sys
 from dataclasses import dataclass
 from pathlib import Path
 import numpy as np
@@ -11,10 +11,19 @@ from sklearn.linear_model import Ridge
 from sklearn.model_selection import TimeSeriesSplit
 from sklearn.preprocessing import StandardScaler
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+from monthly_cube import MonthlyCube  # noqa: E402
+import monthly_store  # noqa: E402
+from phase3_build_features import build_features  # noqa: E402
+from table_io import read_table  # noqa: E402
+
 @dataclass
 class Cfg:
     features_csv: Path
-    anomalies_csv: Path
+    anomalies_csv: Path | None
+    cube_dir: Path | None
+    input_store: Path
+    as_of: str | None
     cutoffs_csv: Path
     setup_json: Path
     in_forecasts: Path
@@ -34,7 +43,10 @@ def load_cfg(args)->Cfg:
     _ = int(meta["horizons_max"])
     return Cfg(
         features_csv=Path(args.features),
-        anomalies_csv=Path(args.anomalies),
+        anomalies_csv=Path(args.anomalies) if args.anomalies else None,
+        cube_dir=Path(args.cube) if args.cube else None,
+        input_store=Path(args.input_store),
+        as_of=args.as_of,
         cutoffs_csv=Path(args.cutoffs_csv),
         setup_json=Path(args.setup_json),
         in_forecasts=Path(args.in_forecasts),
@@ -45,10 +57,12 @@ def load_cfg(args)->Cfg:
         min_train_rows=int(args.min_train_rows),
     )
 
-def build_lookup(anom: pd.DataFrame):
-    a = anom.copy()
-    a["k"] = a["year"].astype(int)*12 + (a["month"].astype(int)-1)
-    return a.set_index(["country","k"]).sort_index()
+def build_lookup(cfg: Cfg) -> MonthlyCube:
+    if cfg.cube_dir:
+        cube = MonthlyCube.open(cfg.cube_dir)
+    else:
+        cube = MonthlyCube.from_frame(read_table(Path(cfg.anomalies_csv), columns=["country","year","month","temp_c","clim_temp_c","anomaly_c"]))
+    return cube.pin_vintage(cfg.input_store, cfg.as_of) if cfg.as_of else cube
 
 def select_features(df: pd.DataFrame)->list[str]:
     cols = ["mon_sin","mon_cos","anom_lag1","anom_lag12","roll_mean_3","roll_std_3"]
@@ -82,7 +96,12 @@ def fit_ridge_timeaware(X: np.ndarray, y: np.ndarray, alphas: list[float]):
 def main():
     ap = argparse.ArgumentParser(description="Direct mid-horizon training (replace h7..24) and merge into existing forecasts.")
     ap.add_argument("--features", required=True)
-    ap.add_argument("--anomalies", required=True)
+    ap.add_argument("--anomalies", help="monthly anomalies CSV (optional when --cube is given)")
+    ap.add_argument("--cube", default=None, help="cube dir from monthly_cube.py (mmap, no CSV parsing)")
+    ap.add_argument("--as_of", default=None,
+                    help="Backtest against this vintage of --input_store (monthly_store.list_snapshots; 'latest' = newest): "
+                         "truth, history, features and targets are rebuilt from that snapshot (--features is not read). Default: the anomalies/cube as given.")
+    ap.add_argument("--input_store", default=str(monthly_store.STORE_DIR), help="Columnar monthly store holding the --as_of snapshot.")
     ap.add_argument("--cutoffs_csv", required=True)
     ap.add_argument("--setup_json", required=True)
     ap.add_argument("--in_forecasts", required=True, help="existing forecasts (recursive or blended)")
@@ -92,10 +111,13 @@ def main():
     ap.add_argument("--alphas", nargs="*", type=float, default=[30.0,100.0,300.0])
     ap.add_argument("--min_train_rows", type=int, default=120)
     args = ap.parse_args()
+    if not args.anomalies and not args.cube:
+        raise SystemExit("Provide --anomalies or --cube")
     cfg = load_cfg(args)
 
-    feat = pd.read_csv(cfg.features_csv)
-    anom = pd.read_csv(cfg.anomalies_csv)
+    A = build_lookup(cfg)
+    # with --as_of: features and targets of the vintage itself, not today's (revised, longer) series
+    feat = build_features(A.to_frame()) if cfg.as_of else read_table(Path(cfg.features_csv), categorical=False)
     cuts = pd.read_csv(cfg.cutoffs_csv)
     with open(cfg.setup_json, "r", encoding="utf-8") as f:
         setup = json.load(f)
@@ -103,7 +125,6 @@ def main():
 
     # keys
     feat["k"] = feat["year"].astype(int)*12 + (feat["month"].astype(int)-1)
-    A = build_lookup(anom)
 
     # ensure cutoff_key
     if "cutoff_key" not in cuts.columns:
@@ -135,12 +156,7 @@ def main():
                     continue
 
                 # build direct target: anomaly at k+h
-                def targ_at(k):
-                    try:
-                        return float(A.loc[(country, int(k+h)), "anomaly_c"])
-                    except KeyError:
-                        return np.nan
-                train["y_target"] = train["k"].apply(targ_at)
+                train["y_target"] = A.take("anomaly_c", country, train["k"].to_numpy() + h)
                 train = train.dropna(subset=["y_target"])
                 if len(train) < cfg.min_train_rows:
                     continue
@@ -155,11 +171,10 @@ def main():
                 # PREDICT at the single origin k_cut for horizon h
                 k_tgt = k_cut + h
                 y_tgt, m_tgt = key_to_ym(k_tgt)
-                try:
-                    clim = float(A.loc[(country, k_tgt), "clim_temp_c"])
-                    truth_c = float(A.loc[(country, k_tgt), "temp_c"])
-                except KeyError:
+                if not A.has(country, k_tgt):
                     continue
+                clim = A.get("clim_temp_c", country, k_tgt)
+                truth_c = A.get("temp_c", country, k_tgt)
 
                 # construct predictor row for that single (country, cutoff, h)
                 # We reuse features from dfc at k = k_cut (features are already lagged/seasonal)
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import argparse, json, math
+import argparse, json, math, sys
 from pathlib import Path
 from dataclasses import dataclass
 import pandas as pd
@@ -11,10 +11,19 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import Ridge
 from sklearn.model_selection import TimeSeriesSplit
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+from monthly_cube import MonthlyCube  # noqa: E402
+import monthly_store  # noqa: E402
+from phase3_build_features import build_features  # noqa: E402
+from table_io import print_peak_rss, read_table  # noqa: E402
+
 @dataclass
 class Config:
     features_csv: Path
-    anomalies_csv: Path
+    anomalies_csv: Path | None
+    cube_dir: Path | None
+    input_store: Path
+    as_of: str | None
     cutoffs_csv: Path
     setup_json: Path
     out_forecasts: Path
@@ -35,7 +44,10 @@ def load_cfg(args)->Config:
     _ = int(meta["horizons_max"])
     return Config(
         features_csv=Path(args.features),
-        anomalies_csv=Path(args.anomalies),
+        anomalies_csv=Path(args.anomalies) if args.anomalies else None,
+        cube_dir=Path(args.cube) if args.cube else None,
+        input_store=Path(args.input_store),
+        as_of=args.as_of,
         cutoffs_csv=Path(args.cutoffs_csv),
         setup_json=Path(args.setup_json),
         out_forecasts=Path(args.out_forecasts),
@@ -48,10 +60,13 @@ def load_cfg(args)->Config:
         blend_max=float(args.blend_max),
     )
 
-def build_lookup(df: pd.DataFrame):
-    d = df.copy()
-    d["k"] = d["year"].astype(int)*12 + (d["month"].astype(int)-1)
-    return d.set_index(["country","k"]).sort_index()
+def build_lookup(cfg: Config) -> MonthlyCube:
+    if cfg.cube_dir:
+        cube = MonthlyCube.open(cfg.cube_dir)
+    else:
+        cube = MonthlyCube.from_frame(read_table(Path(cfg.anomalies_csv), columns=["country","year","month","temp_c","clim_temp_c","anomaly_c"],
+                                                 compact=True))
+    return cube.pin_vintage(cfg.input_store, cfg.as_of) if cfg.as_of else cube
 
 def select_features(df: pd.DataFrame)->list[str]:
     cols = ["mon_sin","mon_cos","anom_lag1","anom_lag12","roll_mean_3","roll_std_3"]
@@ -97,7 +112,12 @@ def blend_weight(h:int, start:int, end:int, wmax:float)->float:
 def main():
     ap = argparse.ArgumentParser(description="Phase 4 – Ridge per country, rolling-origin, recursive 1..HMAX with damping & climatology blend.")
     ap.add_argument("--features", required=True, help="features/features_v1.csv")
-    ap.add_argument("--anomalies", required=True, help="data_clean/monthly_anomalies.csv")
+    ap.add_argument("--anomalies", help="data_clean/monthly_anomalies.csv (optional when --cube is given)")
+    ap.add_argument("--cube", default=None, help="cube dir from monthly_cube.py (mmap, no CSV parsing)")
+    ap.add_argument("--as_of", default=None,
+                    help="Backtest against this vintage of --input_store (monthly_store.list_snapshots; 'latest' = newest): "
+                         "truth, history, features and targets are rebuilt from that snapshot (--features is not read). Default: the anomalies/cube as given.")
+    ap.add_argument("--input_store", default=str(monthly_store.STORE_DIR), help="Columnar monthly store holding the --as_of snapshot.")
     ap.add_argument("--cutoffs_csv", required=True, help="reports/phase3_folds.csv or phase2_cutoffs.csv")
     ap.add_argument("--setup_json", required=True, help="reports/phase2_setup.json")
     ap.add_argument("--out_forecasts", required=True, help="models/forecasts_model_ridge.csv")
@@ -110,18 +130,21 @@ def main():
     ap.add_argument("--blend_end", type=int, default=0, help="Horizon where blending reaches max.")
     ap.add_argument("--blend_max", type=float, default=0.0, help="Max blend weight with climatology at blend_end (0..1).")
     args = ap.parse_args()
+    if not args.anomalies and not args.cube:
+        raise SystemExit("Provide --anomalies or --cube")
     cfg = load_cfg(args)
 
-    feat = pd.read_csv(cfg.features_csv)
-    anom = pd.read_csv(cfg.anomalies_csv)
+    L = build_lookup(cfg)
+    # with --as_of: features and targets of the vintage itself, not today's (revised, longer) series
+    feat = build_features(L.to_frame()) if cfg.as_of else read_table(Path(cfg.features_csv), compact=True)
     cuts = pd.read_csv(cfg.cutoffs_csv)
     with open(cfg.setup_json, "r", encoding="utf-8") as f:
         setup = json.load(f)
     HMAX = int(setup["horizons_max"])
 
     feat["k"] = feat["year"].astype(int)*12 + (feat["month"].astype(int)-1)
-    anom["k"] = anom["year"].astype(int)*12 + (anom["month"].astype(int)-1)
-    L = build_lookup(anom)
+    # Fallback climatology: mean(clim_temp_c) per (country, month)
+    clm_map = L.month_means("clim_temp_c")
 
     if "cutoff_key" not in cuts.columns:
         def parse_ym(s: str)->int:
@@ -133,7 +156,7 @@ def main():
 
     for _, crow in cuts.iterrows():
         k_cut = int(crow["cutoff_key"]); cutoff_ym = str(crow.get("cutoff_ym", ""))
-        for country, dfc in feat.groupby("country"):
+        for country, dfc in feat.groupby("country", observed=True):
             dfc = dfc.sort_values("k")
             train = dfc[dfc["k"] <= k_cut].copy()
             if len(train) < cfg.min_train_rows:
@@ -148,18 +171,15 @@ def main():
             if len(train) < cfg.min_train_rows:
                 continue
 
-            X = train[use_cols].values
-            y = train["target_anom_t_plus_1"].values
+            X = train[use_cols].to_numpy(dtype=np.float64)
+            y = train["target_anom_t_plus_1"].to_numpy(dtype=np.float64)
             if np.isnan(X).any() or np.isnan(y).any():
                 continue
 
             model = fit_ridge_timeaware(X, y, cfg.alphas)
 
             # Historie (Anomalien) bis Cutoff für Rekursion
-            hist = []
-            for kk in range(k_cut-59, k_cut+1):
-                try: hist.append(float(L.loc[(country, kk), "anomaly_c"]))
-                except KeyError: hist.append(np.nan)
+            hist = L.take("anomaly_c", country, np.arange(k_cut-59, k_cut+1))
             s = pd.Series(hist).fillna(method="ffill").fillna(method="bfill")
             hist = list(s.values)
 
@@ -168,22 +188,15 @@ def main():
                 y_tgt, m_tgt = key_to_ym(k_tgt)
                 # --- robust climatology + optional truth (Zukunft erlaubt) ---
                 # 1) Climatology ermitteln: erst Lookup L, sonst Monatsmittel als Fallback
-                try:
-                    clim = float(L.loc[(country, k_tgt), "clim_temp_c"])
-                except KeyError:
+                if L.has(country, k_tgt):
+                    clim = L.get("clim_temp_c", country, k_tgt)
+                else:
                     # Monatsmittel pro Land/Monat aus Historie als Fallback
-                    if "CLM_MAP" not in globals():
-                        # einmalig aufbauen: mean(clim_temp_c) je (country, month)
-                        _clm = anom.groupby(["country", "month"], as_index=False)["clim_temp_c"].mean()
-                        globals()["CLM_MAP"] = {(str(r["country"]).strip(), int(r["month"])): float(r["clim_temp_c"])
-                                                for _, r in _clm.iterrows()}
-                    clim = float(globals()["CLM_MAP"].get((country, m_tgt), np.nan))
+                    r = L.row(country)
+                    clim = float(clm_map[r, m_tgt-1]) if r is not None else np.nan
 
                 # 2) Truth ist für Zukunft nicht vorhanden -> optional/NaN
-                try:
-                    truth_c = float(L.loc[(country, k_tgt), "temp_c"])
-                except KeyError:
-                    truth_c = np.nan
+                truth_c = L.get("temp_c", country, k_tgt)
 
                 # Feature-Vektor aus State
                 mon_sin = math.sin(2*math.pi*m_tgt/12.0)
@@ -237,4 +250,5 @@ def main():
     print("[OK] Forecasts written:", cfg.out_forecasts)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    print_peak_rss()
\ No newline at end of file
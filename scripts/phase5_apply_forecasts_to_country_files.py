@@ -9,13 +9,26 @@ Input schema expected in forecasts:
 
 Country file schema (as in your repo):
   date, year, month, temp_c, country
+
+Files with exactly that header and sorted months are not parsed: the last month comes from
+the byte-offset index (csv_index.py) and the new rows are appended as pre-formatted lines.
+
+With --store_dir the forecasts are also appended to the columnar monthly store, after each
+partition's own last month there (a store that is ahead of the CSVs keeps its observations;
+--allow_overwrite replaces the CSV's months in the store too, with a warning), and recorded
+as a new vintage (monthly_store.snapshot), so earlier vintages stay readable via --as_of.
 """
 from __future__ import annotations
-import argparse
+import argparse, shutil, sys
 from pathlib import Path
 import pandas as pd
 import numpy as np
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+from country_ids import CountryIds  # noqa: E402
+from csv_index import STD_COLUMNS, CsvIndex, append_lines  # noqa: E402
+import monthly_store  # noqa: E402
+
 REQ = ["country","year","month","cutoff_ym","horizon","pred_c"]
 
 def norm(s:str)->str: return str(s).strip()
@@ -23,6 +36,40 @@ def ym_key(y:int,m:int)->int: return int(y)*12 + (int(m)-1)
 def key_to_ym(k:int)->tuple[int,int]: return k//12, (k%12)+1
 def midmonth(y:int,m:int)->str: return f"{int(y):04d}-{int(m):02d}-15"
 
+def append_indexed(p: Path, dest: Path, idx: CsvIndex, F_idx: pd.DataFrame, ids: CountryIds) -> tuple[str, int, pd.DataFrame]:
+    """Fast path: (country, last_k, appended k/pred_c rows) without parsing the file."""
+    if idx.last_k is None:
+        file_country = p.stem
+    else:
+        file_country = norm(idx.row_bytes(p, len(idx) - 1).decode("utf-8").rstrip("\r\n").split(",")[-1])
+    file_id = ids.assign(file_country, aliases=[p.stem])
+    last_k = -1 if idx.last_k is None else idx.last_k
+    if dest.resolve() != p.resolve():
+        shutil.copyfile(p, dest)
+        idx.save(dest)
+    try:
+        sub = F_idx.loc[[file_id]].reset_index()
+    except KeyError:
+        print(f"[INFO] {p.name}: no forecasts for country='{file_country}'")
+        return file_country, last_k, F_idx.iloc[:0].reset_index()
+    sub = sub[sub["k"] > last_k].sort_values("k").head(60)
+    lines = []
+    for k, pred in zip(sub["k"].astype(int), sub["pred_c"].astype(float)):
+        y, m = key_to_ym(k)
+        temp = "" if np.isnan(pred) else repr(float(pred))  # empty field, as to_csv writes NaN
+        lines.append(f"{midmonth(y,m)},{y},{m},{temp},{file_country}")
+    if lines:
+        append_lines(dest, lines, sub["k"].to_numpy(), idx)
+    return file_country, last_k, sub
+
+def forecasts_after(F_idx: pd.DataFrame, file_id: int, last_k: int) -> pd.DataFrame:
+    """The next 60 forecast months (k, pred_c, ...) of one country after last_k."""
+    try:
+        sub = F_idx.loc[[file_id]].reset_index()
+    except KeyError:
+        return F_idx.iloc[:0].reset_index()
+    return sub[sub["k"] > last_k].sort_values("k").head(60)
+
 def latest_cutoff(df: pd.DataFrame)->str:
     def k(s): y,m = s.split("-"); return int(y)*12 + int(m) - 1
     return sorted(df["cutoff_ym"].unique(), key=k)[-1]
@@ -34,6 +81,10 @@ def main():
     ap.add_argument("--out_dir", required=True, help="output directory for updated country CSVs")
     ap.add_argument("--allow_overwrite", action="store_true",
                     help="if set, replace existing months; otherwise only append truly new months")
+    ap.add_argument("--store_dir", default=None,
+                    help="Also append the forecast months to this columnar monthly store and snapshot it.")
+    ap.add_argument("--snapshot", default=None,
+                    help="Name of the store vintage (default: forecast-<cutoff>-<UTC timestamp>).")
     args = ap.parse_args()
 
     cdir = Path(args.country_dir)
@@ -44,8 +95,9 @@ def main():
     if miss:
         raise ValueError(f"Forecasts missing columns: {miss}")
 
-    # normalize forecasts
-    F["country"] = F["country"].map(norm)
+    # forecasts keyed by canonical country ID (any spelling of the name resolves)
+    ids = CountryIds.load()
+    F["country_id"] = ids.ids_for(F["country"])
     F["year"]    = F["year"].astype(int)
     F["month"]   = F["month"].astype(int)
 
@@ -56,10 +108,22 @@ def main():
         raise ValueError("No rows at latest cutoff in forecasts.")
     F["k"] = F.apply(lambda r: ym_key(r["year"], r["month"]), axis=1)
 
-    F_idx = F.set_index(["country","k"]).sort_index()
+    F_idx = F.set_index(["country_id","k"]).sort_index()
 
     total_added = 0
+    store_rows = []  # (country, country_id, k, temp_c) appended to each CSV
     for p in sorted(cdir.glob("*.csv")):
+        idx = CsvIndex.load(p)
+        if idx is not None and idx.header == STD_COLUMNS:
+            file_country, last_k, sub = append_indexed(p, outdir / p.name, idx, F_idx, ids)
+            added = len(sub)
+            store_rows.append((file_country, ids.id_of(file_country), sub["k"].to_numpy(dtype=int),
+                               sub["pred_c"].to_numpy(dtype=float)))
+            total_added += added
+            print(f"[OK] {p.name}: last_k={last_k} +{added} rows (cutoff {lc})")
+            continue
+
+        # unsorted or non-standard file: full parse
         try:
             df = pd.read_csv(p)
         except Exception as e:
@@ -71,6 +135,7 @@ def main():
             continue
 
         file_country = norm(df["country"].iloc[0]) if not df.empty else p.stem
+        file_id = ids.assign(file_country, aliases=[p.stem])
         # last existing (y,m) in this country file
         if df.empty:
             last_k = -1
@@ -81,7 +146,7 @@ def main():
 
         # get all forecast months strictly after last_k
         try:
-            sub = F_idx.loc[file_country]
+            sub = F_idx.loc[file_id]
             if isinstance(sub, pd.Series):
                 sub = sub.to_frame().T
         except KeyError:
@@ -127,10 +192,33 @@ def main():
                 out = pd.concat([df, add], ignore_index=True)
                 added = len(add)
 
+        if added:
+            store_rows.append((file_country, file_id, sub["k"].to_numpy(dtype=int), add["temp_c"].to_numpy()))
+        else:
+            store_rows.append((file_country, file_id, np.empty(0, dtype=int), np.empty(0)))
         out.to_csv(outdir / p.name, index=False)
         total_added += added
         print(f"[OK] {p.name}: last_k={last_k} +{added} rows (cutoff {lc})")
 
+    if args.store_dir and store_rows:
+        store_dir = Path(args.store_dir)
+        n_added = n_replaced = 0
+        for country, file_id, k, temp in store_rows:
+            if not args.allow_overwrite:
+                # the store may be ahead of the (trimmed) CSV: continue after its own last month
+                sub = forecasts_after(F_idx, file_id, monthly_store.last_key(store_dir, country))
+                k, temp = sub["k"].to_numpy(dtype=int), sub["pred_c"].to_numpy(dtype=float)
+            added, replaced = monthly_store.append_partition(store_dir, country, k, {"temp_c": temp},
+                                                             overwrite=args.allow_overwrite)
+            if replaced:
+                print(f"[WARN] store {country}: {replaced} existing months replaced by forecasts (--allow_overwrite)")
+            n_added += added
+            n_replaced += replaced
+        monthly_store.refresh_meta(store_dir, ids)
+        name = args.snapshot or f"forecast-{lc}-{pd.Timestamp.utcnow():%Y%m%dT%H%M%SZ}"
+        snap = monthly_store.snapshot(store_dir, name, note=f"phase5 forecasts {Path(args.forecasts).name} cutoff {lc}")
+        print(f"[OK] store: +{n_added} months, {n_replaced} replaced, snapshot {snap}")
+
     print(f"[DONE] total added rows: {total_added}")
 
 if __name__ == "__main__":
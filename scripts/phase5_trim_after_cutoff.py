@@ -21,18 +21,21 @@ Beispiele:
     --out_dir src/data/temperature/temp_per_country_trimmed \
     --drop_from_cutoff
 
-  # 3) In place überschreiben (Vorsicht!)
-  python scripts/phase5_trim_after_cutoff.py \
-    --country_dir src/data/temperature/temp_per_country \
-    --cutoff_ym 2024-12 \
-    --out_dir src/data/temperature/temp_per_country \
-    --drop_from_cutoff
+Sortierte Dateien werden über den Byte-Offset-Index (csv_index.py, Sidecar *.csv.idx.npz)
+gekürzt: Kopie des Byte-Präfixes statt read_csv + to_csv.
+
+In place wird nicht mehr überschrieben (out_dir == country_dir bricht ab). Für den Stand zu
+einem früheren Zeitpunkt den Store-Snapshot lesen (monthly_store.snapshot, Skripte mit
+--input_store ... --as_of <snapshot>) bzw. read_monthly(end=cutoff).
 """
 from __future__ import annotations
-import argparse
+import argparse, sys
 from pathlib import Path
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+from csv_index import CsvIndex, truncate_after  # noqa: E402
+
 REQ = {"date","year","month","temp_c","country"}
 
 def ym_to_key(ym: str) -> int:
@@ -43,7 +46,7 @@ def main():
     ap = argparse.ArgumentParser(description="Delete rows from cutoff onward in per-country CSVs.")
     ap.add_argument("--country_dir", required=True, help="Folder with country CSVs")
     ap.add_argument("--cutoff_ym",   required=True, help="YYYY-MM (e.g., 2024-12)")
-    ap.add_argument("--out_dir",     required=True, help="Output folder (can be same as input to overwrite)")
+    ap.add_argument("--out_dir",     required=True, help="Output folder (must differ from --country_dir)")
     ap.add_argument("--drop_from_cutoff", action="store_true",
                     help="If set, drop rows with ym >= cutoff (default: drop only ym > cutoff)")
     ap.add_argument("--dry_run", action="store_true", help="Report only, write nothing")
@@ -51,6 +54,9 @@ def main():
 
     indir  = Path(args.country_dir)
     outdir = Path(args.out_dir)
+    if outdir.resolve() == indir.resolve():
+        raise SystemExit("In-place trimming was removed: write to a separate --out_dir, or read an earlier "
+                         "vintage of the monthly store with --input_store ... --as_of <snapshot>.")
     outdir.mkdir(parents=True, exist_ok=True)
 
     k_cut = ym_to_key(args.cutoff_ym)
@@ -67,7 +73,25 @@ def main():
     print(f"[INFO] cutoff_ym = {args.cutoff_ym}  -> key={k_cut}  (dropping rows {cmp_desc})")
     print(f"[INFO] out_dir   = {outdir}   dry_run={args.dry_run}")
 
+    # keep rows with k <= k_keep
+    k_keep = k_cut - 1 if args.drop_from_cutoff else k_cut
+
     for p in files:
+        idx = CsvIndex.load(p, save=not args.dry_run)
+        if idx is not None and REQ.issubset(idx.header):
+            kept = idx.rows_through(k_keep)
+            dropped = len(idx) - kept
+            total_drop += dropped
+            total_keep += kept
+            if args.dry_run:
+                print(f"[DRY]  {p.name}: dropped={dropped}, kept={kept}")
+                continue
+            dest = outdir / p.name
+            truncate_after(p, k_keep, idx, dest)
+            print(f"[OK]   {p.name}: dropped={dropped}, kept={kept} -> {dest}")
+            continue
+
+        # unsorted or non-standard file: full parse
         try:
             df = pd.read_csv(p)
         except Exception as e:
@@ -87,10 +111,7 @@ def main():
         m = df["month"].astype(int)
         k = y*12 + (m-1)
 
-        if args.drop_from_cutoff:
-            mask_keep = k < k_cut
-        else:
-            mask_keep = k <= k_cut
+        mask_keep = k <= k_keep
 
         kept = df[mask_keep].copy()
         dropped = len(df) - len(kept)
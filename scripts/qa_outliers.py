@@ -3,13 +3,19 @@
 from __future__ import annotations
 
 import argparse
+import filecmp
 import json
 import sys
+import tempfile
 from pathlib import Path
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+import monthly_store  # noqa: E402
+from table_io import TableWriter, chunks, print_peak_rss, read_table  # noqa: E402
+
 DEFAULTS = dict(
     country_col="country",          # use English country names
     year_col="year",
@@ -21,20 +27,26 @@ DEFAULTS = dict(
     zrob_thresh=4.0,
 )
 
+# flags are held as one uint8 bitmask per row; the bool columns are only expanded on write
+FLAG_BITS = {"flag_abs_range": 1, "flag_jump_gt15": 2, "flag_z_gt3": 4, "flag_zrob_gt4": 8}
+OUTPUT_ORDER = ["flag_abs_range", "z", "z_robust", "flag_z_gt3", "flag_zrob_gt4", "temp_prev", "flag_jump_gt15", "flag_any_outlier"]
+
 def robust_scale(series: pd.Series) -> pd.Series:
     med = series.median()
     mad = (series - med).abs().median()
     scale = 1.4826 * mad if mad > 0 else np.nan
     if scale and not np.isnan(scale):
         return (series - med) / scale
-    return pd.Series([np.nan] * len(series), index=series.index)
+    # same dtype as the scaled values, so a degenerate group does not upcast its chunk's column
+    return pd.Series(np.nan, index=series.index, dtype=series.dtype)
 
 def classic_z(series: pd.Series) -> pd.Series:
     mu = series.mean()
     sigma = series.std(ddof=1)
     if sigma and not np.isnan(sigma) and sigma > 0:
         return (series - mu) / sigma
-    return pd.Series([np.nan] * len(series), index=series.index)
+    # same dtype as the scaled values, so a degenerate group does not upcast its chunk's column
+    return pd.Series(np.nan, index=series.index, dtype=series.dtype)
 
 def add_outlier_flags(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
     c, y, m, t = cfg["country_col"], cfg["year_col"], cfg["month_col"], cfg["temp_col"]
@@ -42,66 +54,67 @@ def add_outlier_flags(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
     df = df.sort_values([c, y, m]).reset_index(drop=True)
 
     # Absolute range flag
-    df["flag_abs_range"] = df[t].abs() > cfg["abs_temp_limit"]
+    flags = np.where(df[t].abs() > cfg["abs_temp_limit"], FLAG_BITS["flag_abs_range"], 0).astype(np.uint8)
 
     # Group by (country, month) for z-scores
-    grp = df.groupby([c, m], dropna=False)[t]
+    grp = df.groupby([c, m], dropna=False, observed=True)[t]
     df["z"] = grp.transform(classic_z)
     df["z_robust"] = grp.transform(robust_scale)
-    df["flag_z_gt3"] = df["z"].abs() > cfg["z_thresh"]
-    df["flag_zrob_gt4"] = df["z_robust"].abs() > cfg["zrob_thresh"]
+    flags |= np.where(df["z"].abs() > cfg["z_thresh"], FLAG_BITS["flag_z_gt3"], 0).astype(np.uint8)
+    flags |= np.where(df["z_robust"].abs() > cfg["zrob_thresh"], FLAG_BITS["flag_zrob_gt4"], 0).astype(np.uint8)
 
     # Month-to-month jump within country
-    df["temp_prev"] = df.groupby(c)[t].shift(1)
-    df["flag_jump_gt15"] = (df[t] - df["temp_prev"]).abs() > cfg["jump_threshold"]
-
-    # Combined
-    df["flag_any_outlier"] = df[["flag_abs_range","flag_jump_gt15","flag_z_gt3","flag_zrob_gt4"]].any(axis=1)
+    df["temp_prev"] = df.groupby(c, observed=True)[t].shift(1)
+    flags |= np.where((df[t] - df["temp_prev"]).abs() > cfg["jump_threshold"], FLAG_BITS["flag_jump_gt15"], 0).astype(np.uint8)
 
+    df["outlier_flags"] = flags
     return df
 
+def flag_column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Bool view of one flag (or flag_any_outlier) from the bitmask."""
+    bits = df["outlier_flags"]
+    return bits != 0 if name == "flag_any_outlier" else (bits & FLAG_BITS[name]) != 0
+
+def expand_flags(df: pd.DataFrame) -> pd.DataFrame:
+    """Bitmask -> the documented flag_* output columns (docs/QA_POLICY_OUTLIERS.md)."""
+    base = [col for col in df.columns if col not in OUTPUT_ORDER and col != "outlier_flags"]
+    out = df[base].copy()
+    for col in OUTPUT_ORDER:
+        out[col] = df[col] if col in df.columns else flag_column(df, col)
+    return out
+
 def summarize_flags(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
     c = cfg["country_col"]
-    total = df.groupby(c, dropna=False).size().rename("n_rows")
-    flagged = df.groupby(c, dropna=False)["flag_any_outlier"].sum().rename("n_flagged")
+    key = df[c]
+    total = df.groupby(key, dropna=False, observed=True).size().rename("n_rows")
+    flagged = flag_column(df, "flag_any_outlier").groupby(key, dropna=False, observed=True).sum().rename("n_flagged")
     out = pd.concat([total, flagged], axis=1)
     out["pct_flagged"] = (out["n_flagged"] / out["n_rows"]).round(4)
     for col in ["flag_abs_range","flag_jump_gt15","flag_z_gt3","flag_zrob_gt4"]:
-        out[col] = df.groupby(c, dropna=False)[col].sum()
+        out[col] = flag_column(df, col).groupby(key, dropna=False, observed=True).sum()
+    out.index = out.index.astype(object)
     return out.reset_index()
 
-def load_dataset(path: Path) -> pd.DataFrame:
-    suffix = path.suffix.lower()
-    if suffix == ".parquet":
-        return pd.read_parquet(path)
-    if suffix == ".csv":
-        return pd.read_csv(path)
-    if suffix == ".feather":
-        return pd.read_feather(path)
-    raise ValueError(f"Unsupported input format: {suffix}")
-
-def save_df(df: pd.DataFrame, path: Path):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    if path.suffix.lower() == ".parquet":
-        df.to_parquet(path, index=False)
-    elif path.suffix.lower() == ".csv":
-        df.to_csv(path, index=False)
-    else:
-        raise ValueError("Output must be .parquet or .csv")
-
+def output_frame(df: pd.DataFrame, bitmask: bool = False) -> pd.DataFrame:
+    if "outlier_flags" in df.columns and not bitmask:
+        return expand_flags(df)
+    return df
 
-def load_from_dir(input_dir: Path, cfg: dict) -> pd.DataFrame:
-    """Read all supported files in a directory. If column `country` exists, use it; otherwise infer from filename (stem).
-    If `year`/`month` are missing but `date` exists, extract them."""
-    files = []
-    for p in input_dir.iterdir():
-        if p.is_file() and p.suffix.lower() in {".csv", ".parquet", ".feather"}:
-            files.append(p)
+def list_input_files(input_dir: Path) -> list[Path]:
+    files = sorted(p for p in input_dir.iterdir() if p.is_file() and p.suffix.lower() in {".csv", ".parquet", ".feather"})
     if not files:
         raise SystemExit(f"No data files found in {input_dir}")
+    return files
+
+def load_from_dir(input_dir: Path, cfg: dict, files: list[Path] | None = None) -> pd.DataFrame:
+    """Read all supported files in a directory (or only `files`). If column `country` exists, use it; otherwise infer from filename (stem).
+    If `year`/`month` are missing but `date` exists, extract them."""
+    if files is None:
+        files = list_input_files(input_dir)
     frames = []
     for p in files:
-        df = load_dataset(p).copy()
+        df = read_table(p, columns=[cfg["country_col"], "date", cfg["year_col"], cfg["month_col"], cfg["temp_col"]],
+                        categorical=False, compact=True).copy()
 
         # Ensure country column
         if cfg["country_col"] in df.columns:
@@ -130,15 +143,72 @@ def load_from_dir(input_dir: Path, cfg: dict) -> pd.DataFrame:
         keep_cols = [cfg["country_col"], cfg["year_col"], cfg["month_col"], cfg["temp_col"]]
         frames.append(df[keep_cols])
 
-    return pd.concat(frames, ignore_index=True)
+    df = pd.concat(frames, ignore_index=True)
+    df[cfg["country_col"]] = df[cfg["country_col"]].astype(str).astype("category")
+    return df
+
+def load_from_store(store_dir: Path, cfg: dict, countries: list[str] | None = None,
+                    as_of: str | None = None) -> pd.DataFrame:
+    df = monthly_store.read_monthly(store_dir, columns=["country","year","month","temp_c"],
+                                    countries=countries, as_of=as_of)
+    df["country"] = df["country"].cat.set_categories(sorted(df["country"].cat.categories))
+    return df.rename(columns={"country": cfg["country_col"], "year": cfg["year_col"],
+                              "month": cfg["month_col"], "temp_c": cfg["temp_col"]})
+
+def iter_partitions(args, cfg: dict, n: int):
+    """Input frames, one per group of `n` countries (all flags are computed within a
+    country, so partitions are independent). n=0: one frame."""
+    if args.input_store:
+        store_dir = Path(args.input_store)
+        for names in chunks(monthly_store.country_names(store_dir, args.as_of), n):
+            yield load_from_store(store_dir, cfg, names, args.as_of)
+    elif args.input_dir:
+        input_dir = Path(args.input_dir)
+        for files in chunks(list_input_files(input_dir), n):
+            yield load_from_dir(input_dir, cfg, files)
+    else:
+        if n:
+            raise SystemExit("--chunk_countries needs --input_dir or --input_store")
+        yield read_table(Path(args.input), compact=True)
+
+def flag_all(args, cfg: dict, output: Path, n: int) -> tuple[pd.DataFrame, int, int, int]:
+    """Flag every partition of `n` countries into `output`; (summary, rows in, rows out, flagged)."""
+    required = [cfg["country_col"], cfg["year_col"], cfg["month_col"], cfg["temp_col"]]
+    summaries = []
+    rows_in = n_flagged = 0
+    with TableWriter(output) as out:
+        for df in iter_partitions(args, cfg, n):
+            # basic column checks
+            missing = [col for col in required if col not in df.columns]
+            if missing:
+                raise SystemExit(f"Missing columns: {missing}. Available: {list(df.columns)}")
+
+            df_flags = add_outlier_flags(df, cfg)
+            out.write(output_frame(df_flags, args.flags_bitmask))
+            summaries.append(summarize_flags(df_flags, cfg))
+            rows_in += len(df)
+            n_flagged += int((df_flags["outlier_flags"] != 0).sum())
+            del df, df_flags
+    return pd.concat(summaries, ignore_index=True), rows_in, out.rows, n_flagged
+
 def main():
     p = argparse.ArgumentParser(description="Phase 1 – Item 4: Outlier flags for monthly data (supports per-country directory input).")
     g = p.add_mutually_exclusive_group(required=True)
     g.add_argument("--input", help="Path to single monthly dataset (parquet/csv) with columns: country, year, month, temp_c")
     g.add_argument("--input_dir", help="Path to directory with one file per country (e.g., src/data/tempPerCountry). Country is derived from filename.")
+    g.add_argument("--input_store", help="Path to the columnar monthly store written by temp_data.py (src/data/temperature/monthly_store).")
+    p.add_argument("--as_of", default=None, help="Snapshot of --input_store to read (monthly_store.list_snapshots; 'latest' = newest). Default: live store.")
     p.add_argument("--output", required=True, help="Output file (.parquet or .csv) with outlier flags")
     p.add_argument("--summary_csv", required=True, help="Aggregation report per country (.csv)")
     p.add_argument("--summary_json", required=True, help="Metadata/parameters (.json)")
+    p.add_argument("--flags_bitmask", action="store_true",
+                   help="Write one uint8 `outlier_flags` column (bits: " + ", ".join(f"{v}={k}" for k, v in FLAG_BITS.items())
+                        + ") instead of the flag_* bool columns.")
+    p.add_argument("--chunk_countries", type=int, default=0,
+                   help="Process N countries (files/store partitions) at a time and append to the outputs; "
+                        "bounded memory, same results as long as file names sort like their countries. 0 = all at once.")
+    p.add_argument("--check_chunking", action="store_true",
+                   help="With --chunk_countries: also run in one pass and fail unless both outputs are byte-identical.")
 
     p.add_argument("--country_col", default=DEFAULTS["country_col"])
     p.add_argument("--year_col", default=DEFAULTS["year_col"])
@@ -161,33 +231,34 @@ def main():
         zrob_thresh=args.zrob_thresh,
     )
 
-    if args.input_dir:
-        df = load_from_dir(Path(args.input_dir), cfg)
-    else:
-        df = load_dataset(Path(args.input))
-
-    # basic column checks
-    required = [cfg["country_col"], cfg["year_col"], cfg["month_col"], cfg["temp_col"]]
-    missing = [col for col in required if col not in df.columns]
-    if missing:
-        raise SystemExit(f"Missing columns: {missing}. Available: {list(df.columns)}")
-
-    df_flags = add_outlier_flags(df, cfg)
-    save_df(df_flags, Path(args.output))
-
-    summary = summarize_flags(df_flags, cfg)
+    summary, rows_in, rows_out, n_flagged = flag_all(args, cfg, Path(args.output), args.chunk_countries)
     Path(args.summary_csv).parent.mkdir(parents=True, exist_ok=True)
     summary.to_csv(args.summary_csv, index=False)
 
+    if args.check_chunking and args.chunk_countries:
+        # same run in one pass; the outputs must match byte for byte
+        with tempfile.TemporaryDirectory() as tmp:
+            ref = Path(tmp) / Path(args.output).name
+            ref_summary, *_ = flag_all(args, cfg, ref, 0)
+            ref_summary.to_csv(Path(tmp) / "summary.csv", index=False)
+            if ref.suffix.lower() == ".csv":
+                same = filecmp.cmp(ref, args.output, shallow=False)
+            else:  # row groups differ per chunk, so compare the data (values and dtypes)
+                same = pd.read_parquet(ref).equals(pd.read_parquet(args.output))
+            same = same and filecmp.cmp(Path(tmp) / "summary.csv", args.summary_csv, shallow=False)
+        if not same:
+            raise SystemExit(f"[FAIL] --chunk_countries {args.chunk_countries} output differs from the single-pass output")
+        print("[OK] chunked output is byte-identical to the single-pass output")
+
     meta = {
         "timestamp": datetime.utcnow().isoformat() + "Z",
-        "input": args.input if args.input else args.input_dir,
+        "input": args.input or args.input_dir or args.input_store,
         "output": args.output,
         "summary_csv": args.summary_csv,
         "params": cfg,
-        "rowcount_input": int(len(df)),
-        "rowcount_output": int(len(df_flags)),
-        "n_flagged_total": int(df_flags["flag_any_outlier"].sum()),
+        "rowcount_input": int(rows_in),
+        "rowcount_output": int(rows_out),
+        "n_flagged_total": n_flagged,
     }
     with open(args.summary_json, "w", encoding="utf-8") as f:
         json.dump(meta, f, indent=2, ensure_ascii=False)
@@ -198,3 +269,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+    print_peak_rss()
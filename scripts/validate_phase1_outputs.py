@@ -2,19 +2,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import argparse, json
+import argparse, json, sys
 from pathlib import Path
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
-def load_any(path: Path) -> pd.DataFrame:
-    sfx = path.suffix.lower()
-    if sfx == ".csv":
-        return pd.read_csv(path)
-    if sfx == ".parquet":
-        return pd.read_parquet(path)
-    raise ValueError(f"Unsupported file: {path}")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data" / "temperature"))
+from table_io import read_table  # noqa: E402
 
 def main():
     ap = argparse.ArgumentParser(description="Phase 1 – Step 10: Validate final outputs and basic consistency.")
@@ -29,14 +24,15 @@ def main():
     args = ap.parse_args()
 
     # Load required files
-    clim = load_any(Path(args.climatology))
-    anom = load_any(Path(args.anomalies))
+    # joins below run on plain string keys
+    clim = read_table(Path(args.climatology), categorical=False)
+    anom = read_table(Path(args.anomalies), categorical=False)
 
     # Optional files
     ref_df = pd.read_csv(args.reference_periods) if args.reference_periods and Path(args.reference_periods).exists() else None
     outliers_df = pd.read_csv(args.outliers_summary) if args.outliers_summary and Path(args.outliers_summary).exists() else None
     sp_df = pd.read_csv(args.sanity_persistence) if args.sanity_persistence and Path(args.sanity_persistence).exists() else None
-    clean_df = load_any(Path(args.monthly_clean)) if args.monthly_clean and Path(args.monthly_clean).exists() else None
+    clean_df = read_table(Path(args.monthly_clean), categorical=False) if args.monthly_clean and Path(args.monthly_clean).exists() else None
 
     # Checks per country
     # 1) climatology has 12 rows per country
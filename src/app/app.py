@@ -1,17 +1,50 @@
+import gzip
+import hashlib
 import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import streamlit as st
 from streamlit.components.v1 import html
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "data" / "temperature"))
+from country_ids import CountryIds  # noqa: E402
+from slice_api import DEFAULT_VARIANT, PORT as API_PORT, SliceApi  # noqa: E402
+from yearly_temp_data import BASE_YEARS, IN_DIR as MONTHLY_DIR, aggregate_yearly, list_monthly_csvs, load_monthly_dir  # noqa: E402
+
 DATA_CSV = Path("src/data/temperature/temp_per_country/yearly_temp_aggregated/country_year.csv")
+# selectable datasets: the published CSV plus every forecasts*.csv in VARIANT_DIR
+VARIANT_DIR = Path("models")
+PUBLISHED = DEFAULT_VARIANT
+FORECAST_COLS = {"country", "year", "month", "cutoff_ym", "horizon", "pred_c"}
+DOC_CACHE_ITEMS = 3                   # rendered variants kept (least recently used dropped first)
+DOC_CACHE_BYTES = 64 * 2**20
 ANOM_CLIP = (-3.0, 3.0)
+# globe grids are served as files by Streamlit's static serving (.streamlit/config.toml)
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+STATIC_URL = "app/static"
+VENDOR_DIR = STATIC_DIR / "vendor"
+REMOTE_ASSETS = {
+    "geo": "https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/ne_110m_admin_0_countries.geojson",
+    "day": "https://unpkg.com/three-globe/example/img/earth-blue-marble.jpg",
+    "bump": "https://unpkg.com/three-globe/example/img/earth-topology.png",
+    "sky": "https://unpkg.com/three-globe/example/img/night-sky.png",
+    "three": "https://unpkg.com/three@0.155.0/build/three.min.js",
+    "globe": "https://unpkg.com/globe.gl@2.33.1/dist/globe.gl.min.js",
+}
+GRID_SCALE = 100                      # int16 hundredths of °C
+NA_Q = int(np.iinfo(np.int16).min)    # missing value in a grid
 
 BLOG_HTML = """
 <h1 style="margin: 0 0 8px 0;">What is ClimateWiz?</h1>
 <p style="margin: 0 0 12px 0;">
   ClimateWiz is an interactive globe that lets you explore how countries have warmed over time.
-  It visualizes either <b>temperature anomalies</b> (change relative to a 1901–2029 baseline)
+  It visualizes either <b>temperature anomalies</b> (change relative to a baseline period, by default __BASE__)
   or <b>absolute annual temperatures</b>.
 </p>
 <h2 style="margin: 16px 0 6px 0;">How to read the colors</h2>
@@ -19,7 +52,7 @@ BLOG_HTML = """
   <li><b>Blue → White → Red</b>: cooler to warmer along the selected scale.</li>
   <li>
     In <b>Anomaly</b> mode, red means the selected year is warmer than that country’s
-    1901–2029 average; blue means cooler.
+    baseline average; blue means cooler. The <b>Baseline</b> selectors change the period instantly.
   </li>
   <li>In <b>Absolute</b> mode, colors map to actual °C (cold to hot climates).</li>
 </ul>
@@ -46,7 +79,7 @@ BLOG_HTML = """
 <h2 style="margin: 16px 0 6px 0;">What’s a temperature anomaly?</h2>
 <p style="margin: 0 0 12px 0;">
   A temperature anomaly is the difference between the selected year’s average temperature and the country’s
-  <b>1901–2029</b> average. <b>ΔT &gt; 0</b> means warmer than that baseline; <b>ΔT &lt; 0</b> means cooler.
+  average over the baseline period (default <b>__BASE__</b>). <b>ΔT &gt; 0</b> means warmer than that baseline; <b>ΔT &lt; 0</b> means cooler.
   This makes trends comparable across climates.
 </p>
 <h2 style="margin: 16px 0 6px 0;">How projections are shown</h2>
@@ -58,7 +91,7 @@ BLOG_HTML = """
 <h2 style="margin: 16px 0 6px 0;">Methodology (short)</h2>
 <ul style="margin: 0 0 12px 18px;">
   <li>Source: CRU TS v4.09 (country-aggregated annual means) with appended projections where available.</li>
-  <li>Anomalies: year minus each country’s 1901–2029 mean.</li>
+  <li>Anomalies: year minus each country’s mean annual temperature over the baseline (default __BASE__; monthly mode: calendar-month means over __BASE__).</li>
   <li>Aggregation: monthly to annual means; countries require sufficient monthly coverage.</li>
   <li>Country names are harmonized; small territories may be excluded.</li>
 </ul>
@@ -78,8 +111,6 @@ BLOG_HTML = """
   Tip: Use anomaly mode for trend detection; use absolute °C for intuitive communication.
 </p>
 """
-BLOG_JSON = json.dumps(BLOG_HTML)
-
 st.set_page_config(page_title="ClimateWiz", page_icon="🌍", layout="wide", initial_sidebar_state="collapsed")
 st.markdown("""
 <style>
@@ -105,36 +136,215 @@ st.markdown("""
   border-radius:8px; padding:4px 8px; cursor:pointer; }
 .info-text{ font:12px/1.45 system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial, sans-serif; color:#ddd; margin-bottom:8px; white-space:normal;}
 .info-svg{ width:100%; height:90px; display:block; border:1px solid rgba(255,255,255,.15); border-radius:8px; background:rgba(255,255,255,.05); }
+/* dataset selector floats over the full-screen globe */
+[data-testid="stSelectbox"] { position:fixed !important; left:16px; bottom:16px; width:260px !important; z-index:10000; }
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data(show_spinner=False)
-def load_payload(csv_path: Path, mtime: float) -> dict:
-    df = pd.read_csv(csv_path)
-    req = {"country", "year", "temp_c", "base", "anom"}
-    missing = req - set(df.columns)
-    if missing:
-        raise ValueError(f"Missing columns in {csv_path}: {missing}")
-    df["country_norm"] = (df["country"].astype(str).str.replace("_", " ", regex=False).str.strip())
-    years = sorted(df["year"].dropna().astype(int).unique().tolist())
-    years_str = [str(y) for y in years]
-    values_anom, values_abs = {}, {}
-    for y in years:
-        sub = df[df["year"] == y]
-        values_anom[str(y)] = {c: float(v) for c, v in zip(sub["country_norm"], sub["anom"].round(3))}
-        values_abs[str(y)] = {c: float(v) for c, v in zip(sub["country_norm"], sub["temp_c"].round(2))}
+def pivot(df: pd.DataFrame, col: str, rows: np.ndarray, cols: np.ndarray, shape: tuple) -> np.ndarray:
+    """(country x year) matrix of `col` in one scatter; NaN where a country has no value."""
+    mat = np.full(shape, np.nan)
+    mat[rows, cols] = df[col].to_numpy(dtype=np.float64)
+    return mat
+
+def encode_grid(mat: np.ndarray) -> bytes:
+    """(country x year) °C matrix -> gzip of int16 hundredths, delta-encoded along the years
+    of each country (first value absolute, NA_Q = missing; the front-end keeps a running sum)."""
+    na = np.isnan(mat)
+    q = np.rint(np.where(na, 0.0, mat) * GRID_SCALE).astype(np.int64)
+    # carry the last valid value across gaps so the running sum skips them
+    last = np.where(na, 0, np.arange(mat.shape[1]))
+    np.maximum.accumulate(last, axis=1, out=last)
+    delta = np.diff(np.take_along_axis(q, last, axis=1), axis=1, prepend=0)
+    if delta.size and (delta[~na].min(initial=0) <= NA_Q or delta[~na].max(initial=0) > np.iinfo(np.int16).max):
+        raise ValueError("grid step outside the int16 range")
+    delta[na] = NA_Q
+    return gzip.compress(delta.astype("<i2").tobytes(), compresslevel=9, mtime=0)
+
+def publish_asset(name: str, data: bytes) -> str:
+    """Write `data` to STATIC_DIR under a content-hashed name (so browsers may cache it for
+    good) and drop older versions; returns the URL relative to the app root."""
+    fname = f"{name}.{hashlib.sha256(data).hexdigest()[:16]}.bin.gz"
+    path = STATIC_DIR / fname
+    if not path.is_file():
+        STATIC_DIR.mkdir(exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+        for old in STATIC_DIR.glob(f"{name}.*.bin.gz"):
+            if old != path:
+                old.unlink(missing_ok=True)
+    return f"{STATIC_URL}/{fname}"
+
+def series_stats(mat: np.ndarray) -> dict:
+    """Per country row of a (country x year) matrix: OLS slope over the year index in °C per
+    decade, min and max of the valid values (null with fewer than two values)."""
+    ok = ~np.isnan(mat)
+    n = ok.sum(axis=1)
+    x = np.where(ok, np.arange(mat.shape[1], dtype=np.float64), 0.0)
+    y = np.where(ok, mat, 0.0)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    denom = n * (x * x).sum(axis=1) - sx * sx
+    has = (n >= 2) & (denom != 0)
+    slope = (n * (x * y).sum(axis=1) - sx * sy) / np.where(has, denom, 1.0)
+    lo = np.where(ok, mat, np.inf).min(axis=1)
+    hi = np.where(ok, mat, -np.inf).max(axis=1)
+    def col(a, decimals):
+        return [round(float(v), decimals) if h else None for v, h in zip(a, has)]
+    return {"slope10": col(slope * 10, 3), "min": col(lo, 2), "max": col(hi, 2)}
+
+def build_payload(df: pd.DataFrame, ids: CountryIds) -> dict:
+    """Globe payload: one year list and per metric an encoded (country x year) grid
+    (encode_grid) that publish_assets() turns into a static file. Row i is country_id i,
+    the same index scripts/build_app_assets.py stamps on the vendored polygons."""
+    df = df.dropna(subset=["year"])
+    rows = ids.ids_for(df["country"])
+    cols, years = pd.factorize(df["year"].astype(int), sort=True)
+    shape = (int(rows.max()) + 1 if len(rows) else 0, len(years))
     q1, q99 = df["temp_c"].quantile([0.01, 0.99]).tolist()
     abs_clip = (float(round(q1, 1)), float(round(q99, 1)))
+    mats = {"anom": pivot(df, "anom", rows, cols, shape), "abs": pivot(df, "temp_c", rows, cols, shape)}
+    year_list = [int(y) for y in years]
+    x_ticks = [str(y) for y in dict.fromkeys([*year_list[:1], 1950, 2000, *year_list[-1:]]) if y in year_list]
     return {
-        "years": years_str,
-        "values": {"anom": values_anom, "abs": values_abs},
+        "years": [str(y) for y in year_list],
+        "names": [ids.name_of(i) for i in range(shape[0])],
+        "grids": {m: encode_grid(a) for m, a in mats.items()},
+        "matrices": mats,
+        "stats": {m: series_stats(a) for m, a in mats.items()},
+        "x_ticks": x_ticks,
+        "base_years": [str(y) for y in BASE_YEARS],
+        "scale": GRID_SCALE, "na": NA_Q,
+        "country_ids": ids.lookup_table(),
         "clips": {"anom": ANOM_CLIP, "abs": abs_clip},
         "units": {"anom": "Relative Temperature Deviation ΔT (°C)", "abs": "Temperature (°C)"},
         "default_metric": "anom"
     }
 
-payload = load_payload(DATA_CSV, DATA_CSV.stat().st_mtime)
-PAYLOAD_JSON = json.dumps(payload)
+def data_version(csv_path: Path) -> tuple[int, str]:
+    """(mtime_ns, sha256) of the data file; the file is only hashed again when its
+    mtime/size change."""
+    info = csv_path.stat()
+    return info.st_mtime_ns, file_digest(str(csv_path), info.st_mtime_ns, info.st_size)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def file_digest(path: str, mtime_ns: int, size: int) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+def build_monthly(mdf: pd.DataFrame, ids: CountryIds) -> dict:
+    """Monthly mode: the (country x month) matrices cut into calendar decades, one encoded
+    grid per decade and metric. anom = temp_c minus the country's calendar-month mean over
+    BASE_YEARS (the annual anomalies' base)."""
+    rows = ids.ids_for(mdf["country"])
+    k = mdf["year"].to_numpy(dtype=np.int64) * 12 + mdf["month"].to_numpy(dtype=np.int64) - 1
+    k0, k1 = int(k.min()), int(k.max())
+    temp = np.full((int(rows.max()) + 1, k1 - k0 + 1), np.nan)
+    temp[rows, k - k0] = mdf["temp_c"].to_numpy(dtype=np.float64)
+    keys = np.arange(k0, k1 + 1)
+    cal, in_base = keys % 12, (keys // 12 >= BASE_YEARS[0]) & (keys // 12 <= BASE_YEARS[1])
+    clim = np.full((temp.shape[0], 12), np.nan)
+    for m in range(12):
+        sub = temp[:, in_base & (cal == m)]
+        n = (~np.isnan(sub)).sum(axis=1)
+        clim[:, m] = np.where(n > 0, np.nansum(sub, axis=1) / np.maximum(n, 1), np.nan)
+    mats = {"anom": temp - clim[:, cal], "abs": temp}
+    chunks = []
+    for d0 in range(k0 - k0 % 120, k1 + 1, 120):
+        a, b = max(d0, k0), min(d0 + 120, k1 + 1)
+        chunks.append({"decade": d0 // 12, "k0": a, "n": b - a,
+                       "grids": {m: encode_grid(x[:, a - k0:b - k0]) for m, x in mats.items()}})
+    q1, q99 = np.nanquantile(temp, [0.01, 0.99])
+    lim = float(round(np.nanmax(np.abs(np.nanquantile(mats["anom"], [0.01, 0.99]))), 1))
+    return {"k0": k0, "n": k1 - k0 + 1, "chunks": chunks,
+            "clips": {"anom": (-lim, lim), "abs": (float(round(q1, 1)), float(round(q99, 1)))}}
+
+def monthly_version() -> tuple[int, int]:
+    """(files, newest mtime_ns) of the monthly CSVs behind the monthly mode."""
+    files = list_monthly_csvs()
+    return len(files), max((p.stat().st_mtime_ns for p in files), default=0)
+
+def load_monthly(ids: CountryIds) -> dict | None:
+    files = list_monthly_csvs()
+    if not files:
+        return None
+    mdf, _ = load_monthly_dir(files, jobs=8)
+    return build_monthly(mdf, ids)
+
+def load_payload(csv_path: Path) -> dict:
+    df = pd.read_csv(csv_path)
+    req = {"country", "year", "temp_c", "base", "anom"}
+    missing = req - set(df.columns)
+    if missing:
+        raise ValueError(f"Missing columns in {csv_path}: {missing}")
+    ids = CountryIds.load()
+    payload = build_payload(df, ids)
+    payload["monthly"] = load_monthly(ids)
+    return payload
+
+def list_variants() -> dict[str, Path]:
+    """{variant: source file}; PUBLISHED first, then models/forecasts*.csv by name."""
+    out = {PUBLISHED: DATA_CSV}
+    out.update((p.stem.removeprefix("forecasts_"), p) for p in sorted(VARIANT_DIR.glob("forecasts*.csv")))
+    return out
+
+def load_variant_payload(forecasts: Path) -> dict:
+    """Payload for one forecasts CSV: the observed months up to its latest cutoff plus that
+    cutoff's predictions, aggregated like yearly_temp_data.py. Each variant is the published
+    pipeline with a different projection, without rerunning phase 5."""
+    F = pd.read_csv(forecasts)
+    missing = FORECAST_COLS - set(F.columns)
+    if missing:
+        raise ValueError(f"Missing columns in {forecasts}: {missing}")
+    cut = F["cutoff_ym"].astype(str)
+    fk = cut.str[:4].astype(int) * 12 + cut.str[5:7].astype(int) - 1
+    k_cut = int(fk.max())
+    F = F[fk == k_cut]
+    # as phase 5 appends them: the next 60 months after the cutoff; a missing prediction is
+    # written as an empty field there and dropped on load
+    pred = F.rename(columns={"pred_c": "temp_c"})[["country", "year", "month", "temp_c"]]
+    pred = pred.assign(k=pred["year"] * 12 + pred["month"] - 1)
+    pred = (pred[pred["k"] > k_cut].sort_values(["country", "k"])
+            .groupby("country", sort=False).head(60)
+            .drop(columns="k").dropna(subset=["temp_c"]))
+
+    files = list_monthly_csvs()
+    if not files:
+        raise FileNotFoundError(f"No monthly CSVs in {MONTHLY_DIR}")
+    mdf, _ = load_monthly_dir(files, jobs=8)
+    obs = mdf[mdf["year"] * 12 + mdf["month"] - 1 <= k_cut]
+    mdf = pd.concat([obs, pred], ignore_index=True)
+
+    # forecasts and country files may spell a country differently; aggregate on the canonical name
+    ids = CountryIds.load()
+    cid = ids.ids_for(mdf["country"])
+    names = np.array([ids.name_of(i) for i in range(int(cid.max()) + 1)], dtype=object)
+    mdf["country"] = names[cid]
+    payload = build_payload(aggregate_yearly(mdf), ids)
+    payload["monthly"] = build_monthly(mdf, ids)
+    return payload
+
+def vendor_urls() -> dict:
+    """Geometry/texture URLs: the local copies from scripts/build_app_assets.py where present,
+    otherwise the public sources."""
+    manifest = VENDOR_DIR / "manifest.json"
+    files = json.loads(manifest.read_text(encoding="utf-8")) if manifest.is_file() else {}
+    return {k: f"{STATIC_URL}/vendor/{files[k]}" if k in files and (VENDOR_DIR / files[k]).is_file() else url
+            for k, url in REMOTE_ASSETS.items()}
+
+def publish_assets(payload: dict, variant: str = PUBLISHED) -> dict:
+    """Payload for the page: grids replaced by the URLs of their static files (named per
+    variant, so publishing one does not prune another's)."""
+    prefix = "globe" if variant == PUBLISHED else f"globe_{variant}"
+    out = {k: v for k, v in payload.items() if k not in ("grids", "matrices")}
+    out["assets"] = {m: publish_asset(f"{prefix}_{m}", data) for m, data in payload["grids"].items()}
+    out["vendor"] = vendor_urls()
+    if payload.get("monthly"):
+        mon = payload["monthly"]
+        out["monthly"] = {**mon, "chunks": [
+            {"k0": c["k0"], "n": c["n"],
+             "assets": {m: publish_asset(f"{prefix}_monthly_{m}_{c['decade']}", data) for m, data in c["grids"].items()}}
+            for c in mon["chunks"]]}
+    return out
 
 HTML = r"""
 <!doctype html>
@@ -157,6 +367,7 @@ HTML = r"""
   .grad{width:220px; height:10px; margin:6px 0 4px;}
   .scale{width:220px; display:flex; justify-content:space-between}
   #range{width:220px;}
+  .panel select{background:rgba(255,255,255,.12); color:#fff; border:1px solid rgba(255,255,255,.25); border-radius:8px; padding:5px 6px}
   #sel{margin-top:4px; font-weight:600;}
   .blog-btn{
     position:fixed; top:16px; left:16px; z-index:9999;
@@ -195,8 +406,8 @@ HTML = r"""
   .info-text{ font:12px/1.45 system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial, sans-serif; color:#ddd; margin-bottom:8px; white-space:normal;}
   .info-svg{ width:100%; height:90px; display:block; border:1px solid rgba(255,255,255,.15); border-radius:8px; background:rgba(255,255,255,.05); }
 </style>
-<script src="https://unpkg.com/three@0.155.0/build/three.min.js"></script>
-<script src="https://unpkg.com/globe.gl@2.33.1/dist/globe.gl.min.js"></script>
+<script src="__THREE__"></script>
+<script src="__GLOBE__"></script>
 </head>
 <body>
 <div id="root"></div>
@@ -229,93 +440,199 @@ HTML = r"""
     <button id="btn-abs">Absolute</button>
     <button id="btn-cb">Colorblind: OFF</button>
     <button id="btn-png">Export PNG</button>
+    <button id="btn-month">Monthly: OFF</button>
   </div>
   <div><b id="unit">__UNIT__</b></div>
   <div class="grad" id="gradBar"></div>
   <div class="scale"><span id="minlbl">__MIN__</span><span id="maxlbl">__MAX__</span></div>
   <input id="range" type="range" />
-  <div id="sel"></div>
+  <div class="row">
+    <button id="btn-play">▶ Play</button>
+    <select id="speed" title="Slider steps (years, or months in monthly mode) per second">
+      <option value="2">2/s</option>
+      <option value="5" selected>5/s</option>
+      <option value="10">10/s</option>
+      <option value="20">20/s</option>
+    </select>
+    <div id="sel"></div>
+  </div>
+  <div class="row" id="baseRow" title="Anomaly baseline (annual mode)">
+    <span>Baseline</span>
+    <select id="base-from"></select>–<select id="base-to"></select>
+  </div>
 </div>
 
 <script>
   const PAYLOAD = __PAYLOAD__;
   const YEARS   = PAYLOAD.years;
-  const VALUES  = PAYLOAD.values;
+  const VALUES  = {};   // metric -> Float32Array [country row * YEARS.length + year], NaN = missing
+  const STATS   = PAYLOAD.stats;   // metric -> {slope10, min, max} per country row
   const CLIPS   = PAYLOAD.clips;
   const UNITS   = PAYLOAD.units;
   const BLOG    = __BLOG__;
   const START_YEAR = '2024';
 
-  const ALIASES = {
-    "United States of America": "USA",
-    "W. Sahara": "Western Sahara",
-    "Dem. Rep. Congo": "DR Congo",
-    "Dominican Rep.": "Dominican Republic",
-    "Falkland Is.": "Falkland Isl",
-    "Fr. S. Antarctic Lands": "French Southern Territories",
-    "Timor-Leste": "East Timor",
-    "Côte d'Ivoire": "Ivory Coast",
-    "Central African Rep.": "Central African Rep",
-    "Eq. Guinea": "Equatorial Guinea",
-    "eSwatini": "Swaziland",
-    "Vanuatu": "Vanatu",
-    "Solomon Is.": "Solomon Isl",
-    "Czechia": "Czech Republic",
-    "Bosnia and Herz.": "Bosnia-Herzegovinia",
-    "North Macedonia": "Macedonia",
-    "S. Sudan": "South Sudan",
-    "Antarctica": null, "N. Cyprus": null, "Somaliland": null,
-    "French Southern Territories": null,
-    "Puerto Rico":"Puerto Rico", "Taiwan":"Taiwan"
-  };
+  const COUNTRY_IDS = PAYLOAD.country_ids;
 
   let selectedCountry = null;
   let scheme = 'normal';
 
-  function csvName(neName) {
-    const raw = String(neName || "").trim();
-    const a = Object.prototype.hasOwnProperty.call(ALIASES, raw) ? ALIASES[raw] : raw;
-    if (a === null) return null;
-    return a.replaceAll("_"," ").replaceAll(".","").trim();
-  }
-  function getValue(map, key){
-    if (!key) return null;
-    if (key in map) return map[key];
-    const space = key.replaceAll("-", " ");
-    if (space in map) return map[space];
-    const hyph  = key.replaceAll(" ", "-");
-    if (hyph in map) return map[hyph];
-    return null;
-  }
-  function seriesForCountry(name, metricKey){
-    const key = csvName(name);
-    const alt1 = key?.replaceAll('-', ' ');
-    const alt2 = key?.replaceAll(' ', '-');
-    const ys = [];
-    for(let i=0;i<YEARS.length;i++){
-      const y = YEARS[i];
-      const map = VALUES[metricKey][y] || {};
-      const v = (key && key in map) ? map[key]
-            : (alt1 && alt1 in map) ? map[alt1]
-            : (alt2 && alt2 in map) ? map[alt2]
-            : null;
-      ys.push(v);
+  // payload row = country_id. Vendored polygons carry it as properties.row; the remote
+  // GeoJSON is resolved by name once (same normalization as country_ids.lookup_key).
+  function lookupKey(name) {
+    return String(name || "").replace(/[\s_.\-]+/g, " ").trim().toLowerCase();
+  }
+  function featureRow(p) {
+    if (p.row === undefined) p.row = COUNTRY_IDS[lookupKey(p.NAME)] ?? null;
+    return p.row;
+  }
+  function assetUrl(u) { return new URL(u, document.baseURI); }
+  function fetchAsset(u) {
+    return fetch(assetUrl(u)).then(r => {
+      if (!r.ok) throw new Error(`${u}: HTTP ${r.status}`);
+      return u.endsWith('.gz') ? new Response(r.body.pipeThrough(new DecompressionStream('gzip'))) : r;
+    });
+  }
+  // grids are static files (int16 hundredths, delta along years, gzip); each metric is
+  // fetched on first use only
+  const loading = {};
+  function decodeGrid(d, n){
+    const out = new Float32Array(d.length);
+    for (let r = 0; r < d.length; r += n){
+      let acc = 0;
+      for (let j = r; j < r + n; j++){
+        if (d[j] === PAYLOAD.na){ out[j] = NaN; continue; }
+        acc += d[j];
+        out[j] = acc / PAYLOAD.scale;
+      }
+    }
+    return out;
+  }
+  function loadMetric(m){
+    if (!loading[m]){
+      loading[m] = fetchAsset(PAYLOAD.assets[m])
+        .then(r => r.arrayBuffer())
+        .then(buf => (VALUES[m] = decodeGrid(new Int16Array(buf), YEARS.length)));
+    }
+    return loading[m];
+  }
+  function getValue(metricKey, row, yi){
+    if (metricKey === 'anom' && baseOffset) return derivedAnom(row, yi);
+    const grid = VALUES[metricKey];
+    if (!grid || row == null) return null;
+    const v = grid[row * YEARS.length + yi];
+    return isNaN(v) ? null : v;
+  }
+
+  // anomaly baseline: prefix sums and counts of the annual means (built once from the abs
+  // grid) give each country's mean over any window in O(1), so a new baseline costs
+  // O(countries) and no extra bytes; anomalies are then abs - baseOffset[row].
+  // The shipped anom grid (PAYLOAD.base_years) is used while the default window is selected.
+  const DEFAULT_BASE = PAYLOAD.base_years;
+  let baseWin = DEFAULT_BASE.slice();
+  let baseOffset = null;
+  let prefix = null;
+  function buildPrefix(){
+    const abs = VALUES.abs, n = YEARS.length, rows = abs.length / n;
+    const sum = new Float64Array(rows * (n + 1)), cnt = new Int32Array(rows * (n + 1));
+    for (let r = 0; r < rows; r++){
+      const o = r * (n + 1);
+      for (let j = 0; j < n; j++){
+        const v = abs[r * n + j], ok = !isNaN(v);
+        sum[o + j + 1] = sum[o + j] + (ok ? v : 0);
+        cnt[o + j + 1] = cnt[o + j] + (ok ? 1 : 0);
+      }
     }
-    return ys;
+    return { sum, cnt, rows };
+  }
+  function derivedAnom(row, yi){
+    const abs = VALUES.abs;
+    if (!abs || row == null) return null;
+    const v = abs[row * YEARS.length + yi] - baseOffset[row];
+    return isNaN(v) ? null : v;
+  }
+  function setBaseline(from, to){
+    if (parseInt(from, 10) > parseInt(to, 10)) [from, to] = [to, from];
+    return loadMetric('abs').then(() => {
+      baseWin = [from, to];
+      if (from === DEFAULT_BASE[0] && to === DEFAULT_BASE[1]){
+        baseOffset = null;
+      } else {
+        if (!prefix) prefix = buildPrefix();
+        const n1 = YEARS.length + 1, a = YEARS.indexOf(from), b = YEARS.indexOf(to) + 1;
+        baseOffset = new Float64Array(prefix.rows);
+        for (let r = 0; r < prefix.rows; r++){
+          const c = prefix.cnt[r * n1 + b] - prefix.cnt[r * n1 + a];
+          baseOffset[r] = c > 0 ? (prefix.sum[r * n1 + b] - prefix.sum[r * n1 + a]) / c : NaN;
+        }
+      }
+      document.getElementById('base-from').value = from;
+      document.getElementById('base-to').value = to;
+      frames.clear();
+      updateLegend();
+      if (metric === 'anom'){
+        applyYear(idx);
+        if (selectedCountry) openInfo(selectedCountry);
+      }
+    });
+  }
+
+  // monthly mode: per-decade chunks in the same encoding (rows x months of the decade);
+  // only the chunk under the slider and its neighbours are fetched and kept
+  const MONTHLY = PAYLOAD.monthly;   // {k0, n, clips, chunks: [{k0, n, assets: {metric: url}}]} or null
+  const CHUNK_KEEP = 1;              // neighbours kept on each side
+  const chunkData = new Map();       // `${metric}|${chunk}` -> Float32Array (null while loading)
+  let mode = 'year';
+  function stepCount(){ return mode === 'year' ? YEARS.length : MONTHLY.n; }
+  function stepLabel(i){
+    if (mode === 'year') return YEARS[i];
+    const k = MONTHLY.k0 + i;
+    return `${Math.floor(k / 12)}-${String(k % 12 + 1).padStart(2, '0')}`;
+  }
+  function chunkOf(i){
+    return Math.floor((MONTHLY.k0 + i) / 120) - Math.floor(MONTHLY.k0 / 120);
+  }
+  function loadChunk(m, c){
+    const key = `${m}|${c}`;
+    if (chunkData.has(key)) return;
+    const ch = MONTHLY.chunks[c];
+    chunkData.set(key, null);
+    fetchAsset(ch.assets[m])
+      .then(r => r.arrayBuffer())
+      .then(buf => {
+        if (!chunkData.has(key)) return;  // evicted while loading
+        chunkData.set(key, decodeGrid(new Int16Array(buf), ch.n));
+        if (mode === 'month' && m === metric && Math.abs(chunkOf(idx) - c) <= CHUNK_KEEP){
+          frames.clear();
+          applyYear(idx);
+        }
+      })
+      .catch(() => chunkData.delete(key));
   }
-  function linreg(yvals){
-    const x = []; const y = [];
-    for(let i=0;i<yvals.length;i++){
-      if (yvals[i] != null && !isNaN(yvals[i])) { x.push(i); y.push(yvals[i]); }
+  function ensureChunks(i){
+    const c = chunkOf(i);
+    for (let d = -CHUNK_KEEP; d <= CHUNK_KEEP; d++){
+      if (c + d >= 0 && c + d < MONTHLY.chunks.length) loadChunk(metric, c + d);
     }
-    if (x.length < 2) return {slope:0, intercept: y[y.length-1] ?? 0};
-    const n = x.length;
-    const sx = x.reduce((a,b)=>a+b,0), sy = y.reduce((a,b)=>a+b,0);
-    const sxx = x.reduce((a,b)=>a+b*b,0), sxy = x.reduce((a,b,i)=>a+b*y[i],0);
-    const denom = n*sxx - sx*sx || 1e-9;
-    const slope = (n*sxy - sx*sy) / denom;
-    const intercept = (sy - slope*sx)/n;
-    return {slope, intercept};
+    for (const key of [...chunkData.keys()]){
+      const [m, cj] = key.split('|');
+      if (m !== metric || Math.abs(parseInt(cj, 10) - c) > CHUNK_KEEP) chunkData.delete(key);
+    }
+  }
+  function monthValue(m, row, i){
+    const c = chunkOf(i), grid = chunkData.get(`${m}|${c}`);
+    if (!grid || row == null) return null;
+    const ch = MONTHLY.chunks[c];
+    const v = grid[row * ch.n + (MONTHLY.k0 + i - ch.k0)];
+    return (v === undefined || isNaN(v)) ? null : v;
+  }
+  function valueAt(m, row, i){
+    return mode === 'year' ? getValue(m, row, i) : monthValue(m, row, i);
+  }
+  function clipsFor(m){ return mode === 'year' ? CLIPS[m] : MONTHLY.clips[m]; }
+
+  function seriesForRow(row, metricKey){
+    return YEARS.map((_, yi) => getValue(metricKey, row, yi));
   }
   function sparklineSVG(svgEl, data, opts){
     const W=260, H=90, PADL=38, PADR=8, PADT=10, PADB=24;
@@ -324,9 +641,8 @@ HTML = r"""
     const yUnit  = opts?.yUnit  ?? '';
     svgEl.setAttribute('viewBox', `0 0 ${W} ${H}`);
     svgEl.innerHTML = '';
-    const valid = data.filter(v=>v!=null && !isNaN(v));
-    if (valid.length<2){ return; }
-    const min = Math.min(...valid), max = Math.max(...valid);
+    const min = opts?.min, max = opts?.max;
+    if (min == null || max == null){ return; }
     const rng = (max-min)||1e-6;
     const sx = (i)=> PADL + (W-PADL-PADR)*i/(data.length-1||1);
     const sy = (v)=> H-PADB - (H-PADT-PADB)*((v-min)/rng);
@@ -451,9 +767,9 @@ HTML = r"""
     svgEl.appendChild(gAll);
   }
 
-  const DAY_TEX  = 'https://unpkg.com/three-globe/example/img/earth-blue-marble.jpg';
-  const BUMP_TEX = 'https://unpkg.com/three-globe/example/img/earth-topology.png';
-  const BG_TEX   = 'https://unpkg.com/three-globe/example/img/night-sky.png';
+  const DAY_TEX  = assetUrl(PAYLOAD.vendor.day).href;
+  const BUMP_TEX = assetUrl(PAYLOAD.vendor.bump).href;
+  const BG_TEX   = assetUrl(PAYLOAD.vendor.sky).href;
   const globe = Globe({ rendererConfig: { antialias: true, alpha: true, logarithmicDepthBuffer: true, preserveDrawingBuffer: true } })(document.getElementById('root'))
     .globeImageUrl(DAY_TEX)
     .bumpImageUrl(BUMP_TEX)
@@ -472,7 +788,6 @@ HTML = r"""
   let metric = PAYLOAD.default_metric || "anom";
   const startIdx = YEARS.indexOf(START_YEAR);
   let idx = (startIdx !== -1) ? startIdx : (YEARS.length - 1);
-  let valueMap = VALUES[metric][YEARS[idx]] || {};
   let colorScale = colorScaleFactory(metric, scheme);
 
   const rangeEl = document.getElementById('range');
@@ -490,29 +805,93 @@ HTML = r"""
   }
   setGradient();
 
-  function colorScaleFactory(m, sch){
-    const MIN = CLIPS[m][0], MAX = CLIPS[m][1];
-    return function(v){
-      if (v==null || isNaN(v)) return 'rgba(120,120,120,0.10)';
-      const x = Math.max(MIN, Math.min(MAX, v));
-      const t = (x - MIN) / (MAX - MIN);
+  // color lookup tables, built once per (metric, scheme): LUT_N steps across the clip range,
+  // each as css string (polygon accessor) and THREE.Color + alpha (in-place mesh recolor)
+  const LUT_N = 256;
+  const LUTS = {};
+  function lutEntry(r, g, b, a){
+    return { css: `rgba(${r},${g},${b},${a})`, color: new THREE.Color(`rgb(${r},${g},${b})`), alpha: a };
+  }
+  const NO_DATA = lutEntry(120, 120, 120, 0.10);
+  function colorLUT(m, sch){
+    const key = `${m}|${sch}|${mode}`;
+    if (LUTS[key]) return LUTS[key];
+    const entries = [];
+    for (let i = 0; i < LUT_N; i++){
+      const t = i / (LUT_N - 1);
       if (sch==='normal'){
         const r = t<0.5 ? 2*t*255 : 255;
         const g = t<0.5 ? 2*t*255 : 2*(1-t)*255;
         const b = t<0.5 ? 255 : 2*(1-t)*255;
-        return `rgba(${r|0},${g|0},${b|0},0.35)`;
+        entries.push(lutEntry(r|0, g|0, b|0, 0.35));
       } else {
         const r = Math.round(59 + t*(180-59));
         const g = Math.round(76 + t*(4-76));
         const b = Math.round(192 + t*(38-192));
-        return `rgba(${r},${Math.max(0,g)},${Math.max(0,b)},0.35)`;
+        entries.push(lutEntry(r, Math.max(0,g), Math.max(0,b), 0.35));
       }
     }
+    const [MIN, MAX] = clipsFor(m);
+    return (LUTS[key] = {
+      entries,
+      at(v){
+        if (v==null || isNaN(v)) return NO_DATA;
+        const x = Math.max(MIN, Math.min(MAX, v));
+        return entries[Math.round((x - MIN) / (MAX - MIN) * (LUT_N - 1))];
+      }
+    });
+  }
+  function colorScaleFactory(m, sch){
+    const lut = colorLUT(m, sch);
+    return (v) => lut.at(v).css;
+  }
+
+  // cap materials of the built polygon meshes (three-globe keeps one material per polygon);
+  // year/metric/scheme changes only rewrite their color instead of rebuilding the meshes
+  let caps = null;
+  function collectCaps(){
+    const out = [];
+    globe.scene().traverse(o => {
+      if (o.__globeObjType !== 'polygon' || !o.__data) return;
+      const mesh = o.children && o.children[0];
+      const mat = mesh && Array.isArray(mesh.material) ? mesh.material[1] : null;
+      if (mat && mat.color) out.push({ mat, props: (o.__data.data || o.__data).properties, entry: null });
+    });
+    return out.length ? out : null;
+  }
+  // resolved LUT entries per cap for one year; playback prepares the next years while idle
+  const LOOKAHEAD = 3;
+  const frames = new Map();
+  function frameEntries(yi){
+    const key = `${metric}|${scheme}|${mode}|${yi}`;
+    let f = frames.get(key);
+    if (!f){
+      const lut = colorLUT(metric, scheme);
+      f = caps.map(c => lut.at(valueAt(metric, featureRow(c.props), yi)));
+      frames.set(key, f);
+      if (frames.size > 4 * LOOKAHEAD) frames.delete(frames.keys().next().value);
+    }
+    return f;
+  }
+  function prepareAhead(){
+    if (!caps) return;
+    for (let k = 1; k <= LOOKAHEAD && idx + k < stepCount(); k++) frameEntries(idx + k);
+  }
+  function recolorCaps(){
+    const f = frameEntries(idx);
+    for (let i = 0; i < caps.length; i++){
+      const c = caps[i], e = f[i];
+      if (e === c.entry) continue;
+      c.entry = e;
+      c.mat.color.copy(e.color);
+      c.mat.opacity = e.alpha;
+    }
   }
 
   function updateLegend(){
-    document.getElementById('unit').textContent = UNITS[metric];
-    const [MIN, MAX] = CLIPS[metric];
+    document.getElementById('unit').textContent = (metric === 'anom' && mode === 'year')
+      ? `${UNITS.anom} vs ${baseWin[0]}–${baseWin[1]}` : UNITS[metric];
+    const [MIN, MAX] = clipsFor(metric);
     document.getElementById('minlbl').textContent = MIN.toString();
     document.getElementById('maxlbl').textContent = MAX.toString();
     document.getElementById('btn-anom').classList.toggle('active', metric==='anom');
@@ -520,22 +899,23 @@ HTML = r"""
   }
 
   function applyYear(newIdx){
-    idx = Math.max(0, Math.min(YEARS.length-1, newIdx));
-    const key = YEARS[idx];
-    valueMap = VALUES[metric][key] || {};
-    document.getElementById('sel').textContent = key;
-    globe
-      .polygonCapColor(({properties}) => {
-        const k = csvName(properties.NAME);
-        const v = getValue(valueMap, k);
-        return colorScale(v);
-      })
-      .polygonLabel(({ properties }) => String(properties.NAME || ""));
-    if (selectedCountry){ openInfo(selectedCountry); }
-    globe.polygonsData(globe.polygonsData());
+    idx = Math.max(0, Math.min(stepCount()-1, newIdx));
+    if (mode === 'month') ensureChunks(idx);
+    document.getElementById('sel').textContent = stepLabel(idx);
+    rangeEl.value = String(idx);
+    if (selectedCountry){ updateInfoYear(); }
+    if (caps || (caps = collectCaps())){
+      recolorCaps();
+    } else {
+      globe.polygonsData(globe.polygonsData());  // mesh layout not recognized: full rebuild
+    }
   }
 
   function applyMetric(newMetric){
+    loadMetric(newMetric).then(() => switchMetric(newMetric));
+  }
+
+  function switchMetric(newMetric){
     metric = newMetric;
     colorScale = colorScaleFactory(metric, scheme);
     updateLegend();
@@ -543,42 +923,37 @@ HTML = r"""
     if (selectedCountry){ openInfo(selectedCountry); }
   }
 
-  function openInfo(name){
-    selectedCountry = name;
-    const info  = document.getElementById('info');
-    const title = document.getElementById('infoTitle');
-    const text  = document.getElementById('infoText');
-    const svg   = document.getElementById('infoSvg');
-    title.textContent = name;
-    const currentYear = YEARS[idx];
-    const latestYear  = YEARS[YEARS.length - 1];
-    const key = csvName(name);
-    const currentVal =
-        VALUES[metric][currentYear]?.[key]
-     ?? VALUES[metric][currentYear]?.[key?.replaceAll('-', ' ')]
-     ?? VALUES[metric][currentYear]?.[key?.replaceAll(' ', '-')]
-     ?? null;
-    const ysFull = seriesForCountry(name, metric);
-    const lr = linreg(ysFull);
-    const slopePerDecade = (lr.slope * 10);
-    const nowStr = (metric === 'anom'
-      ? (currentVal != null ? `Temperature Anomaly: ${currentVal.toFixed(2)} °C` : 'no data')
-      : (currentVal != null ? `Average Temperature: ${currentVal.toFixed(1)} °C` : 'no data')
-    );
-    const slopeStr = `${slopePerDecade.toFixed(2)} °C/decade`;
-    text.innerHTML = `
-      <div><b>${currentYear}</b> snapshot: <b>${nowStr}</b></div>
-      <div>Trend (linear, 1901–${latestYear}): <b>${slopeStr}</b></div>
+  // info panel: trend, min/max and ticks come precomputed in PAYLOAD.stats; the chart is
+  // drawn on open and on metric changes, a year change only updates the snapshot line
+  function openInfo(props){
+    selectedCountry = props;
+    const row = featureRow(props);
+    const st = (row == null) ? null : STATS[metric];
+    const slope = st ? st.slope10[row] : null;
+    document.getElementById('infoTitle').textContent = String(props.NAME || "");
+    document.getElementById('infoText').innerHTML = `
+      <div><b id="infoYear"></b> snapshot: <b id="infoNow"></b></div>
+      <div>Trend (linear, ${YEARS[0]}–${YEARS[YEARS.length - 1]}): <b>${slope != null ? slope.toFixed(2) + ' °C/decade' : 'n/a'}</b></div>
       <div style="opacity:.8">Tip: the chart shows the full history; the snapshot follows the year slider.</div>`;
-    const xTicks = [YEARS[0], '1950', '2000', latestYear];
-    if (!xTicks.includes(latestYear)) xTicks.push(latestYear);
-    const valid = ysFull.filter(v => v != null && !isNaN(v));
-    const ymin = Math.min(...valid), ymax = Math.max(...valid);
+    let ymin = st ? st.min[row] : null, ymax = st ? st.max[row] : null;
+    if (st && metric === 'anom' && baseOffset && ymin != null){  // same series, shifted
+      ymin = STATS.abs.min[row] - baseOffset[row];
+      ymax = STATS.abs.max[row] - baseOffset[row];
+      if (isNaN(ymin)) ymin = ymax = null;
+    }
     const span = (ymax - ymin) || 1e-6;
-    const yTicks = [ymin, ymin + span * 0.5, ymax];
-    const yUnitShort = '°C';
-    sparklineSVG(svg, ysFull, { xTicks, yTicks, yUnit: yUnitShort });
-    info.classList.add('show');
+    const yTicks = (ymin == null) ? [] : [ymin, ymin + span * 0.5, ymax];
+    sparklineSVG(document.getElementById('infoSvg'), seriesForRow(row, metric),
+                 { xTicks: PAYLOAD.x_ticks, yTicks, yUnit: '°C', min: ymin, max: ymax });
+    updateInfoYear();
+    document.getElementById('info').classList.add('show');
+  }
+
+  function updateInfoYear(){
+    const v = valueAt(metric, featureRow(selectedCountry), idx);
+    document.getElementById('infoYear').textContent = stepLabel(idx);
+    document.getElementById('infoNow').textContent = (v == null) ? 'no data'
+      : (metric === 'anom' ? `Temperature Anomaly: ${v.toFixed(2)} °C` : `Average Temperature: ${v.toFixed(1)} °C`);
   }
 
   function closeInfo(){
@@ -586,18 +961,19 @@ HTML = r"""
     selectedCountry = null;
   }
 
-  fetch('https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/ne_110m_admin_0_countries.geojson')
-    .then(r => r.json())
-    .then(geo => {
+  Promise.all([
+    fetchAsset(PAYLOAD.vendor.geo).then(r => r.json()),
+    loadMetric(metric),
+  ])
+    .then(([geo]) => {
       globe
         .polygonsData(geo.features)
         .polygonAltitude(0.005)
         .polygonSideColor(() => 'rgba(0,0,0,0)')
         .polygonStrokeColor(() => 'rgba(255,255,255,0.55)')
-        .onPolygonClick(({properties}) => {
-          const shown = String(properties.NAME || "");
-          openInfo(shown);
-        });
+        .polygonCapColor(({properties}) => colorScale(valueAt(metric, featureRow(properties), idx)))
+        .polygonLabel(({ properties }) => String(properties.NAME || ""))
+        .onPolygonClick(({properties}) => openInfo(properties));
       updateLegend();
       applyYear(idx);
     });
@@ -616,13 +992,77 @@ HTML = r"""
     const url = canvas.toDataURL('image/png');
     const a = document.createElement('a');
     a.href = url;
-    a.download = `ClimateWiz_${metric}_${YEARS[idx]}.png`;
+    a.download = `ClimateWiz_${metric}_${stepLabel(idx)}.png`;
     document.body.appendChild(a);
     a.click();
     document.body.removeChild(a);
   };
 
-  document.getElementById('range').addEventListener('input', (e) => applyYear(parseInt(e.target.value,10)));
+  // slider and playback recolor at most once per animation frame
+  let pendingIdx = null;
+  function requestYear(i){
+    if (pendingIdx === null) requestAnimationFrame(() => { const j = pendingIdx; pendingIdx = null; applyYear(j); });
+    pendingIdx = i;
+  }
+  document.getElementById('range').addEventListener('input', (e) => requestYear(parseInt(e.target.value,10)));
+
+  // playback: one year per 1000/speed ms; while the previous recolor is still pending the
+  // step waits for the next frame instead of queueing more work (slow devices just play slower)
+  let playing = false, speed = 5, lastStep = 0;
+  const playBtn = document.getElementById('btn-play');
+  function setPlaying(on){
+    playing = on;
+    playBtn.textContent = on ? '❚❚ Pause' : '▶ Play';
+    playBtn.classList.toggle('active', on);
+    if (on){
+      if (idx >= stepCount() - 1) applyYear(0);
+      lastStep = performance.now();
+      requestAnimationFrame(tick);
+    }
+  }
+  function tick(ts){
+    if (!playing) return;
+    if (pendingIdx === null && ts - lastStep >= 1000 / speed){
+      lastStep = ts;
+      applyYear(idx + 1);
+      if (idx >= stepCount() - 1){ setPlaying(false); return; }
+      (window.requestIdleCallback || setTimeout)(prepareAhead);
+    }
+    requestAnimationFrame(tick);
+  }
+  playBtn.onclick = () => setPlaying(!playing);
+
+  for (const id of ['base-from', 'base-to']){
+    const sel = document.getElementById(id);
+    YEARS.forEach(y => sel.add(new Option(y, y)));
+    sel.onchange = () => setBaseline(document.getElementById('base-from').value, document.getElementById('base-to').value);
+  }
+  document.getElementById('base-from').value = baseWin[0];
+  document.getElementById('base-to').value = baseWin[1];
+
+  // year <-> month mode; the slider keeps its position in time (a year maps to its January)
+  const monthBtn = document.getElementById('btn-month');
+  if (!MONTHLY) monthBtn.style.display = 'none';
+  monthBtn.onclick = () => {
+    const k = (mode === 'year') ? parseInt(YEARS[idx], 10) * 12 : MONTHLY.k0 + idx;
+    mode = (mode === 'year') ? 'month' : 'year';
+    if (mode === 'year'){
+      chunkData.clear();
+      const yi = YEARS.indexOf(String(Math.floor(k / 12)));
+      idx = (yi !== -1) ? yi : YEARS.length - 1;
+    } else {
+      idx = Math.max(0, Math.min(MONTHLY.n - 1, k - MONTHLY.k0));
+    }
+    monthBtn.textContent = `Monthly: ${mode === 'month' ? 'ON' : 'OFF'}`;
+    document.getElementById('baseRow').style.display = (mode === 'month') ? 'none' : '';
+    monthBtn.classList.toggle('active', mode === 'month');
+    rangeEl.max = String(stepCount() - 1);
+    colorScale = colorScaleFactory(metric, scheme);
+    updateLegend();
+    applyYear(idx);
+  };
+  document.getElementById('speed').onchange = (e) => { speed = parseFloat(e.target.value) || 5; };
+  rangeEl.addEventListener('pointerdown', () => setPlaying(false));
   window.addEventListener('resize', () => { globe.width(window.innerWidth); globe.height(window.innerHeight); });
 
   const blog = document.getElementById('blog');
@@ -639,12 +1079,70 @@ HTML = r"""
 </html>
 """
 
-html(
-    HTML.replace("__PAYLOAD__", PAYLOAD_JSON)
-        .replace("__UNIT__", payload["units"][payload["default_metric"]])
-        .replace("__MIN__", str(payload["clips"][payload["default_metric"]][0]))
-        .replace("__MAX__", str(payload["clips"][payload["default_metric"]][1]))
-        .replace("__BLOG__", BLOG_JSON),
-    height=10,
-    scrolling=False
-)
+class DocumentCache:
+    """Rendered documents of the most recently used variants, shared by all sessions and
+    bounded by entry count and total size; a variant's older version is replaced, not kept.
+    `on_evict(variant)` runs for variants pushed out of the cache."""
+    def __init__(self, max_items: int, max_bytes: int, on_evict=None):
+        self.max_items, self.max_bytes, self.on_evict = max_items, max_bytes, on_evict
+        self._docs: OrderedDict[tuple, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, build) -> str:
+        with self._lock:
+            if key in self._docs:
+                self._docs.move_to_end(key)
+                return self._docs[key]
+        doc = build()
+        with self._lock:
+            for k in [k for k in self._docs if k[0] == key[0]]:
+                del self._docs[k]
+            self._docs[key] = doc
+            while len(self._docs) > 1 and (len(self._docs) > self.max_items
+                                           or sum(map(len, self._docs.values())) > self.max_bytes):
+                (variant, *_), _ = self._docs.popitem(last=False)
+                if self.on_evict:
+                    self.on_evict(variant)
+        return doc
+
+@st.cache_resource(show_spinner=False)
+def slice_api() -> SliceApi:
+    """The /years, /slice, /series service (slice_api.py), one per process."""
+    api = SliceApi()
+    try:
+        api.start(port=int(os.environ.get("CLIMATEWIZ_API_PORT", API_PORT)))
+    except OSError as e:  # port taken, e.g. by a second app process
+        print(f"[WARN] slice API not started: {e}")
+    return api
+
+@st.cache_resource(show_spinner=False)
+def document_cache() -> DocumentCache:
+    return DocumentCache(DOC_CACHE_ITEMS, DOC_CACHE_BYTES, on_evict=slice_api().drop)
+
+def render_document(variant: str, source: Path) -> str:
+    """The finished component HTML for one variant."""
+    payload = load_payload(source) if variant == PUBLISHED else load_variant_payload(source)
+    slice_api().publish(variant, payload["years"], payload["names"], payload["matrices"], CountryIds.load())
+    payload = publish_assets(payload, variant)
+    m = payload["default_metric"]
+    subs = {
+        "PAYLOAD": json.dumps(payload),
+        "UNIT": payload["units"][m],
+        "MIN": str(payload["clips"][m][0]),
+        "MAX": str(payload["clips"][m][1]),
+        "BLOG": json.dumps(BLOG_HTML.replace("__BASE__", f"{BASE_YEARS[0]}–{BASE_YEARS[1]}")),
+        "THREE": payload["vendor"]["three"],
+        "GLOBE": payload["vendor"]["globe"],
+    }
+    return re.sub(r"__(PAYLOAD|UNIT|MIN|MAX|BLOG|THREE|GLOBE)__", lambda g: subs[g.group(1)], HTML)
+
+variants = list_variants()
+variant = st.selectbox("Dataset", list(variants), key="variant", label_visibility="collapsed",
+                       format_func=lambda v: "Published (country_year.csv)" if v == PUBLISHED else v)
+source = variants[variant]
+manifest = VENDOR_DIR / "manifest.json"
+# key changes when the variant's source, the monthly CSVs or the vendored assets do
+key = (variant, *data_version(source), manifest.stat().st_mtime_ns if manifest.is_file() else 0, monthly_version())
+with st.spinner(f"Loading {variant}…"):
+    doc = document_cache().get(key, lambda: render_document(variant, source))
+html(doc, height=10, scrolling=False)
@@ -0,0 +1,191 @@
+"""Small local HTTP API over the globe's (country x year) arrays.
+
+    GET /years                          {"variant", "years", "metrics", "countries"}
+    GET /slice?metric=anom&year=2020    {"variant", "metric", "year", "values"}   values[country_id]
+    GET /series?country=Germany         {"variant", "id", "country", "years", "anom", "abs"}
+
+`country` takes any spelling country_ids.py knows, or the id. Every endpoint takes an
+optional `&variant=` (default: DEFAULT_VARIANT, else the oldest one published). Bodies are serialized and
+gzipped once when a variant is published; each response has a strong ETag per
+representation (If-None-Match -> 304) and a single `Range: bytes=a-b` is answered with 206.
+
+app.py starts it in a daemon thread of the Streamlit process (127.0.0.1, port
+CLIMATEWIZ_API_PORT, default 8765). Standalone, on the published CSV:
+
+    python src/app/slice_api.py --csv src/data/temperature/temp_per_country/yearly_temp_aggregated/country_year.csv
+"""
+from __future__ import annotations
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "data" / "temperature"))
+from country_ids import CountryIds  # noqa: E402
+
+HOST = "127.0.0.1"
+PORT = 8765
+DEFAULT_VARIANT = "published"
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+class Body:
+    """One JSON response, kept as identity and gzip bytes with their ETags."""
+    __slots__ = ("raw", "gz", "etag")
+
+    def __init__(self, obj):
+        self.raw = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+        self.gz = gzip.compress(self.raw, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha256(self.raw).hexdigest()[:20]
+
+def _values(a: np.ndarray) -> list:
+    return [None if np.isnan(v) else round(float(v), 2) for v in a]
+
+class Variant:
+    """All responses of one dataset, built up front (a few hundred small bodies)."""
+    def __init__(self, name: str, years: list, names: list, mats: dict[str, np.ndarray], ids: CountryIds):
+        self.name, self.ids = name, ids
+        self.years = Body({"variant": name, "years": [str(y) for y in years],
+                           "metrics": list(mats), "countries": names})
+        self.slices = {(m, str(y)): Body({"variant": name, "metric": m, "year": str(y), "values": _values(a[:, i])})
+                       for m, a in mats.items() for i, y in enumerate(years)}
+        self.series = {i: Body({"variant": name, "id": i, "country": names[i], "years": [str(y) for y in years],
+                                **{m: _values(a[i]) for m, a in mats.items()}})
+                       for i in range(len(names)) if names[i] is not None}
+
+    def country_id(self, country: str) -> int | None:
+        return int(country) if country.isdigit() else self.ids.id_of(country)
+
+class SliceApi:
+    """Published variants plus the server answering for them."""
+    def __init__(self):
+        self._variants: OrderedDict[str, Variant] = OrderedDict()
+        self._lock = threading.Lock()
+        self.server = None
+
+    def publish(self, name: str, years: list, names: list, mats: dict[str, np.ndarray], ids: CountryIds):
+        v = Variant(name, years, names, mats, ids)
+        with self._lock:
+            self._variants.pop(name, None)
+            self._variants[name] = v
+
+    def drop(self, name: str):
+        with self._lock:
+            self._variants.pop(name, None)
+
+    def variant(self, name: str | None) -> Variant | None:
+        with self._lock:
+            if name is None:
+                return self._variants.get(DEFAULT_VARIANT) or next(iter(self._variants.values()), None)
+            return self._variants.get(name)
+
+    def lookup(self, path: str, q: dict) -> tuple[int, Body | str]:
+        v = self.variant(q.get("variant"))
+        if v is None:
+            return 404, "unknown variant"
+        if path == "/years":
+            return 200, v.years
+        if path == "/slice":
+            body = v.slices.get((q.get("metric", "anom"), q.get("year", "")))
+            return (200, body) if body else (404, "unknown metric/year")
+        if path == "/series":
+            body = v.series.get(v.country_id(q.get("country", "")))
+            return (200, body) if body else (404, "unknown country")
+        return 404, "not found"
+
+    def start(self, host: str = HOST, port: int = PORT) -> "SliceApi":
+        """Serve in a daemon thread; a second call is a no-op."""
+        if self.server is None:
+            self.server = ThreadingHTTPServer((host, port), _handler(self))
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, name="slice-api", daemon=True).start()
+        return self
+
+def _handler(api: SliceApi):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):  # keep the Streamlit console quiet
+            pass
+
+        def do_HEAD(self):
+            self.do_GET(head=True)
+
+        def do_GET(self, head: bool = False):
+            url = urlsplit(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            status, body = api.lookup(url.path.rstrip("/") or "/", q)
+            if status != 200:
+                return self._send(status, body.encode("utf-8"), {"Content-Type": "text/plain; charset=utf-8"}, head)
+            use_gz = "gzip" in self.headers.get("Accept-Encoding", "")
+            data, etag = (body.gz, f'"{body.etag}-gz"') if use_gz else (body.raw, f'"{body.etag}"')
+            headers = {"Content-Type": "application/json", "ETag": etag, "Vary": "Accept-Encoding",
+                       "Cache-Control": "public, max-age=0, must-revalidate", "Accept-Ranges": "bytes"}
+            if use_gz:
+                headers["Content-Encoding"] = "gzip"
+            if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+                return self._send(304, b"", headers, head)
+            rng = self.headers.get("Range")
+            if rng and self.headers.get("If-Range", etag) == etag:
+                m = _RANGE.match(rng.strip())
+                a, b = (m.group(1), m.group(2)) if m else ("", "")
+                if a:
+                    start, end = int(a), min(int(b), len(data) - 1) if b else len(data) - 1
+                elif b:
+                    start, end = max(0, len(data) - int(b)), len(data) - 1
+                else:
+                    start, end = 1, 0
+                if not m or start > end:
+                    headers["Content-Range"] = f"bytes */{len(data)}"
+                    return self._send(416, b"", headers, head)
+                headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+                return self._send(206, data[start:end + 1], headers, head)
+            self._send(200, data, headers, head)
+
+        def _send(self, status: int, data: bytes, headers: dict, head: bool):
+            self.send_response(status)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Access-Control-Expose-Headers", "ETag, Content-Range")
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            if not head and status != 304:
+                self.wfile.write(data)
+    return Handler
+
+def main():
+    import pandas as pd
+    ap = argparse.ArgumentParser(description="Serve /years, /slice and /series for a country_year CSV.")
+    ap.add_argument("--csv", required=True, help="country,year,temp_c,base,anom (yearly_temp_data.py output)")
+    ap.add_argument("--variant", default=DEFAULT_VARIANT)
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    args = ap.parse_args()
+
+    df = pd.read_csv(args.csv).dropna(subset=["year"])
+    ids = CountryIds.load()
+    rows = ids.ids_for(df["country"])
+    cols, years = pd.factorize(df["year"].astype(int), sort=True)
+    mats = {}
+    for m, col in (("anom", "anom"), ("abs", "temp_c")):
+        mats[m] = np.full((int(rows.max()) + 1, len(years)), np.nan)
+        mats[m][rows, cols] = df[col].to_numpy(dtype=np.float64)
+    api = SliceApi()
+    api.publish(args.variant, [int(y) for y in years], [ids.name_of(i) for i in range(len(mats["anom"]))], mats, ids)
+    api.start(args.host, args.port)
+    print(f"[OK] serving {args.csv} on http://{args.host}:{args.port}/years")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Canonical integer country IDs.
+
+    country_ids.json    # {"version": 1, "countries": [{"id", "name", "aliases": [...]}, ...]}
+
+temp_data.py assigns the IDs once at ingest: a country keeps its ID forever, a new one
+gets max(id) + 1. Every spelling used anywhere (CRU header names, file-name stems,
+safe_name partitions, `_`/space/hyphen variants, the Natural Earth names on the globe)
+resolves through the single lookup_key() normalization:
+
+    ids = CountryIds.load()
+    df["country_id"] = ids.ids_for(df["country"])      # int32, for merges/groupbys
+    ids.id_of("Bosnia and Herz.")                       # Natural Earth alias -> same ID
+
+Merges then run on the integer column instead of re-normalizing strings per script.
+"""
+from pathlib import Path
+import json
+import re
+import numpy as np
+import pandas as pd
+
+HERE = Path(__file__).resolve()
+ID_FILE = HERE.parent / "country_ids.json"
+VERSION = 1
+
+# Natural Earth (globe polygon NAME) -> CRU country; None = shown without data
+NE_ALIASES = {
+    "United States of America": "USA",
+    "W. Sahara": "Western Sahara",
+    "Dem. Rep. Congo": "DR Congo",
+    "Dominican Rep.": "Dominican Republic",
+    "Falkland Is.": "Falkland Isl",
+    "Fr. S. Antarctic Lands": None,
+    "Timor-Leste": "East Timor",
+    "Côte d'Ivoire": "Ivory Coast",
+    "Central African Rep.": "Central African Rep",
+    "Eq. Guinea": "Equatorial Guinea",
+    "eSwatini": "Swaziland",
+    "Vanuatu": "Vanatu",
+    "Solomon Is.": "Solomon Isl",
+    "Czechia": "Czech Republic",
+    "Bosnia and Herz.": "Bosnia-Herzegovinia",
+    "North Macedonia": "Macedonia",
+    "S. Sudan": "South Sudan",
+    "Puerto Rico": "Puerto Rica",
+    "Antarctica": None, "N. Cyprus": None, "Somaliland": None,
+    "French Southern Territories": None,
+}
+
+_SEP = re.compile(r"[\s_.\-]+")
+
+def lookup_key(name) -> str:
+    """The one name normalization: lower case, runs of space/_/./- as one space.
+    (app.py mirrors it in JS as lookupKey.)"""
+    return _SEP.sub(" ", str(name)).strip().lower()
+
+class CountryIds:
+    def __init__(self, countries: list[dict] | None = None):
+        self.countries = {}          # id -> {"id", "name", "aliases"}
+        self._by_key = {}            # lookup_key -> id
+        self.dirty = False
+        for c in countries or []:
+            self._add(int(c["id"]), c["name"], c.get("aliases", []))
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: Path = ID_FILE) -> "CountryIds":
+        path = Path(path)
+        if not path.is_file():
+            return cls()
+        return cls(json.loads(path.read_text(encoding="utf-8"))["countries"])
+
+    def save(self, path: Path = ID_FILE):
+        path = Path(path)
+        rows = [json.dumps(self.countries[i], ensure_ascii=False) for i in sorted(self.countries)]
+        data = '{"version": %d, "countries": [\n%s\n]}\n' % (VERSION, ",\n".join(rows))  # one country per line
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        tmp.replace(path)
+        self.dirty = False
+
+    def _add(self, cid: int, name: str, aliases) -> int:
+        self.countries[cid] = {"id": cid, "name": str(name), "aliases": []}
+        self._by_key[lookup_key(name)] = cid
+        for a in aliases:
+            self.add_alias(a, cid)
+        self.dirty = True
+        return cid
+
+    def add_alias(self, alias: str, cid: int):
+        key = lookup_key(alias)
+        if key in self._by_key:
+            return
+        self._by_key[key] = cid
+        self.countries[cid]["aliases"].append(str(alias))
+        self.dirty = True
+
+    def id_of(self, name) -> int | None:
+        """ID for any known spelling (incl. NE_ALIASES); None if unknown or excluded."""
+        if name is None:
+            return None
+        if str(name).strip() in NE_ALIASES:
+            target = NE_ALIASES[str(name).strip()]
+            return None if target is None else self._by_key.get(lookup_key(target))
+        return self._by_key.get(lookup_key(name))
+
+    def assign(self, name: str, aliases=()) -> int:
+        """ID of `name`, creating the next free one for a new country; `aliases` are recorded."""
+        cid = self._by_key.get(lookup_key(name))
+        if cid is None:
+            cid = self._add(max(self.countries, default=0) + 1, name, [])
+        for a in aliases:
+            self.add_alias(a, cid)
+        return cid
+
+    def name_of(self, cid: int) -> str | None:
+        c = self.countries.get(int(cid))
+        return c["name"] if c else None
+
+    def ids_for(self, names) -> np.ndarray:
+        """int32 IDs for a column of names. Names the registry does not know get a new ID
+        in memory (not saved), so integer merges never collapse two different countries."""
+        codes, uniques = pd.factorize(pd.Series(names, copy=False).astype(str))
+        table = np.array([self.assign(u) for u in uniques], dtype=np.int32)
+        return table[codes]
+
+    def lookup_table(self) -> dict:
+        """{lookup_key: id or None} for every known spelling and NE_ALIASES (the app's one map)."""
+        out = dict(self._by_key)
+        for ne in NE_ALIASES:
+            out[lookup_key(ne)] = self.id_of(ne)
+        return out
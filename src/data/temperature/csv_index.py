@@ -0,0 +1,137 @@
+"""Byte-offset sidecar index for the per-country monthly CSVs.
+
+temp_data.py writes each country file sorted by month, so row i of `Albania.csv` starts at
+a known byte offset. The sidecar `Albania.csv.idx.npz` stores
+
+    k      int32 month keys year*12 + (month-1), one per row (non-decreasing)
+    off    int64 row start offsets, len(k)+1 entries; off[0] = end of header, off[-1] = file size
+    size, mtime_ns   of the CSV the index was built from (stale index -> rebuilt)
+
+With it, dropping trailing months is one truncate() at off[i] and appending months is a
+raw write of pre-formatted lines, instead of a full pandas parse and re-serialize:
+
+    idx = CsvIndex.load(path)                  # None: unsorted/unexpected file, use pandas
+    truncate_after(path, k_cut, idx)           # keep rows with k <= k_cut
+    append_lines(path, lines, keys, idx)
+"""
+from pathlib import Path
+import zipfile
+import numpy as np
+
+SUFFIX = ".idx.npz"
+STD_COLUMNS = ["date", "year", "month", "temp_c", "country"]
+
+def sidecar(path: Path) -> Path:
+    return Path(path).with_name(Path(path).name + SUFFIX)
+
+class CsvIndex:
+    def __init__(self, header: list[str], k: np.ndarray, off: np.ndarray, newline: bytes = b"\n"):
+        self.header = header
+        self.k = np.asarray(k, dtype=np.int32)
+        self.off = np.asarray(off, dtype=np.int64)
+        self.newline = newline
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CsvIndex | None":
+        """Index of a CSV's bytes; None if it has no year/month columns or is not sorted by month."""
+        h = data.find(b"\n") + 1
+        if h == 0:
+            return None
+        newline = b"\r\n" if data[:h].endswith(b"\r\n") else b"\n"
+        header = data[:h].rstrip(b"\r\n").decode("utf-8").split(",")
+        if "year" not in header or "month" not in header:
+            return None
+        iy, im = header.index("year"), header.index("month")
+        ks, offs, pos = [], [h], h
+        try:
+            for line in data[h:].splitlines(keepends=True):
+                f = line.rstrip(b"\r\n").split(b",")
+                ks.append(int(f[iy])*12 + int(f[im]) - 1)
+                pos += len(line)
+                offs.append(pos)
+        except (ValueError, IndexError):
+            return None
+        k = np.asarray(ks, dtype=np.int32)
+        if k.size > 1 and (np.diff(k) < 0).any():
+            return None
+        return cls(header, k, offs, newline)
+
+    @classmethod
+    def load(cls, path: Path, save: bool = True) -> "CsvIndex | None":
+        """Sidecar index of `path`, rebuilt (and saved) when missing or stale."""
+        path = Path(path)
+        st = path.stat()
+        side = sidecar(path)
+        try:
+            with np.load(side) as z:
+                if int(z["size"]) == st.st_size and int(z["mtime_ns"]) == st.st_mtime_ns:
+                    return cls(z["header"].tolist(), z["k"], z["off"], z["newline"].tobytes())
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            pass
+        idx = cls.from_bytes(path.read_bytes())
+        if idx is not None and save:
+            idx.save(path)
+        return idx
+
+    def save(self, path: Path):
+        """Write the sidecar for `path` (stamped with the CSV's current size/mtime)."""
+        st = Path(path).stat()
+        tmp = sidecar(path).with_suffix(".tmp.npz")
+        np.savez(tmp, header=np.array(self.header), k=self.k, off=self.off,
+                 newline=np.frombuffer(self.newline, dtype=np.uint8),
+                 size=np.int64(st.st_size), mtime_ns=np.int64(st.st_mtime_ns))
+        tmp.replace(sidecar(path))
+
+    def __len__(self) -> int:
+        return len(self.k)
+
+    @property
+    def last_k(self) -> int | None:
+        return int(self.k[-1]) if len(self.k) else None
+
+    def rows_through(self, k_cut: int) -> int:
+        """Number of leading rows with k <= k_cut."""
+        return int(np.searchsorted(self.k, k_cut, side="right"))
+
+    def row_bytes(self, path: Path, i: int) -> bytes:
+        with open(path, "rb") as fh:
+            fh.seek(int(self.off[i]))
+            return fh.read(int(self.off[i+1] - self.off[i]))
+
+def truncate_after(path: Path, k_cut: int, idx: CsvIndex, dest: Path | None = None) -> tuple[int, int]:
+    """Keep rows with k <= k_cut: truncate() in place, or copy that byte prefix to `dest`.
+    Returns (kept, dropped) and updates the sidecar of the written file."""
+    path = Path(path)
+    dest = path if dest is None else Path(dest)
+    n = idx.rows_through(k_cut)
+    end = int(idx.off[n])
+    if dest.resolve() == path.resolve():
+        if n < len(idx):
+            with open(path, "r+b") as fh:
+                fh.truncate(end)
+    else:
+        with open(path, "rb") as src, open(dest, "wb") as out:
+            out.write(src.read(end))
+    kept = CsvIndex(idx.header, idx.k[:n], idx.off[:n+1], idx.newline)
+    kept.save(dest)
+    return n, len(idx) - n
+
+def append_lines(path: Path, lines: list[str], keys, idx: CsvIndex) -> CsvIndex:
+    """Append pre-formatted CSV rows (months `keys`, all after idx.last_k) with one write."""
+    keys = np.asarray(keys, dtype=np.int32)
+    if len(idx) and len(keys) and keys[0] <= idx.last_k:
+        raise ValueError(f"{Path(path).name}: appended months must follow the last month {idx.last_k}")
+    payload = [(ln + idx.newline.decode()).encode("utf-8") for ln in lines]
+    start = int(idx.off[-1])
+    with open(path, "r+b") as fh:
+        if len(idx) and not idx.row_bytes(path, len(idx) - 1).endswith(b"\n"):
+            fh.seek(start)
+            fh.write(idx.newline)  # last row had no line break
+            start += len(idx.newline)
+        fh.seek(start)
+        fh.truncate()
+        fh.write(b"".join(payload))
+    off = np.concatenate([idx.off[:-1], [start], start + np.cumsum([len(b) for b in payload], dtype=np.int64)])
+    new = CsvIndex(idx.header, np.concatenate([idx.k, keys]), off, idx.newline)
+    new.save(path)
+    return new
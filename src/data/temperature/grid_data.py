@@ -0,0 +1,255 @@
+"""Country (or any region) monthly series from gridded CRU TS fields.
+
+Instead of CRU's pre-aggregated `.per` files, read the gridded monthly field and
+aggregate it with our own masks. The aggregation is a precomputed sparse
+(region x cell) area-weight matrix W, applied once per time slab:
+
+    [sum_w * x | sum_w] = W @ [x_filled | valid]      # cells x 2t  ->  regions x 2t
+    temp_c              = sum_w * x / sum_w           # NaN where no valid cell
+
+so cells missing in a month drop out of that month's weights.
+
+Inputs:
+  --grid cru_ts4.xx.1901.2023.tmp.dat.nc   NetCDF3 (scipy.io.netcdf_file), var (time, lat, lon);
+                                           NetCDF4 releases: `nccopy -k classic` first
+  --grid tmp.npy --start 1901-01           raw float grid [time, lat, lon], NaN = missing
+Weights (.npz, reused across runs):
+  --labels regions.npy --regions regions.txt   int grid [lat, lon], -1 = no region;
+                                               line i of regions.txt names label i
+  Cell weight = cos(lat), i.e. proportional to cell area on a regular lat/lon grid.
+
+Output is the same `date,year,month,temp_c,country` CSV per region that temp_data.py writes.
+
+  python src/data/temperature/grid_data.py --grid cru_ts4.08.1901.2023.tmp.dat.nc \
+      --labels country_mask.npy --regions country_mask.txt --weights country_weights.npz
+"""
+from pathlib import Path
+import argparse
+import re
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.io import netcdf_file
+
+import monthly_store
+from country_ids import ID_FILE, CountryIds
+from monthly_store import safe_name
+from temp_data import OUT_DIR, render_csv, write_if_changed
+
+FILL_ABOVE = 1e30  # CRU TS missing_value is 9.96921e+36
+
+class RegionWeights:
+    """Sparse (region x cell) weight matrix for one lat/lon grid."""
+
+    def __init__(self, matrix: sparse.csr_matrix, regions: list[str], lat: np.ndarray, lon: np.ndarray):
+        self.matrix = matrix.tocsr()
+        self.regions = list(regions)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        if self.matrix.shape != (len(self.regions), len(self.lat) * len(self.lon)):
+            raise ValueError(f"weights {self.matrix.shape} do not match {len(self.regions)} regions x "
+                             f"{len(self.lat)}x{len(self.lon)} cells")
+        # only cells that carry weight are read from each slab (ocean drops out here)
+        self.cells = np.unique(self.matrix.indices)
+        self.sub = self.matrix[:, self.cells].tocsr()
+
+    @classmethod
+    def from_labels(cls, labels: np.ndarray, regions: list[str], lat, lon) -> "RegionWeights":
+        labels = np.asarray(labels)
+        lat = np.asarray(lat, dtype=np.float64)
+        if labels.shape != (len(lat), len(lon)):
+            raise ValueError(f"labels {labels.shape} do not match grid {len(lat)}x{len(lon)}")
+        if labels.max() >= len(regions):
+            raise ValueError(f"label {int(labels.max())} has no name ({len(regions)} regions)")
+        area = np.broadcast_to(np.cos(np.deg2rad(lat))[:, None], labels.shape)
+        cells = np.flatnonzero(labels.ravel() >= 0)
+        m = sparse.csr_matrix((area.ravel()[cells], (labels.ravel()[cells], cells)),
+                              shape=(len(regions), labels.size))
+        return cls(m, regions, lat, lon)
+
+    @classmethod
+    def load(cls, path: Path) -> "RegionWeights":
+        with np.load(path, allow_pickle=False) as z:
+            m = sparse.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=tuple(z["shape"]))
+            return cls(m, z["regions"].tolist(), z["lat"], z["lon"])
+
+    def save(self, path: Path):
+        m = self.matrix
+        np.savez_compressed(path, data=m.data, indices=m.indices, indptr=m.indptr, shape=np.array(m.shape),
+                            regions=np.array(self.regions), lat=self.lat, lon=self.lon)
+
+    def check_grid(self, lat, lon):
+        if not (np.allclose(lat, self.lat) and np.allclose(lon, self.lon)):
+            raise ValueError("grid lat/lon differ from the grid the weights were built for")
+
+    def apply(self, slab: np.ndarray) -> np.ndarray:
+        """[t, lat, lon] -> [regions, t] weighted means, NaN where a region has no valid cell."""
+        t = slab.shape[0]
+        x = slab.reshape(t, -1).T[self.cells]  # weighted cells x t
+        valid = np.isfinite(x)
+        both = np.empty((len(self.cells), 2 * t))
+        both[:, :t] = x
+        both[:, :t][~valid] = 0.0
+        both[:, t:] = valid
+        res = self.sub @ both
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return res[:, :t] / res[:, t:]
+
+def parse_time_units(units: str) -> np.datetime64:
+    m = re.match(r"\s*days since\s+(\d+)-(\d+)-(\d+)", units)
+    if not m:
+        raise ValueError(f"unsupported time units: {units!r}")
+    y, mo, d = map(int, m.groups())
+    return np.datetime64(f"{y:04d}-{mo:02d}-{d:02d}", "D")
+
+class GridSource:
+    """Monthly field [time, lat, lon] from NetCDF3 or .npy, read one slab at a time."""
+
+    def __init__(self, path: Path, var: str = "tmp", start: str | None = None,
+                 lat: np.ndarray | None = None, lon: np.ndarray | None = None):
+        self.path = Path(path)
+        self._nc = None
+        if self.path.suffix == ".npy":
+            if start is None or lat is None or lon is None:
+                raise ValueError("--start, --lat and --lon are required for .npy grids")
+            self.data = np.load(self.path, mmap_mode="r")
+            k0 = monthly_store.ym_to_key(start)
+            self.keys = k0 + np.arange(self.data.shape[0])
+            self.lat = np.asarray(lat, dtype=np.float64)
+            self.lon = np.asarray(lon, dtype=np.float64)
+            self._fill, self._scale, self._offset = [], None, None
+        else:
+            self._nc = netcdf_file(self.path, "r", mmap=True, maskandscale=False)
+            v = self._nc.variables
+            self.data = v[var]
+            if tuple(self.data.dimensions) != ("time", "lat", "lon"):
+                raise ValueError(f"{var}: expected dims (time, lat, lon), got {self.data.dimensions}")
+            units = v["time"].units
+            units = units.decode() if isinstance(units, bytes) else units
+            days = np.asarray(v["time"][:], dtype=np.float64)
+            dates = parse_time_units(units) + np.floor(days).astype("timedelta64[D]")
+            months = dates.astype("datetime64[M]").astype(np.int64)
+            self.keys = months + 1970*12
+            self.lat = np.array(v["lat"][:], dtype=np.float64)
+            self.lon = np.array(v["lon"][:], dtype=np.float64)
+            self._fill = [getattr(self.data, a) for a in ("_FillValue", "missing_value") if hasattr(self.data, a)]
+            self._scale = getattr(self.data, "scale_factor", None)
+            self._offset = getattr(self.data, "add_offset", None)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def slab(self, a: int, b: int) -> np.ndarray:
+        """Months [a, b) as floats with NaN for missing (float32 grids stay float32)."""
+        raw = np.array(self.data[a:b])
+        x = raw if raw.dtype.kind == "f" and self._scale is None and self._offset is None else raw.astype(np.float64)
+        bad = ~(np.abs(x) < FILL_ABOVE)
+        for f in self._fill:
+            bad |= raw == np.asarray(f).ravel()[0]
+        if self._scale is not None:
+            x *= float(self._scale)
+        if self._offset is not None:
+            x += float(self._offset)
+        x[bad] = np.nan
+        return x
+
+    def close(self):
+        if self._nc is not None:
+            self.data = None
+            self._nc.close()
+
+def aggregate(src: GridSource, weights: RegionWeights, slab_months: int = 120) -> np.ndarray:
+    """[regions, time] means, one sparse multiply per slab of `slab_months`."""
+    out = np.empty((len(weights.regions), len(src)), dtype=np.float64)
+    for a in range(0, len(src), slab_months):
+        b = min(a + slab_months, len(src))
+        out[:, a:b] = weights.apply(src.slab(a, b))
+    return out
+
+def region_frame(keys: np.ndarray, values: np.ndarray, region: str) -> pd.DataFrame:
+    keys = np.asarray(keys, dtype=np.int64)
+    date = (keys - 1970*12).astype("datetime64[M]").astype("datetime64[D]") + np.timedelta64(14, "D")
+    return pd.DataFrame({
+        "date": date.astype("datetime64[ns]"),
+        "year": keys // 12,
+        "month": keys % 12 + 1,
+        "temp_c": values,
+        "country": region,
+    })
+
+def load_or_build_weights(args, src: GridSource) -> RegionWeights:
+    path = Path(args.weights)
+    if args.labels and (args.rebuild_weights or not path.is_file()):
+        regions = [ln.strip() for ln in Path(args.regions).read_text(encoding="utf-8").splitlines() if ln.strip()]
+        w = RegionWeights.from_labels(np.load(args.labels), regions, src.lat, src.lon)
+        w.save(path)
+        print(f"[OK] weights {w.matrix.shape[0]} regions x {w.matrix.shape[1]} cells, nnz={w.matrix.nnz} -> {path}")
+        return w
+    if not path.is_file():
+        raise SystemExit(f"No weights at {path}; pass --labels/--regions to build them.")
+    return RegionWeights.load(path)
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="Aggregate gridded monthly CRU TS fields to per-region monthly CSVs.")
+    ap.add_argument("--grid", required=True, help="CRU TS NetCDF3 file (.nc) or raw [time, lat, lon] .npy grid")
+    ap.add_argument("--var", default="tmp", help="NetCDF variable (default tmp)")
+    ap.add_argument("--start", default=None, help="First month (YYYY-MM) of a .npy grid")
+    ap.add_argument("--lat", default=None, help=".npy latitudes of a .npy grid (cell centres)")
+    ap.add_argument("--lon", default=None, help=".npy longitudes of a .npy grid (cell centres)")
+    ap.add_argument("--weights", required=True, help="Sparse region x cell weights (.npz); built from --labels if missing")
+    ap.add_argument("--labels", default=None, help="int .npy [lat, lon] region label per cell, -1 = none")
+    ap.add_argument("--regions", default=None, help="text file, line i = name of label i")
+    ap.add_argument("--rebuild_weights", action="store_true", help="Rebuild --weights from --labels even if it exists.")
+    ap.add_argument("--slab", type=int, default=120, help="Months per sparse multiply (memory vs. overhead).")
+    ap.add_argument("--out_dir", default=str(OUT_DIR), help="Per-region CSV output (default temp_per_country/)")
+    ap.add_argument("--store_dir", default=None,
+                    help="Also write the columnar monthly store (note: it keeps tenths of °C only).")
+    ap.add_argument("--ids", default=str(ID_FILE), help="Country ID registry (see country_ids.py); new regions are appended.")
+    ap.add_argument("--snapshot", default=None,
+                    help="Name of the store vintage recorded after writing --store_dir (default: UTC timestamp).")
+    ap.add_argument("--no_snapshot", action="store_true", help="Update the live store without recording a vintage.")
+    args = ap.parse_args(argv)
+    if args.labels and not args.regions:
+        ap.error("--labels needs --regions")
+
+    lat = np.load(args.lat) if args.lat else None
+    lon = np.load(args.lon) if args.lon else None
+    src = GridSource(Path(args.grid), var=args.var, start=args.start, lat=lat, lon=lon)
+    try:
+        w = load_or_build_weights(args, src)
+        w.check_grid(src.lat, src.lon)
+        if tuple(src.data.shape[1:]) != (len(w.lat), len(w.lon)):
+            raise SystemExit(f"grid {tuple(src.data.shape[1:])} does not match {len(w.lat)}x{len(w.lon)} weights")
+        vals = aggregate(src, w, max(1, args.slab))
+        keys = np.asarray(src.keys)
+    finally:
+        src.close()
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    store_dir = Path(args.store_dir) if args.store_dir else None
+    ids = CountryIds.load(Path(args.ids))
+    written = unchanged = empty = 0
+    for i, region in enumerate(w.regions):
+        if np.isnan(vals[i]).all():
+            empty += 1
+            continue
+        df = region_frame(keys, vals[i], region)
+        ids.assign(region, aliases=[safe_name(region)])
+        if write_if_changed(out_dir / f"{safe_name(region)}.csv", render_csv(df)):
+            written += 1
+        else:
+            unchanged += 1
+        if store_dir is not None:
+            monthly_store.write_frame(store_dir, df)
+    if ids.dirty:
+        ids.save(Path(args.ids))
+    if store_dir is not None and store_dir.is_dir():
+        monthly_store.refresh_meta(store_dir, ids)
+        if not args.no_snapshot:
+            print(f"[OK] store snapshot: {monthly_store.snapshot(store_dir, args.snapshot, note=f'grid_data {args.var}')}")
+    print(f"[DONE] regions: {len(w.regions)} | written: {written} | unchanged: {unchanged} | "
+          f"no data: {empty} | months: {len(keys)} → {out_dir}")
+
+if __name__ == "__main__":
+    main()
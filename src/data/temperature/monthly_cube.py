@@ -0,0 +1,194 @@
+"""Dense country x month-key cube for O(1) lookups.
+
+Replaces the `(country, k)` MultiIndex + `L.loc[(country, k), col]` pattern of the
+phase 2/4 scripts. On disk:
+
+    <cube_dir>/index.json        # {"countries": [...], "k0": first month key, "n_k": columns}
+    <cube_dir>/temp_c.npy        # float32 [n_countries, n_k], NaN for gaps
+    <cube_dir>/clim_temp_c.npy
+    <cube_dir>/anomaly_c.npy
+    <cube_dir>/present.npy       # bool, True where the source had a row (even if its value is NaN)
+
+Arrays are opened with np.load(mmap_mode="r"), so worker processes attached to the same
+cube share the page cache instead of each holding a copy.
+
+Build:
+  python src/data/temperature/monthly_cube.py --anomalies data_clean/monthly_anomalies.csv --out_dir data_clean/monthly_cube
+
+Backtests against a past data vintage: cube.pin_vintage(store_dir, as_of) swaps in the
+temperatures of a monthly_store snapshot (anomaly_c against the cube's climatology);
+cube.to_frame() turns it back into the long anomalies frame the phase 3 features are built from.
+"""
+from __future__ import annotations
+import argparse
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import monthly_store
+
+VALUE_COLS = ["temp_c", "clim_temp_c", "anomaly_c"]
+INDEX = "index.json"
+
+class MonthlyCube:
+    def __init__(self, countries: list[str], k0: int, arrays: dict[str, np.ndarray], present: np.ndarray):
+        self.countries = list(countries)
+        self.rows = {c: i for i, c in enumerate(self.countries)}
+        self.k0 = int(k0)
+        self.n_k = int(present.shape[1])
+        self.arrays = arrays
+        self.present = present
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dtype=np.float64) -> "MonthlyCube":
+        """In-memory cube from a frame with country, year, month and VALUE_COLS."""
+        k = df["year"].astype(int).to_numpy()*12 + (df["month"].astype(int).to_numpy() - 1)
+        countries = pd.unique(df["country"].astype(str))
+        r = pd.Index(countries).get_indexer(df["country"].astype(str))
+        k0 = int(k.min()) if len(k) else 0
+        n_k = int(k.max()) - k0 + 1 if len(k) else 0
+        present = np.zeros((len(countries), n_k), dtype=bool)
+        present[r, k - k0] = True
+        arrays = {}
+        for col in VALUE_COLS:
+            if col not in df.columns:
+                continue
+            a = np.full((len(countries), n_k), np.nan, dtype=dtype)
+            a[r, k - k0] = df[col].to_numpy(dtype=dtype)
+            arrays[col] = a
+        return cls(countries.tolist(), k0, arrays, present)
+
+    @classmethod
+    def open(cls, cube_dir: Path, mmap_mode: str | None = "r") -> "MonthlyCube":
+        cube_dir = Path(cube_dir)
+        idx = json.loads((cube_dir / INDEX).read_text(encoding="utf-8"))
+        arrays = {c: np.load(cube_dir / f"{c}.npy", mmap_mode=mmap_mode)
+                  for c in VALUE_COLS if (cube_dir / f"{c}.npy").is_file()}
+        present = np.load(cube_dir / "present.npy", mmap_mode=mmap_mode)
+        return cls(idx["countries"], idx["k0"], arrays, present)
+
+    def save(self, cube_dir: Path, dtype=np.float32):
+        cube_dir = Path(cube_dir)
+        cube_dir.mkdir(parents=True, exist_ok=True)
+        for col, a in self.arrays.items():
+            np.save(cube_dir / f"{col}.npy", np.ascontiguousarray(a, dtype=dtype))
+        np.save(cube_dir / "present.npy", np.ascontiguousarray(self.present))
+        idx = {"countries": self.countries, "k0": self.k0, "n_k": self.n_k, "columns": list(self.arrays)}
+        (cube_dir / INDEX).write_text(json.dumps(idx, indent=1), encoding="utf-8")
+
+    def row(self, country: str) -> int | None:
+        return self.rows.get(str(country))
+
+    def has(self, country: str, k: int) -> bool:
+        r, j = self.row(country), int(k) - self.k0
+        return r is not None and 0 <= j < self.n_k and bool(self.present[r, j])
+
+    def get(self, col: str, country: str, k: int, default=np.nan) -> float:
+        """Scalar lookup; `default` where the source had no row (like a KeyError on .loc)."""
+        if not self.has(country, k):
+            return default
+        return float(self.arrays[col][self.rows[str(country)], int(k) - self.k0])
+
+    def take(self, col: str, country: str, keys) -> np.ndarray:
+        """Values at month keys for one country (float64), NaN outside coverage."""
+        keys = np.asarray(keys, dtype=np.int64)
+        out = np.full(keys.shape, np.nan)
+        r = self.row(country)
+        if r is None:
+            return out
+        j = keys - self.k0
+        ok = (j >= 0) & (j < self.n_k)
+        out[ok] = self.arrays[col][r, j[ok]]
+        return out
+
+    def present_at(self, country: str, keys) -> np.ndarray:
+        keys = np.asarray(keys, dtype=np.int64)
+        out = np.zeros(keys.shape, dtype=bool)
+        r = self.row(country)
+        if r is None:
+            return out
+        j = keys - self.k0
+        ok = (j >= 0) & (j < self.n_k)
+        out[ok] = self.present[r, j[ok]]
+        return out
+
+    def block(self, col: str, keys) -> np.ndarray:
+        """[n_countries, len(keys)] values at month keys (float64), NaN outside coverage."""
+        keys = np.asarray(keys, dtype=np.int64)
+        out = np.full((len(self.countries), len(keys)), np.nan)
+        j = keys - self.k0
+        ok = (j >= 0) & (j < self.n_k)
+        out[:, ok] = self.arrays[col][:, j[ok]]
+        return out
+
+    def present_block(self, keys) -> np.ndarray:
+        keys = np.asarray(keys, dtype=np.int64)
+        out = np.zeros((len(self.countries), len(keys)), dtype=bool)
+        j = keys - self.k0
+        ok = (j >= 0) & (j < self.n_k)
+        out[:, ok] = self.present[:, j[ok]]
+        return out
+
+    def month_means(self, col: str) -> np.ndarray:
+        """[n_countries, 12] mean of `col` per calendar month (month 1 in column 0)."""
+        a = np.asarray(self.arrays[col], dtype=np.float64)
+        out = np.full((len(self.countries), 12), np.nan)
+        months = (np.arange(self.n_k) + self.k0) % 12
+        with np.errstate(invalid="ignore"):
+            for m in range(12):
+                sub = a[:, months == m]
+                n = (~np.isnan(sub)).sum(axis=1)
+                s = np.nansum(sub, axis=1)
+                out[:, m] = np.where(n > 0, s / np.maximum(n, 1), np.nan)
+        return out
+
+    def pin_vintage(self, store_dir: Path, as_of: str) -> "MonthlyCube":
+        """Same countries, temp_c from monthly_store snapshot `as_of`; clim_temp_c is this
+        cube's calendar-month climatology and anomaly_c = temp_c - clim_temp_c."""
+        df = monthly_store.read_monthly(store_dir, columns=["country", "k", "temp_c"],
+                                        countries=self.countries, as_of=as_of)
+        r = pd.Index(self.countries).get_indexer(df["country"].astype(str))
+        df, r = df[r >= 0], r[r >= 0]  # matched by partition name only
+        k = df["k"].to_numpy(dtype=np.int64)
+        k0 = int(k.min()) if len(k) else self.k0
+        n_k = int(k.max()) - k0 + 1 if len(k) else 0
+        present = np.zeros((len(self.countries), n_k), dtype=bool)
+        temp = np.full((len(self.countries), n_k), np.nan)
+        present[r, k - k0] = True
+        temp[r, k - k0] = df["temp_c"].to_numpy(dtype=np.float64)
+        clim = self.month_means("clim_temp_c")[:, (np.arange(n_k) + k0) % 12]
+        return MonthlyCube(self.countries, k0, {"temp_c": temp, "clim_temp_c": clim, "anomaly_c": temp - clim}, present)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Long frame (country, year, month, VALUE_COLS) of the months the source had."""
+        r, j = np.nonzero(np.asarray(self.present))
+        k = j + self.k0
+        out = pd.DataFrame({"country": np.asarray(self.countries, dtype=object)[r], "year": k // 12, "month": k % 12 + 1})
+        for col, a in self.arrays.items():
+            out[col] = np.asarray(a, dtype=np.float64)[r, j]
+        return out
+
+def load_or_build(cube_dir: str | None, anomalies: pd.DataFrame | None) -> MonthlyCube:
+    """Attach to a cube on disk if given, else build one in memory from the anomalies frame."""
+    if cube_dir:
+        return MonthlyCube.open(Path(cube_dir))
+    if anomalies is None:
+        raise ValueError("Need either a cube directory or an anomalies frame.")
+    return MonthlyCube.from_frame(anomalies)
+
+def main():
+    ap = argparse.ArgumentParser(description="Build the dense country x month cube from monthly anomalies.")
+    ap.add_argument("--anomalies", required=True, help="data_clean/monthly_anomalies.csv (country, year, month, temp_c, clim_temp_c, anomaly_c)")
+    ap.add_argument("--out_dir", required=True, help="cube directory, e.g. data_clean/monthly_cube")
+    args = ap.parse_args()
+
+    df = pd.read_csv(args.anomalies)
+    miss = [c for c in ["country","year","month"] + VALUE_COLS if c not in df.columns]
+    if miss:
+        raise SystemExit(f"Missing columns in anomalies: {miss}")
+    cube = MonthlyCube.from_frame(df, dtype=np.float32)
+    cube.save(Path(args.out_dir))
+    print(f"[OK] cube {len(cube.countries)} x {cube.n_k} (k0={cube.k0}) -> {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Columnar monthly store, partitioned by country.
+
+Layout (one directory per country, plain .npy columns so readers can mmap them):
+
+    monthly_store/
+      _meta.json                    # schema + partition -> country name, rows, k range
+      <safe_name>/k.npy             # int32 month key  year*12 + (month-1), sorted
+      <safe_name>/temp_c10.npy      # int16 tenths of °C (CRU native precision), NA_INT16 = missing
+      <safe_name>/<col>10.npy       # further variables (pre_mm, tmax_c, ...), tenths, aligned with k.npy
+      <safe_name>/country.txt       # original country name
+      _objects/<sha256>.npy         # immutable column files referenced by snapshots
+      _snapshots/<name>.json        # vintage: partition -> {"k": sha256, "temp_c10": sha256, ...}
+
+_meta.json also carries each partition's canonical `country_id` (country_ids.py) when the
+store was refreshed with the ID registry; read_monthly(columns=[..., "country_id"]) returns it.
+
+snapshot() records the store as it is now (temp_data.py / grid_data.py after each ingest,
+phase5_apply_forecasts_to_country_files.py after appending forecasts). Column files are
+content-addressed and hard-linked into _objects/ (copied where links are not supported), so
+a partition that did not change is shared by every vintage, and a changed one costs only
+its new files. The live files are only ever replaced via rename, never rewritten in place,
+so a link keeps the old bytes. read_monthly(as_of=name) reads a vintage instead of the
+live partitions ("latest" = newest snapshot).
+
+`k` is the same month key the phase 2-5 scripts build from (year, month). All value
+columns of a partition share its k.npy, so variables join by array position.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+import shutil
+import numpy as np
+import pandas as pd
+
+HERE = Path(__file__).resolve()
+STORE_DIR = HERE.parent / "monthly_store"
+META = "_meta.json"
+OBJECTS = "_objects"
+SNAPSHOTS = "_snapshots"
+NA_INT16 = np.iinfo(np.int16).min
+# value column -> on-disk integer dtype (tenths); the minimum of the dtype marks missing
+VALUE_COLUMNS = {
+    "temp_c": np.int16, "tmax_c": np.int16, "tmin_c": np.int16, "dtr_c": np.int16,
+    "pre_mm": np.int32, "pet_mm": np.int16, "vap_hpa": np.int16, "cld_pct": np.int16,
+    "wet_days": np.int16, "frs_days": np.int16,
+}
+COLUMNS = ["country", "country_id", "k", "year", "month", "date", *VALUE_COLUMNS]
+DEFAULT_COLUMNS = ["country", "year", "month", "temp_c"]
+
+def safe_name(s: str) -> str:
+    s = re.sub(r"[^A-Za-z0-9]+", "_", str(s).strip())
+    return s.strip("_") or "UNKNOWN"
+
+def ym_to_key(ym: str | int | None) -> int | None:
+    """'YYYY-MM' (or an already computed key) -> month key."""
+    if ym is None or isinstance(ym, (int, np.integer)):
+        return ym
+    y, m = str(ym).split("-")[:2]
+    return int(y)*12 + int(m) - 1
+
+def encode_values(values, int_dtype=np.int16) -> np.ndarray:
+    t = np.asarray(values, dtype=np.float64)
+    info = np.iinfo(int_dtype)
+    out = np.full(t.shape, info.min, dtype=int_dtype)
+    ok = ~np.isnan(t)
+    v = np.rint(t[ok] * 10.0)
+    if v.size and (v.min() <= info.min or v.max() > info.max):
+        raise ValueError(f"values outside the {np.dtype(int_dtype).name} range of the store")
+    out[ok] = v.astype(int_dtype)
+    return out
+
+def decode_values(values10: np.ndarray, dtype=np.float64) -> np.ndarray:
+    out = values10.astype(dtype) / dtype(10.0)
+    out[values10 == np.iinfo(values10.dtype).min] = np.nan
+    return out
+
+def encode_temp(temp_c) -> np.ndarray:
+    return encode_values(temp_c, np.int16)
+
+def decode_temp(temp_c10: np.ndarray, dtype=np.float64) -> np.ndarray:
+    return decode_values(temp_c10, dtype)
+
+def _write_npy_if_changed(path: Path, arr: np.ndarray) -> bool:
+    tmp = path.with_suffix(".tmp.npy")
+    np.save(tmp, arr)
+    if path.is_file() and path.stat().st_size == tmp.stat().st_size and path.read_bytes() == tmp.read_bytes():
+        tmp.unlink()
+        return False
+    tmp.replace(path)
+    return True
+
+def write_partition(store_dir: Path, country: str, k, values: dict) -> bool:
+    """Write one country partition ({column: values aligned with k});
+    returns True if any column file changed on disk."""
+    k = np.asarray(k, dtype=np.int32)
+    order = np.argsort(k, kind="stable")
+    part = store_dir / safe_name(country)
+    part.mkdir(parents=True, exist_ok=True)
+    changed = _write_npy_if_changed(part / "k.npy", k[order])
+    for col, v in values.items():
+        enc = encode_values(np.asarray(v)[order], VALUE_COLUMNS[col])
+        changed |= _write_npy_if_changed(part / f"{col}10.npy", enc)
+    name_file = part / "country.txt"
+    if not name_file.is_file() or name_file.read_text(encoding="utf-8") != str(country):
+        name_file.write_text(str(country), encoding="utf-8")
+        changed = True
+    return changed
+
+def write_frame(store_dir: Path, df: pd.DataFrame) -> bool:
+    """Write a `date,year,month,<value columns>,country` frame (one country) as a partition."""
+    k = df["year"].astype(int).to_numpy()*12 + (df["month"].astype(int).to_numpy() - 1)
+    values = {c: df[c].to_numpy() for c in VALUE_COLUMNS if c in df.columns}
+    return write_partition(store_dir, str(df["country"].iloc[0]), k, values)
+
+def refresh_meta(store_dir: Path, ids=None) -> dict:
+    """Rebuild _meta.json from the partitions; `ids` (country_ids.CountryIds) adds country_id."""
+    parts = {}
+    for d in sorted(p for p in store_dir.iterdir() if p.is_dir() and (p / "k.npy").is_file()):
+        k = np.load(d / "k.npy", mmap_mode="r")
+        name_file = d / "country.txt"
+        parts[d.name] = {
+            "country": name_file.read_text(encoding="utf-8") if name_file.is_file() else d.name,
+            "rows": int(len(k)),
+            "k_min": int(k[0]) if len(k) else None,
+            "k_max": int(k[-1]) if len(k) else None,
+            "values": [c for c in VALUE_COLUMNS if (d / f"{c}10.npy").is_file()],
+        }
+        if ids is not None:
+            cid = ids.id_of(parts[d.name]["country"])
+            parts[d.name]["country_id"] = -1 if cid is None else cid
+    meta = {
+        "version": 1,
+        "columns": {"k": "int32", **{f"{c}10": np.dtype(t).name for c, t in VALUE_COLUMNS.items()}},
+        "na_int16": int(NA_INT16),
+        "partitions": parts,
+    }
+    path, data = store_dir / META, json.dumps(meta, indent=1)
+    if not path.is_file() or path.read_text(encoding="utf-8") != data:
+        path.write_text(data, encoding="utf-8")
+    return meta
+
+def load_meta(store_dir: Path = STORE_DIR) -> dict:
+    path = Path(store_dir) / META
+    if not path.is_file():
+        raise FileNotFoundError(f"No monthly store at {store_dir} (run temp_data.py first).")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _add_object(store_dir: Path, path: Path, sha: str):
+    obj = store_dir / OBJECTS / f"{sha}.npy"
+    if obj.is_file():
+        return
+    obj.parent.mkdir(exist_ok=True)
+    tmp = obj.with_suffix(".tmp")
+    try:
+        os.link(path, tmp)
+    except OSError:
+        shutil.copyfile(path, tmp)
+    tmp.replace(obj)
+
+def list_snapshots(store_dir: Path = STORE_DIR) -> list[str]:
+    """Snapshot names, oldest first."""
+    d = Path(store_dir) / SNAPSHOTS
+    if not d.is_dir():
+        return []
+    snaps = [json.loads(p.read_text(encoding="utf-8")) for p in d.glob("*.json")]
+    return [s["name"] for s in sorted(snaps, key=lambda s: (s["created"], s["name"]))]
+
+def load_snapshot(store_dir: Path, name: str) -> dict:
+    store_dir = Path(store_dir)
+    if name == "latest":
+        names = list_snapshots(store_dir)
+        if not names:
+            raise FileNotFoundError(f"No snapshots in {store_dir}")
+        name = names[-1]
+    path = store_dir / SNAPSHOTS / f"{name}.json"
+    if not path.is_file():
+        raise FileNotFoundError(f"No snapshot '{name}' in {store_dir}. Available: {list_snapshots(store_dir)}")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def snapshot(store_dir: Path = STORE_DIR, name: str | None = None, note: str = "") -> str:
+    """Record the current partitions as a vintage and return its name. Nothing is written
+    when the store is unchanged since the newest snapshot (its name is returned instead)."""
+    store_dir = Path(store_dir)
+    meta = load_meta(store_dir)
+    names = list_snapshots(store_dir)
+    prev = load_snapshot(store_dir, names[-1]) if names else None
+    # unchanged files (same size and mtime as at the last snapshot) are not hashed again
+    known = {}
+    for part, info in (prev["partitions"] if prev else {}).items():
+        for stem, f in info["files"].items():
+            known[(part, stem, f["size"], f["mtime_ns"])] = f["sha256"]
+    parts = {}
+    for part, info in meta["partitions"].items():
+        files = {}
+        for p in sorted((store_dir / part).glob("*.npy")):
+            if p.name.endswith(".tmp.npy"):
+                continue
+            st = p.stat()
+            sha = known.get((part, p.stem, st.st_size, st.st_mtime_ns)) or _sha256_file(p)
+            _add_object(store_dir, p, sha)
+            files[p.stem] = {"sha256": sha, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        parts[part] = {**info, "files": files}
+
+    def content(ps):
+        return {p: {**v, "files": {s: f["sha256"] for s, f in v["files"].items()}} for p, v in ps.items()}
+    if prev is not None and content(prev["partitions"]) == content(parts):
+        return prev["name"]
+    now = datetime.now(timezone.utc)
+    name = name or now.strftime("%Y%m%dT%H%M%SZ")
+    path = store_dir / SNAPSHOTS / f"{name}.json"
+    if path.is_file():
+        raise FileExistsError(f"Snapshot '{name}' already exists in {store_dir}")
+    path.parent.mkdir(exist_ok=True)
+    snap = {"name": name, "created": now.isoformat(), "parent": prev["name"] if prev else None,
+            "note": note, "columns": meta["columns"], "partitions": parts}
+    path.write_text(json.dumps(snap, indent=1), encoding="utf-8")
+    return name
+
+def _partitions(store_dir: Path, as_of: str | None) -> tuple:
+    """(partitions, path of column `stem` in partition `part`) of the live store or a vintage."""
+    if as_of is None:
+        return load_meta(store_dir)["partitions"], lambda part, info, stem: store_dir / part / f"{stem}.npy"
+    def path(part, info, stem):
+        f = info["files"].get(stem)
+        return store_dir / OBJECTS / f"{f['sha256']}.npy" if f else store_dir / part / ".missing"
+    return load_snapshot(store_dir, as_of)["partitions"], path
+
+def country_names(store_dir: Path = STORE_DIR, as_of: str | None = None) -> list[str]:
+    """Sorted country names of the store's partitions (of vintage `as_of`)."""
+    return sorted(v["country"] for v in _partitions(Path(store_dir), as_of)[0].values())
+
+def last_key(store_dir: Path, country: str) -> int:
+    """Month key of the partition's last month; -1 if the partition is missing or empty."""
+    f = Path(store_dir) / safe_name(country) / "k.npy"
+    k = np.load(f, mmap_mode="r") if f.is_file() else ()
+    return int(k[-1]) if len(k) else -1
+
+def append_partition(store_dir: Path, country: str, k, values: dict,
+                     overwrite: bool = False) -> tuple[int, int]:
+    """Add months to a partition ({column: values aligned with k}). By default only months
+    after the partition's last month are added; with overwrite=True months already present
+    are replaced. Columns missing on either side are filled with NaN.
+    Returns (months added, months replaced)."""
+    store_dir = Path(store_dir)
+    part = store_dir / safe_name(country)
+    k = np.asarray(k, dtype=np.int32)
+    old_k = np.load(part / "k.npy") if (part / "k.npy").is_file() else np.empty(0, dtype=np.int32)
+    if not overwrite and len(old_k):
+        after = k > old_k.max()
+        k = k[after]
+        values = {c: np.asarray(v)[after] for c, v in values.items()}
+    if not len(k):
+        return 0, 0
+    keep = ~np.isin(old_k, k)
+    replaced = int(len(old_k) - keep.sum())
+    cols = [c for c in VALUE_COLUMNS if c in values or (part / f"{c}10.npy").is_file()]
+    merged = {}
+    for c in cols:
+        f = part / f"{c}10.npy"
+        old = decode_values(np.load(f)) if f.is_file() else np.full(len(old_k), np.nan)
+        new = np.asarray(values[c], dtype=np.float64) if c in values else np.full(len(k), np.nan)
+        merged[c] = np.concatenate([old[keep], new])
+    write_partition(store_dir, country, np.concatenate([old_k[keep], k]), merged)
+    return len(k) - replaced, replaced
+
+def read_monthly(store_dir: Path = STORE_DIR, columns: list[str] | None = None,
+                 countries: list[str] | None = None, start=None, end=None,
+                 temp_dtype=np.float64, as_of: str | None = None) -> pd.DataFrame:
+    """Read the store into one long frame.
+
+    columns   : subset of COLUMNS (default country, year, month, temp_c); value columns a
+                partition does not hold come back as NaN
+    countries : country names (or partition names) to keep; None = all
+    start/end : inclusive month bounds as 'YYYY-MM' or month key
+    as_of     : snapshot name (or "latest") to read instead of the live partitions
+    """
+    store_dir = Path(store_dir)
+    columns = list(columns or DEFAULT_COLUMNS)
+    unknown = [c for c in columns if c not in COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown store columns: {unknown}. Available: {COLUMNS}")
+    parts, column_path = _partitions(store_dir, as_of)
+    if countries is not None:
+        wanted = {str(c) for c in countries}
+        parts = {p: v for p, v in parts.items() if v["country"] in wanted or p in wanted}
+    k0, k1 = ym_to_key(start), ym_to_key(end)
+
+    names, cids, sizes, ks = [], [], [], []
+    value_cols = [c for c in columns if c in VALUE_COLUMNS]
+    vals = {c: [] for c in value_cols}
+    for part, info in parts.items():
+        k = np.load(column_path(part, info, "k"), mmap_mode="r")
+        lo = 0 if k0 is None else int(np.searchsorted(k, k0, side="left"))
+        hi = len(k) if k1 is None else int(np.searchsorted(k, k1, side="right"))
+        if hi <= lo:
+            continue
+        names.append(info["country"])
+        cids.append(info.get("country_id", -1))
+        sizes.append(hi - lo)
+        ks.append(np.asarray(k[lo:hi]))
+        for c in value_cols:
+            f = column_path(part, info, f"{c}10")
+            if f.is_file():
+                vals[c].append(decode_values(np.asarray(np.load(f, mmap_mode="r")[lo:hi]), temp_dtype))
+            else:
+                vals[c].append(np.full(hi - lo, np.nan, dtype=temp_dtype))
+
+    k = np.concatenate(ks) if ks else np.empty(0, dtype=np.int32)
+    out = {}
+    for c in columns:
+        if c == "country":
+            codes = np.repeat(np.arange(len(names), dtype=np.int32), sizes)
+            out[c] = pd.Categorical.from_codes(codes, categories=names)
+        elif c == "country_id":
+            out[c] = np.repeat(np.asarray(cids, dtype=np.int32), sizes)
+        elif c == "k":
+            out[c] = k
+        elif c == "year":
+            out[c] = (k // 12).astype(np.int16)
+        elif c == "month":
+            out[c] = (k % 12 + 1).astype(np.int8)
+        elif c == "date":
+            out[c] = (k.astype(np.int64) - 1970*12).astype("datetime64[M]").astype("datetime64[ns]") + np.timedelta64(14, "D")
+        elif c in VALUE_COLUMNS:
+            out[c] = np.concatenate(vals[c]) if vals[c] else np.empty(0, dtype=temp_dtype)
+    return pd.DataFrame(out, columns=columns)
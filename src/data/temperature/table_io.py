@@ -0,0 +1,278 @@
+"""Shared table reader for the pipeline scripts.
+
+    from table_io import read_table
+    df = read_table(Path("data_clean/monthly_anomalies.csv"), columns=["country","year","month","anomaly_c"])
+
+- explicit dtypes for the pipeline's known columns (DTYPES), `country` as category
+- `columns` projects on read (usecols); requested columns the file lacks are skipped,
+  so the scripts' own "missing columns" checks still report them
+- .csv inputs are converted once into a column cache keyed by their content hash:
+
+      <cache_dir>/<sha256>/meta.json     # columns, dtypes, categories
+      <cache_dir>/<sha256>/<i>.npy       # one array per column (categoricals as int32 codes)
+      <cache_dir>/index.json             # path -> size, mtime_ns, sha256 (skips re-hashing)
+
+  Later reads map the projected columns (np.load, copy-on-write mmap) instead of parsing the CSV.
+  Same .npy layout as monthly_store / monthly_cube, so no extra dependency. Only the newest
+  version of each source path is kept (older hashes, and those of deleted files, are removed
+  when the index changes). Files with object columns that are not plain strings (e.g. bools
+  with NaN) are not cached, since codes + str categories would not round-trip them.
+  CLIMATEWIZ_TABLE_CACHE=<dir> moves the cache, CLIMATEWIZ_TABLE_CACHE=off disables it.
+
+Compact in-memory schema (`compact=True` / compact_frame): int16 year, int8 month, int32
+month keys, categorical country, i.e. ~17 bytes per monthly row instead of ~40 plus a Python
+string. Values stay float64, so thresholds and z-scores compute exactly as on the full frame;
+compact_frame(df, floats=np.float32) also halves them, for storage only (arithmetic on the
+float32 values differs, e.g. -4.6 - -19.6 is exactly 15.0 there). print_peak_rss() reports
+the process high-water mark.
+
+TableWriter appends frames chunk by chunk to one .csv/.parquet output (header/schema from the
+first chunk), chunks(items, n) batches partitions, so scripts can stream country partitions
+instead of concatenating the whole corpus.
+"""
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import sys
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = Path(__file__).resolve().parents[3] / ".cache" / "tables"
+INDEX = "index.json"
+UNCACHED = "uncached"                 # marker in an entry dir: file is always parsed
+CACHE_VERSION = 2                     # 2: entries with lossy object columns are no longer written
+
+DTYPES = {
+    "country": "category",
+    "year": "int64", "month": "int64", "k": "int64", "_k": "int64",
+    "cutoff_k": "int64", "target_k": "int64", "h": "int64",
+    "cutoff_year": "int64", "cutoff_month": "int64", "target_year": "int64", "target_month": "int64",
+    "temp_c": "float64", "clim_temp_c": "float64", "anomaly_c": "float64", "anomaly_norm": "float64",
+    "pred_c": "float64", "y_true_c": "float64",
+}
+SUPPORTED = {".csv", ".parquet", ".feather"}
+
+COMPACT_DTYPES = {
+    "year": "int16", "month": "int8", "h": "int16", "horizon": "int16",
+    "cutoff_year": "int16", "cutoff_month": "int8", "target_year": "int16", "target_month": "int8",
+    "k": "int32", "_k": "int32", "cutoff_k": "int32", "target_k": "int32", "cutoff_key": "int32",
+}
+
+def cache_dir() -> Path | None:
+    env = os.environ.get("CLIMATEWIZ_TABLE_CACHE")
+    if env is None:
+        return CACHE_DIR
+    return None if env.strip().lower() in ("", "0", "off", "none") else Path(env)
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _content_key(path: Path, root: Path) -> str:
+    """sha256 of the file; re-hashed only when size/mtime differ from the index."""
+    st = path.stat()
+    idx_path = root / INDEX
+    try:
+        idx = json.loads(idx_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        idx = {}
+    key = str(path.resolve())
+    entry = idx.get(key)
+    if entry and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+        return entry["sha256"]
+    sha = file_sha256(path)
+    idx[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+    idx = {p: e for p, e in idx.items() if p == key or Path(p).is_file()}
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = idx_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(idx, indent=1), encoding="utf-8")
+    tmp.replace(idx_path)
+    _prune(root, {e["sha256"] for e in idx.values()})
+    return sha
+
+def _prune(root: Path, keep: set[str]):
+    """Drop cache entries no indexed path refers to (superseded versions, deleted files)."""
+    for d in root.iterdir():
+        if d.is_dir() and len(d.name) == 64 and d.name not in keep:
+            shutil.rmtree(d, ignore_errors=True)
+
+def _dtype_map(header, dtypes: dict | None, categorical: bool) -> dict:
+    m = {**DTYPES, **(dtypes or {})}
+    if not categorical and m.get("country") == "category":
+        m["country"] = "object"
+    return {c: m[c] for c in header if c in m}
+
+def _parse_csv(path: Path, usecols, dtype_map: dict) -> pd.DataFrame:
+    try:
+        return pd.read_csv(path, usecols=usecols, dtype=dtype_map)
+    except (ValueError, TypeError):
+        # e.g. NaN in a column mapped to int64: keep the explicit float/category dtypes, infer the rest
+        loose = {c: t for c, t in dtype_map.items() if not str(t).startswith("int")}
+        return pd.read_csv(path, usecols=usecols, dtype=loose)
+
+def _cacheable(df: pd.DataFrame) -> bool:
+    """Object columns must be strings (NaN allowed) to survive the codes + categories layout."""
+    return all(pd.api.types.infer_dtype(df[c], skipna=True) in ("string", "empty")
+               for c in df.columns if df[c].dtype == object)
+
+def _write_cache(df: pd.DataFrame, entry: Path):
+    tmp = entry.with_name(entry.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    cols = []
+    for i, c in enumerate(df.columns):
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            np.save(tmp / f"{i}.npy", s.cat.codes.to_numpy(dtype=np.int32))
+            cols.append({"name": c, "kind": "category", "categories": s.cat.categories.astype(str).tolist()})
+        elif s.dtype == object:
+            codes, uniques = pd.factorize(s, use_na_sentinel=True)
+            np.save(tmp / f"{i}.npy", codes.astype(np.int32))
+            cols.append({"name": c, "kind": "object", "categories": [str(u) for u in uniques]})
+        else:
+            np.save(tmp / f"{i}.npy", s.to_numpy())
+            cols.append({"name": c, "kind": "array"})
+    meta = {"version": CACHE_VERSION, "rows": int(len(df)), "columns": cols}
+    (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+    shutil.rmtree(entry, ignore_errors=True)
+    tmp.replace(entry)
+
+def _read_cache(entry: Path, columns: list[str] | None, categorical: bool) -> pd.DataFrame | None:
+    try:
+        meta = json.loads((entry / "meta.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CACHE_VERSION:
+        return None
+    spec = {c["name"]: (i, c) for i, c in enumerate(meta["columns"])}
+    names = [c for c in (columns or spec) if c in spec]
+    out = {}
+    for name in names:
+        i, c = spec[name]
+        a = np.load(entry / f"{i}.npy", mmap_mode="c")  # copy-on-write: callers may assign in place
+        if c["kind"] == "array":
+            out[name] = a
+        else:
+            cat = pd.Categorical.from_codes(np.asarray(a), categories=c["categories"])
+            out[name] = cat if (c["kind"] == "category" and categorical) else np.asarray(cat.astype(object))
+    return pd.DataFrame(out, columns=names, copy=False)
+
+def compact_frame(df: pd.DataFrame, categorical: bool = True, floats=np.float64) -> pd.DataFrame:
+    """Downcast in place to the compact schema: COMPACT_DTYPES for integer columns without
+    NaN, country -> category; float64 -> `floats` (float32 only for storage, not arithmetic)."""
+    for c in df.columns:
+        s = df[c]
+        if s.dtype == np.float64 and floats != np.float64:
+            df[c] = s.astype(floats)
+        elif c in COMPACT_DTYPES and s.dtype.kind in "iu":
+            df[c] = s.astype(COMPACT_DTYPES[c])
+        elif c == "country" and categorical and s.dtype == object:
+            df[c] = s.astype("category")
+    return df
+
+def read_table(path: Path, columns: list[str] | None = None, dtypes: dict | None = None,
+               categorical: bool = True, cache: bool = True, compact: bool = False) -> pd.DataFrame:
+    """Read a .csv/.parquet/.feather table with the pipeline dtypes.
+
+    columns     : projection; None = all columns (order of the file)
+    dtypes      : extra/overriding {column: dtype}
+    categorical : country as pandas category (False: plain strings)
+    cache       : use the .npy column cache for .csv inputs
+    compact     : downcast to the compact schema (see compact_frame)
+    """
+    df = _read_table(path, columns, dtypes, categorical, cache)
+    return compact_frame(df, categorical) if compact else df
+
+def _read_table(path: Path, columns: list[str] | None, dtypes: dict | None,
+                categorical: bool, cache: bool) -> pd.DataFrame:
+    path = Path(path)
+    sfx = path.suffix.lower()
+    if sfx not in SUPPORTED:
+        raise ValueError(f"Unsupported file: {path}")
+    if sfx == ".parquet" or sfx == ".feather":
+        reader = pd.read_parquet if sfx == ".parquet" else pd.read_feather
+        df = reader(path)
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return df.astype(_dtype_map(df.columns, dtypes, categorical))
+
+    root = cache_dir() if cache and dtypes is None else None
+    if root is not None:
+        entry = root / _content_key(path, root)
+        df = _read_cache(entry, columns, categorical)
+        if df is not None:
+            return df
+        if not (entry / UNCACHED).is_file():
+            full = _parse_csv(path, None, _dtype_map(pd.read_csv(path, nrows=0).columns, None, True))
+            if _cacheable(full):
+                _write_cache(full, entry)
+                return _read_cache(entry, columns, categorical)
+            entry.mkdir(parents=True, exist_ok=True)
+            (entry / UNCACHED).touch()
+
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = None if columns is None else [c for c in header if c in set(columns)]
+    df = _parse_csv(path, usecols, _dtype_map(header, dtypes, categorical))
+    return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+def chunks(items, n: int | None):
+    """Consecutive lists of n items (n None/0: one list with everything)."""
+    items = list(items)
+    n = n or len(items) or 1
+    for i in range(0, len(items), n):
+        yield items[i:i+n]
+
+class TableWriter:
+    """Append frames to one .csv/.parquet file; `with TableWriter(path) as w: w.write(df)`."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.sfx = self.path.suffix.lower()
+        if self.sfx not in (".csv", ".parquet"):
+            raise ValueError("Output must be .parquet or .csv")
+        self.rows = 0
+        self._pq = None
+
+    def write(self, df: pd.DataFrame):
+        if self.rows == 0 and self._pq is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.sfx == ".csv":
+            df.to_csv(self.path, index=False, mode="w" if self.rows == 0 else "a", header=self.rows == 0)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._pq is None:
+                self._pq = pq.ParquetWriter(self.path, table.schema)
+            self._pq.write_table(table.cast(self._pq.schema))
+        self.rows += len(df)
+
+    def close(self):
+        if self._pq is not None:
+            self._pq.close()
+            self._pq = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process in MB (None where `resource` is unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / 2**20 if sys.platform == "darwin" else r / 2**10  # bytes on macOS, KiB on Linux
+
+def print_peak_rss():
+    mb = peak_rss_mb()
+    if mb is not None:
+        print(f"[OK] peak RSS: {mb:.1f} MB")
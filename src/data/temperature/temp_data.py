@@ -1,22 +1,39 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+import argparse
+import gzip
+import hashlib
+import json
 import re
-import io
+import tarfile
+import zipfile
 import pandas as pd
 import numpy as np
 
+import monthly_store
+from country_ids import ID_FILE, CountryIds
+from csv_index import CsvIndex
+from monthly_store import safe_name
+
 HERE = Path(__file__).resolve()
 DATA_DIR = HERE.parent
-IN_DIR = DATA_DIR / "dataset_temp"        # .per input
-OUT_DIR = DATA_DIR / "temp_per_country"    # CSV output
+IN_DIR = DATA_DIR / "dataset_temp"        # default .per input (--in_dir)
+OUT_DIR = DATA_DIR / "temp_per_country"    # default CSV output (--out_dir)
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 MONTHS = ["JAN","FEB","MAR","APR","MAY","JUN","JUL","AUG","SEP","OCT","NOV","DEC"]
 MONTH_MAP = {m:i+1 for i,m in enumerate(MONTHS)}
 MISSING = -999.0
+MANIFEST_NAME = "ingest_manifest.json"
 
-def safe_name(s: str) -> str:
-    s = re.sub(r"[^A-Za-z0-9]+", "_", str(s).strip())
-    return s.strip("_") or "UNKNOWN"
+# CRU country-file variable code (crucy.<ver>.<period>.<Country>.<code>.per) -> output column
+CRU_VARS = {
+    "tmp": "temp_c", "tmx": "tmax_c", "tmn": "tmin_c", "dtr": "dtr_c", "pre": "pre_mm",
+    "pet": "pet_mm", "vap": "vap_hpa", "cld": "cld_pct", "wet": "wet_days", "frs": "frs_days",
+}
+PER_NAME = re.compile(r"\.(?P<name>[^.]+)\.(?P<var>[A-Za-z]{3})\.per$")
 
 def extract_country_from_header(lines: list[str]) -> str | None:
     for ln in lines[:8]:
@@ -25,20 +42,67 @@ def extract_country_from_header(lines: list[str]) -> str | None:
             return m.group(1).strip()
     return None
 
-def extract_country_from_filename(path: Path) -> str:
-    m = re.search(r"\.(?P<name>[^.]+)\.tmp\.per$", path.name, flags=re.IGNORECASE)
-    if m:
-        return m.group("name")
-    parts = path.stem.split(".")
+def split_per_name(name: str) -> tuple[str, str]:
+    """File name -> (country, CRU variable code); names without a known code count as tmp."""
+    m = PER_NAME.search(name)
+    if m and m.group("var").lower() in CRU_VARS:
+        return m.group("name"), m.group("var").lower()
+    parts = Path(name).stem.split(".")
     if len(parts) >= 2:
-        return parts[-2]
-    return path.stem
+        return parts[-2], "tmp"
+    return Path(name).stem, "tmp"
 
-def parse_per_file(path: Path) -> pd.DataFrame:
-    txt = path.read_text(encoding="utf-8", errors="replace")
+def extract_country_from_filename(path: Path) -> str:
+    return split_per_name(path.name)[0]
+
+def parse_per_format(lines: list[str]) -> tuple[int, list[int]]:
+    """Return (year_width, month_widths) from the `format = (i5,17f8.1)` header, CRU default otherwise."""
+    for ln in lines[:8]:
+        m = re.search(r"format\s*=\s*\(i(\d+),(\d+)f(\d+)\.\d+\)", ln)
+        if m:
+            return int(m.group(1)), [int(m.group(3))] * int(m.group(2))
+    return 5, [8] * 17
+
+def parse_per_block(lines: list[str], year_width: int, widths: list[int]) -> tuple[np.ndarray, np.ndarray]:
+    """Fixed-width numeric block -> (years, year x 12 temperatures) with NaN for missing."""
+    rows = [ln for ln in lines if ln.strip()]
+    total = year_width + sum(widths[:12])
+    buf = "".join(ln[:total].ljust(total) for ln in rows).encode("ascii", errors="replace")
+    chars = np.frombuffer(buf, dtype="S1").reshape(len(rows), total)
+
+    def field(a: int, b: int) -> np.ndarray:
+        return np.ascontiguousarray(chars[:, a:b]).view(f"S{b - a}").ravel()
+
+    years = field(0, year_width).astype(np.int64)
+    vals = np.empty((len(rows), 12), dtype=np.float64)
+    pos = year_width
+    for j in range(12):
+        vals[:, j] = field(pos, pos + widths[j]).astype(np.float64)
+        pos += widths[j]
+    vals[vals == MISSING] = np.nan
+    return years, vals
+
+def per_to_long(years: np.ndarray, vals: np.ndarray | dict, country: str) -> pd.DataFrame:
+    """years + (year x 12) values -> long frame; `vals` may be {column: year x 12} for several variables."""
+    if not isinstance(vals, dict):
+        vals = {"temp_c": vals}
+    n = len(years)
+    year = np.repeat(years, 12)
+    month = np.tile(np.arange(1, 13, dtype=np.int64), n)
+    date = ((year - 1970) * 12 + (month - 1)).astype("datetime64[M]").astype("datetime64[D]") + np.timedelta64(14, "D")
+    return pd.DataFrame({
+        "date": date.astype("datetime64[ns]"),
+        "year": year,
+        "month": month,
+        **{col: v.ravel() for col, v in vals.items()},
+        "country": country,
+    })
+
+def parse_per_values(txt: str, name: str, fallback_country: str) -> tuple[str, np.ndarray, np.ndarray]:
+    """.per text -> (country, years, year x 12 values)."""
     lines = txt.splitlines()
 
-    country = extract_country_from_header(lines) or extract_country_from_filename(path)
+    country = extract_country_from_header(lines) or fallback_country
 
     header_idx = None
     for i, ln in enumerate(lines):
@@ -46,52 +110,292 @@ def parse_per_file(path: Path) -> pd.DataFrame:
             header_idx = i
             break
     if header_idx is None:
-        raise ValueError(f"Header line with 'YEAR' not found in {path.name}")
-
-    table_str = "\n".join(lines[header_idx:])
-    df = pd.read_fwf(io.StringIO(table_str))
+        raise ValueError(f"Header line with 'YEAR' not found in {name}")
 
-    missing_months = [m for m in MONTHS if m not in df.columns]
+    cols = lines[header_idx].split()
+    missing_months = [m for m in MONTHS if m not in cols]
     if missing_months:
-        raise ValueError(f"{path.name}: missing month columns: {missing_months}")
+        raise ValueError(f"{name}: missing month columns: {missing_months}")
+
+    year_width, widths = parse_per_format(lines[:header_idx])
+    years, vals = parse_per_block(lines[header_idx + 1:], year_width, widths)
+    return country, years, vals
+
+def parse_per_text(txt: str, name: str, fallback_country: str, col: str = "temp_c") -> pd.DataFrame:
+    country, years, vals = parse_per_values(txt, name, fallback_country)
+    return per_to_long(years, {col: vals}, country)
+
+def parse_per_file(path: Path) -> pd.DataFrame:
+    txt = path.read_text(encoding="utf-8", errors="replace")
+    country, var = split_per_name(path.name)
+    return parse_per_text(txt, path.name, country, CRU_VARS[var])
+
+@dataclass(frozen=True)
+class PerSource:
+    """One .per input: a file on disk, or an archive member already read into memory."""
+    key: str                   # manifest key: file name, or "<archive>!<member>"
+    name: str                  # file/member name (country fallback)
+    path: Path | None = None
+    data: bytes | None = None
+    mtime_ns: int | None = None
+
+    @property
+    def country(self) -> str:
+        return split_per_name(self.name)[0]
 
-    df = df[["YEAR"] + MONTHS].copy()
+    @property
+    def var(self) -> str:
+        return split_per_name(self.name)[1]
 
-    df.replace(MISSING, np.nan, inplace=True)
+    def read(self) -> bytes:
+        return self.path.read_bytes() if self.data is None else self.data
 
-    long = df.melt(id_vars=["YEAR"], value_vars=MONTHS, var_name="month_str", value_name="temp_c")
-    long["month"] = long["month_str"].map(MONTH_MAP).astype(int)
-    long["year"] = long["YEAR"].astype(int)
-    long["date"] = pd.to_datetime(dict(year=long["year"], month=long["month"], day=15), errors="coerce")
-    long["country"] = country
+    def stat(self) -> dict:
+        if self.data is None:
+            return stat_entry(self.path)
+        return {"size": len(self.data), "mtime_ns": self.mtime_ns}
 
-    long = long[["date","year","month","temp_c","country"]].sort_values(["date"])
-    return long
+def parse_per_source(src: PerSource) -> pd.DataFrame:
+    if src.data is None:
+        return parse_per_file(src.path)
+    txt = src.data.decode("utf-8", errors="replace")
+    return parse_per_text(txt, src.name, src.country, CRU_VARS[src.var])
 
-def main():
-    per_files = sorted(IN_DIR.glob("*.per"))
-    if not per_files:
-        print(f"[ERROR] No .per files in {IN_DIR}")
+def parse_per_group(group: tuple[PerSource, ...]) -> pd.DataFrame:
+    """All variables of one country -> one frame on a shared month index, a column per variable."""
+    if len(group) == 1:
+        return parse_per_source(group[0])
+    parsed = []
+    for src in group:
+        txt = src.read().decode("utf-8", errors="replace")
+        parsed.append((src.var, *parse_per_values(txt, src.name, src.country)))
+    country = parsed[0][1]
+    years = np.unique(np.concatenate([p[2] for p in parsed]))
+    cols = {}
+    for var, _, y, v in parsed:
+        a = np.full((len(years), 12), np.nan)
+        a[np.searchsorted(years, y)] = v
+        cols[CRU_VARS[var]] = a
+    return per_to_long(years, cols, country)
+
+def group_sources(sources, variables: list[str]) -> list[tuple[PerSource, ...]]:
+    """Group the selected variables' sources by country (file-name country), variables in CRU_VARS order."""
+    order = {v: i for i, v in enumerate(CRU_VARS)}
+    groups: dict[str, dict[str, PerSource]] = {}
+    for src in sorted(sources, key=lambda s: s.key):
+        if src.var not in variables:
+            continue
+        g = groups.setdefault(src.country, {})
+        if src.var in g:  # e.g. a re-download "….tmp (1).per"; the last name wins, as before
+            print(f"[WARN] {src.country}/{src.var}: {g[src.var].name} superseded by {src.name}")
+        g[src.var] = src
+    return [tuple(sorted(g.values(), key=lambda s: order[s.var])) for _, g in sorted(groups.items())]
+
+def is_archive(path: Path) -> bool:
+    name = path.name.lower()
+    return name.endswith((".zip", ".tar", ".tar.gz", ".tgz", ".gz"))
+
+def iter_archive(path: Path):
+    """Yield the .per members of a .zip / .tar[.gz] / .per.gz release one at a time,
+    decompressed in memory (nothing is extracted to disk)."""
+    name = path.name.lower()
+    if name.endswith(".zip"):
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".per"):
+                    continue
+                member = Path(info.filename).name
+                mtime = int(datetime(*info.date_time).timestamp() * 1e9)
+                yield PerSource(f"{path.name}!{info.filename}", member, data=zf.read(info), mtime_ns=mtime)
+    elif name.endswith((".tar", ".tar.gz", ".tgz")):
+        with tarfile.open(path, mode="r|*") as tf:  # stream mode: sequential, no seeking
+            for info in tf:
+                if not info.isfile() or not info.name.lower().endswith(".per"):
+                    continue
+                member = Path(info.name).name
+                yield PerSource(f"{path.name}!{info.name}", member,
+                                data=tf.extractfile(info).read(), mtime_ns=int(info.mtime * 1e9))
+    elif name.endswith(".gz"):
+        member = path.name[:-3]
+        with gzip.open(path, "rb") as fh:
+            data = fh.read()
+        yield PerSource(f"{path.name}!{member}", member, data=data, mtime_ns=path.stat().st_mtime_ns)
+    else:
+        raise ValueError(f"Unsupported archive: {path.name}")
+
+def iter_sources(in_dir: Path, archives: list[Path]):
+    if archives:
+        for a in archives:
+            yield from iter_archive(a)
         return
+    for fp in sorted(in_dir.glob("*.per")):
+        yield PerSource(fp.name, fp.name, path=fp)
+
+def render_csv(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode("utf-8")
+
+def _parse_job(group: tuple[PerSource, ...]) -> tuple[tuple[PerSource, ...], pd.DataFrame | None, bytes | None, str | None]:
+    # parse + serialize in the worker so the parent only writes bytes
+    try:
+        df = parse_per_group(group)
+        return group, df, render_csv(df), None
+    except Exception as e:
+        return group, None, None, str(e)
+
+def iter_parsed(sources, jobs: int):
+    if jobs <= 1:
+        yield from map(_parse_job, sources)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as ex:
+        yield from ex.map(_parse_job, sources, chunksize=8)
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def load_manifest(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8")).get("sources", {})
+    except (ValueError, OSError) as e:
+        print(f"[WARN] ignoring unreadable manifest {path.name}: {e}")
+        return {}
+
+def save_manifest(path: Path, sources: dict):
+    data = json.dumps({"version": 1, "sources": dict(sorted(sources.items()))}, indent=1)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(data, encoding="utf-8")
+    tmp.replace(path)
+
+def stat_entry(path: Path) -> dict:
+    st = path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def source_unchanged(src: PerSource, entry: dict | None, out_dir: Path, store_dir: Path | None = None) -> bool:
+    """True if `src` and its recorded output are byte-identical to the manifest entry.
+    size+mtime is the fast path; a content hash decides when only the mtime moved."""
+    if not entry:
+        return False
+    if store_dir is not None and not (store_dir / entry.get("partition", "") / "k.npy").is_file():
+        return False
+    out = out_dir / entry.get("output", "")
+    if not out.is_file() or stat_entry(out) != {"size": entry.get("output_size"), "mtime_ns": entry.get("output_mtime_ns")}:
+        return False
+    cur = src.stat()
+    if cur["size"] != entry.get("size"):
+        return False
+    if cur["mtime_ns"] != entry.get("mtime_ns"):
+        if sha256_bytes(src.read()) != entry.get("sha256"):
+            return False
+        entry["mtime_ns"] = cur["mtime_ns"]
+    return True
+
+def write_if_changed(out: Path, data: bytes) -> bool:
+    if out.is_file() and out.stat().st_size == len(data) and out.read_bytes() == data:
+        return False
+    out.write_bytes(data)
+    return True
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="Parse CRU country .per files into per-country monthly CSVs.")
+    ap.add_argument("--in_dir", default=str(IN_DIR), help="Directory with the .per files (default dataset_temp/).")
+    ap.add_argument("--out_dir", default=str(OUT_DIR), help="Per-country CSV output + manifest (default temp_per_country/).")
+    ap.add_argument("--vars", nargs="+", default=["tmp"],
+                    help=f"CRU variables to ingest ({', '.join(CRU_VARS)} or 'all'); "
+                         "each country's variables become columns of one file.")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes for parsing (1 = serial).")
+    ap.add_argument("--force", action="store_true", help="Ignore the ingest manifest and re-parse every file.")
+    ap.add_argument("--store_dir", default=str(monthly_store.STORE_DIR),
+                    help="Columnar monthly store written alongside the CSVs (see monthly_store.py).")
+    ap.add_argument("--no_store", action="store_true", help="Only write the per-country CSVs.")
+    ap.add_argument("--snapshot", default=None,
+                    help="Name of the store vintage recorded after the ingest (default: UTC timestamp).")
+    ap.add_argument("--no_snapshot", action="store_true", help="Update the live store without recording a vintage.")
+    ap.add_argument("--ids", default=str(ID_FILE), help="Country ID registry (see country_ids.py); new countries are appended.")
+    ap.add_argument("--archive", nargs="+", default=None,
+                    help="Read .per members straight from CRU release archives (.zip/.tar.gz/.gz) instead of --in_dir.")
+    args = ap.parse_args(argv)
+
+    variables = list(CRU_VARS) if args.vars == ["all"] else [v.lower() for v in args.vars]
+    unknown = [v for v in variables if v not in CRU_VARS]
+    if unknown:
+        raise SystemExit(f"Unknown CRU variables: {unknown}. Known: {list(CRU_VARS)}")
+    archives = [Path(a) for a in args.archive or []]
+    bad = [a.name for a in archives if not is_archive(a)]
+    if bad:
+        raise SystemExit(f"Unsupported archive type: {bad}")
+
+    in_dir, out_dir = Path(args.in_dir), Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    store_dir = None if args.no_store else Path(args.store_dir)
+    manifest = {} if args.force else load_manifest(manifest_path)
+    ids = CountryIds.load(Path(args.ids))
+    sources = {}
+    groups = group_sources(iter_sources(in_dir, archives), variables)
+    counts = {"skipped": 0}
+
+    def pending():
+        for group in groups:
+            for src in group:
+                if src.key in manifest:
+                    sources[src.key] = manifest[src.key]
+            if all(source_unchanged(src, sources.get(src.key), out_dir, store_dir) for src in group):
+                counts["skipped"] += len(group)
+                continue
+            yield group
 
     total_rows = 0
+    parsed = 0
     written = 0
-    for fp in per_files:
-        try:
-            df = parse_per_file(fp)
-        except Exception as e:
-            print(f"[WARN] skip {fp.name}: {e}")
+    unchanged = 0
+    for group, df, data, err in iter_parsed(pending(), args.jobs):
+        parsed += len(group)
+        if err is not None:
+            print(f"[WARN] skip {', '.join(src.name for src in group)}: {err}")
+            for src in group:
+                sources.pop(src.key, None)
             continue
 
         country = df["country"].iloc[0]
-        out = OUT_DIR / f"{safe_name(country)}.csv"
-        df.to_csv(out, index=False)
-        written += 1
+        country_id = ids.assign(country, aliases=[group[0].country, safe_name(country)])
+        out = out_dir / f"{safe_name(country)}.csv"
+        if write_if_changed(out, data):
+            written += 1
+            if written % 10 == 0:
+                print(f"[OK] {written} files written... (last: {out.name})")
+        else:
+            unchanged += 1
+        idx = CsvIndex.from_bytes(data)  # byte-offset sidecar for the phase 5 trim/append scripts
+        if idx is not None:
+            idx.save(out)
+        if store_dir is not None:
+            monthly_store.write_frame(store_dir, df)
         total_rows += len(df)
-        if written % 10 == 0:
-            print(f"[OK] {written} files written... (last: {out.name})")
+        out_entry = {
+            "output": out.name, "output_sha256": sha256_bytes(data),
+            **{f"output_{k}": v for k, v in stat_entry(out).items()},
+            "partition": safe_name(country),
+            "country_id": country_id,
+            "rows": int(len(df)),
+        }
+        for src in group:
+            sources[src.key] = {**src.stat(), "sha256": sha256_bytes(src.read()), "var": src.var, **out_entry}
+
+    if not groups:
+        print(f"[ERROR] No .per files for {', '.join(variables)} in {', '.join(map(str, archives)) or in_dir}")
+        return
 
-    print(f"[DONE] files: {written} | total rows: {total_rows} → {OUT_DIR}")
+    save_manifest(manifest_path, sources)
+    if ids.dirty:
+        ids.save(Path(args.ids))
+    if store_dir is not None and store_dir.is_dir():
+        monthly_store.refresh_meta(store_dir, ids)
+        if not args.no_snapshot:
+            snap = monthly_store.snapshot(store_dir, args.snapshot, note=f"temp_data {' '.join(variables)}")
+            print(f"[OK] store snapshot: {snap}")
+    print(f"[DONE] parsed: {parsed} | skipped (manifest): {counts['skipped']} | "
+          f"written: {written} | unchanged output: {unchanged} | rows parsed: {total_rows} → {out_dir}")
 
 if __name__ == "__main__":
     main()
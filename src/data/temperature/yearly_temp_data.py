@@ -1,6 +1,12 @@
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import io
+import numpy as np
 import pandas as pd
 
+import monthly_store
+
 BASE    = Path(__file__).resolve().parent
 IN_DIR  = BASE / "temp_per_country"
 OUT_PER = IN_DIR / "yearly_temp_per_country"
@@ -10,12 +16,18 @@ OUT_AGG.mkdir(parents=True, exist_ok=True)
 
 MASTER = OUT_AGG / "country_year.csv"
 MIN_MONTHS = 10
+BASE_YEARS = (1991, 2024)
+STD_HEADER = b"date,year,month,temp_c,country"
 
 def list_monthly_csvs() -> list[Path]:
     return sorted([p for p in IN_DIR.glob("*.csv") if p.is_file()])
 
 def load_monthly_csv(p: Path) -> pd.DataFrame:
-    df = pd.read_csv(p)
+    header = pd.read_csv(p, nrows=0).columns
+    # temp_data.py writes year/month next to date; only parse dates when they are missing
+    have_ym = {"year","month"}.issubset(header)
+    wanted = {"country","year","month","temp_c"} if have_ym else {"country","date","year","month","temp_c"}
+    df = pd.read_csv(p, usecols=[c for c in header if c in wanted])
     if "country" not in df.columns:
         df["country"] = p.stem.replace("_", " ").strip()
 
@@ -37,46 +49,141 @@ def load_monthly_csv(p: Path) -> pd.DataFrame:
     df["month"] = df["month"].astype(int)
     return df
 
-def main():
-    files = list_monthly_csvs()
-    if not files:
-        raise FileNotFoundError(f"No csv in {IN_DIR} found.")
-
-    parts, skipped = [], 0
-    for p in files:
+def load_monthly_store(store_dir: Path, as_of: str | None = None) -> pd.DataFrame:
+    df = monthly_store.read_monthly(store_dir, columns=["country","year","month","temp_c"], as_of=as_of)
+    df["country"] = df["country"].astype(str)
+    df["year"] = df["year"].astype(int)
+    return df.dropna(subset=["temp_c"])
+
+def load_monthly_dir(files: list[Path], jobs: int) -> tuple[pd.DataFrame, int]:
+    """All monthly CSVs as one frame. Files with temp_data.py's header are joined and
+    parsed in a single read_csv; anything else goes through load_monthly_csv."""
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        raw = list(ex.map(Path.read_bytes, files))
+    bodies, frames, skipped = [], [], 0
+    for p, data in zip(files, raw):
+        head, _, body = data.partition(b"\n")
+        if head.strip() == STD_HEADER and body:
+            bodies.append(body if body.endswith(b"\n") else body + b"\n")
+            continue
         try:
-            mdf = load_monthly_csv(p)
-            g = (mdf.groupby(["country","year"], as_index=False)
-                    .agg(n_months=("temp_c","count"),
-                         temp_c=("temp_c","mean")))
-            g = g[g["n_months"] >= MIN_MONTHS].drop(columns="n_months")
-            if g.empty:
-                skipped += 1
-                continue
-            parts.append(g)
+            frames.append(load_monthly_csv(p))
         except Exception as e:
             skipped += 1
             print(f"[WARN] skip {p.name}: {e}")
-
-    if not parts:
+    if bodies:
+        df = pd.read_csv(io.BytesIO(STD_HEADER + b"\n" + b"".join(bodies)),
+                         usecols=["year","month","temp_c","country"])
+        df = df[["country","year","month","temp_c"]].dropna(subset=["year","month","temp_c"])
+        df["year"]  = df["year"].astype(int)
+        df["month"] = df["month"].astype(int)
+        frames.insert(0, df)
+    if not frames:
         raise ValueError(f"No yearly data created: (skipped={skipped}).")
+    return pd.concat(frames, ignore_index=True), skipped
+
+def _kahan_sum(x: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Compensated sum over the last axis, in order, skipping invalid cells.
+    Same arithmetic as pandas' groupby mean, so outputs stay byte-identical."""
+    s = np.zeros(x.shape[:-1])
+    comp = np.zeros(x.shape[:-1])
+    for j in range(x.shape[-1]):
+        ok = valid[..., j]
+        y = x[..., j] - comp
+        t = s + y
+        comp = np.where(ok, (t - s) - y, comp)
+        s = np.where(ok, t, s)
+    return s
+
+def aggregate_yearly(mdf: pd.DataFrame, base_years: tuple[int, int] = BASE_YEARS,
+                     min_months: int = MIN_MONTHS) -> pd.DataFrame:
+    """Monthly long frame -> country,year,temp_c,base,anom in one pass over a
+    (country x year x 12) cube."""
+    countries, ci = np.unique(mdf["country"].astype(str).to_numpy(), return_inverse=True)
+    year = mdf["year"].to_numpy(dtype=np.int64)
+    y0 = int(year.min())
+    n_y = int(year.max()) - y0 + 1
+    mi = mdf["month"].to_numpy(dtype=np.int64) - 1
+    if ((mi < 0) | (mi > 11)).any():
+        raise ValueError("month outside 1..12")
+    flat = (ci * n_y + (year - y0)) * 12 + mi
+    size = len(countries) * n_y * 12
+    # NaN months are neither summed nor counted (groupby count/mean skip them); duplicate
+    # months (if any) are summed into their cell and counted twice, as groupby did
+    temp = mdf["temp_c"].to_numpy(dtype=np.float64)
+    has = ~np.isnan(temp)
+    cube = np.bincount(flat[has], weights=temp[has], minlength=size)
+    n3 = np.bincount(flat[has], minlength=size)
+    cube = cube.reshape(len(countries), n_y, 12)
+    n3 = n3.reshape(len(countries), n_y, 12)
+
+    n_months = n3.sum(axis=2)
+    ok = n_months >= min_months
+    years = np.arange(y0, y0 + n_y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        annual = np.where(ok, _kahan_sum(cube, n3 > 0) / n_months, np.nan)
+        in_base = ok & ((years >= base_years[0]) & (years <= base_years[1]))[None, :]
+        base = _kahan_sum(np.where(in_base, annual, 0.0), in_base) / in_base.sum(axis=1)
+
+    ci, yi = np.nonzero(ok)  # row-major: sorted by country, then year
+    return pd.DataFrame({
+        "country": countries[ci],
+        "year": years[yi],
+        "temp_c": annual[ci, yi],
+        "base": base[ci],
+        "anom": annual[ci, yi] - base[ci],
+    })
+
+def write_if_changed(out: Path, data: bytes) -> bool:
+    if out.is_file() and out.stat().st_size == len(data) and out.read_bytes() == data:
+        return False
+    out.write_bytes(data)
+    return True
+
+def write_outputs(all_years: pd.DataFrame, jobs: int) -> tuple[bool, int]:
+    """Master CSV + one file per country. The per-country files are slices of the
+    master's rendered lines, so the frame is serialized once."""
+    text = all_years[["country","year","temp_c","base","anom"]].to_csv(index=False)
+    master_changed = write_if_changed(MASTER, text.encode("utf-8"))
+
+    header, *lines = text.splitlines(keepends=True)
+    counts = all_years.groupby("country", sort=False).size()
+    jobs_list, pos = [], 0
+    for country, n in counts.items():
+        body = "".join(lines[pos:pos + n])
+        pos += n
+        jobs_list.append((OUT_PER / f"{country.replace(' ','_')}.csv", (header + body).encode("utf-8")))
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        changed = sum(ex.map(lambda job: write_if_changed(*job), jobs_list))
+    return master_changed, changed
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="Aggregate monthly per-country data to yearly means + anomalies.")
+    ap.add_argument("--store", default=None,
+                    help="Read monthly data from the columnar store (monthly_store.py) instead of temp_per_country/*.csv. "
+                         "Note: forecasts are in the store only after phase5_apply_forecasts_to_country_files.py --store_dir.")
+    ap.add_argument("--as_of", default=None,
+                    help="Snapshot of --store to read (monthly_store.list_snapshots; 'latest' = newest). Default: live store.")
+    ap.add_argument("--jobs", type=int, default=8, help="Threads for reading CSVs and writing per-country files.")
+    args = ap.parse_args(argv)
+
+    if args.store:
+        mdf, skipped = load_monthly_store(Path(args.store), args.as_of), 0
+    else:
+        files = list_monthly_csvs()
+        if not files:
+            raise FileNotFoundError(f"No csv in {IN_DIR} found.")
+        mdf, skipped = load_monthly_dir(files, args.jobs)
 
-    all_years = pd.concat(parts, ignore_index=True)
-
-    base = (all_years.query("1991<=year<=2024")
-                    .groupby("country", as_index=False)["temp_c"].mean()
-                    .rename(columns={"temp_c":"base"}))
-    all_years = all_years.merge(base, on="country", how="left")
-    all_years["anom"] = all_years["temp_c"] - all_years["base"]
-
-    all_years.sort_values(["country","year"]).to_csv(MASTER, index=False)
+    all_years = aggregate_yearly(mdf)
+    if all_years.empty:
+        raise ValueError(f"No yearly data created: (skipped={skipped}).")
+    skipped += int(mdf["country"].nunique() - all_years["country"].nunique())
 
-    for country, sub in all_years.groupby("country", sort=True):
-        fn = OUT_PER / f"{country.replace(' ','_')}.csv"
-        sub[["country","year","temp_c","base","anom"]].to_csv(fn, index=False)
+    master_changed, n_changed = write_outputs(all_years, args.jobs)
 
-    print(f"[OK] Master: {MASTER}")
-    print(f"[OK] Per-country files: {len(list(OUT_PER.glob('*.csv')))} | skipped={skipped}")
+    print(f"[OK] Master: {MASTER}{'' if master_changed else ' (unchanged)'}")
+    print(f"[OK] Per-country files: {len(list(OUT_PER.glob('*.csv')))} | rewritten={n_changed} | skipped={skipped}")
 
 if __name__ == "__main__":
     main()